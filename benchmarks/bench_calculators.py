@@ -0,0 +1,152 @@
+"""
+Calculator pipeline benchmark.
+
+Times and measures peak memory of the balance, daily balance, rewards,
+formatting and snapshot-writing stages on seeded synthetic data, and
+compares the results against the JSON baseline in benchmarks/baselines.
+
+    python -m benchmarks.bench_calculators --size small medium
+    python -m benchmarks.bench_calculators --events 50000 --providers 5000 --update-baseline
+"""
+import sys
+import json
+import argparse
+from benchmarks.harness import (
+    configure_environment, working_directory, StageRecorder, emit_result, run_child,
+    merge_stage_results, load_baseline, save_baseline, check_regressions, report, DEFAULT_THRESHOLD
+)
+
+BASELINE_NAME = "calculators"
+
+# (events, providers)
+SIZES = {
+    "small": (1_000, 100),
+    "medium": (10_000, 1_000),
+    "large": (100_000, 10_000),
+    "xlarge": (1_000_000, 100_000),
+}
+
+# 10 x 10 what-if scenarios, plus the baseline
+SCENARIO_SWEEP = {
+    "total_rewards": [25_000 + 5_000 * step for step in range(10)],
+    "t_reward_ratio": [0.05 * step for step in range(1, 11)],
+}
+
+def run_pass(n_events, n_providers, seed, memory):
+    configure_environment()
+    from benchmarks.synthetic import generate_events, generate_price_history
+    from src.config import START_DATE, END_DATE, TOTAL_REWARDS
+    from src.data.price_store import price_store
+    from src.data.balance_store import daily_balance_store
+    from src.calculator.balances import BalanceCalculator
+    from src.calculator.daily_balances import DailyBalanceCalculator
+    from src.calculator.rewards import RewardsCalculator
+    from src.calculator.scenarios import run_scenarios
+    from src.data.json_formatter import format_rewards_data
+    from src.data.json_logger import save_json_data
+
+    with working_directory():
+        with open('data/pools_events.json', 'w') as f:
+            json.dump(generate_events(n_events, n_providers, seed), f)
+        for coingecko_id, points in generate_price_history(seed).items():
+            price_store.append(coingecko_id, points)
+
+        recorder = StageRecorder(memory=memory)
+
+        balance_calculator = BalanceCalculator()
+        with recorder.stage("calculate_balances"):
+            balance_calculator.calculate_balances()
+
+        daily_balance_calculator = DailyBalanceCalculator(
+            provider_balances_file='./data/balances/provider_balances.json',
+            daily_balances_file='./data/balances/daily_balances.json',
+        )
+        with recorder.stage("calculate_daily_balances"):
+            daily_balance_calculator.calculate_daily_balances(balance_calculator.provider_liquidity)
+
+        rewards_calculator = RewardsCalculator(
+            daily_balances_file='./data/balances/daily_balances.json',
+            start_date=START_DATE,
+            end_date=END_DATE,
+            total_rewards=TOTAL_REWARDS,
+            balance_store=daily_balance_store
+        )
+        with recorder.stage("rewards_run"):
+            rewards_data = rewards_calculator.run()
+        # Should cost about as much as rewards_run: the balances are loaded once for all scenarios
+        with recorder.stage("scenarios_100"):
+            run_scenarios({"sweep": SCENARIO_SWEEP})
+
+        combined_data = {
+            "total_weighted_liquidity": rewards_data.get("total_weighted_liquidity"),
+            "rewards": rewards_data.get("rewards"),
+            "provider_liquidity": balance_calculator.provider_liquidity,
+            "daily_balances": daily_balance_calculator.daily_balances
+        }
+        with recorder.stage("format_rewards_data"):
+            format_rewards_data(combined_data)
+        with recorder.stage("save_json_data"):
+            save_json_data(combined_data)
+
+        # A backfilled event older than everything applied: only its provider is replayed
+        with open('data/pools_events.json') as f:
+            events = json.load(f)
+        late_event = dict(min(events, key=lambda event: event['timestamp']), transactionHash='0x' + 'ab' * 32)
+        with open('data/pools_events.json', 'w') as f:
+            json.dump(events + [late_event], f)
+        del events
+        with recorder.stage("late_event_recompute"):
+            balance_calculator.calculate_balances()
+            daily_balance_calculator.calculate_daily_balances(balance_calculator.provider_liquidity)
+        # Only the late provider's events and balances go into the snapshot delta
+        with recorder.stage("save_json_data_delta"):
+            save_json_data(dict(combined_data, provider_liquidity=balance_calculator.provider_liquidity))
+
+    return recorder.results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calculator pipeline on synthetic data")
+    parser.add_argument("--size", nargs="+", choices=SIZES.keys(), default=["small"], help="Preset dataset sizes")
+    parser.add_argument("--events", type=int, help="Custom number of events (overrides --size)")
+    parser.add_argument("--providers", type=int, help="Custom number of providers (with --events)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed ratio over baseline before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--pass", dest="child_pass", choices=["timing", "memory"], help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.events:
+        datasets = [(args.events, args.providers or max(args.events // 10, 1))]
+    else:
+        datasets = [SIZES[size] for size in args.size]
+
+    if args.child_pass:
+        n_events, n_providers = datasets[0]
+        emit_result(run_pass(n_events, n_providers, args.seed, memory=args.child_pass == "memory"))
+        return 0
+
+    baseline = load_baseline(BASELINE_NAME)
+    failed = False
+    for n_events, n_providers in datasets:
+        key = f"{n_events}e_{n_providers}p"
+        child_args = ["--events", str(n_events), "--providers", str(n_providers), "--seed", str(args.seed)]
+        passes = [run_child("benchmarks.bench_calculators", child_args + ["--pass", "timing"])]
+        if not args.no_memory:
+            passes.append(run_child("benchmarks.bench_calculators", child_args + ["--pass", "memory"]))
+        results = merge_stage_results(*passes)
+
+        report(f"{n_events} events / {n_providers} providers", results, baseline.get(key))
+        regressions = check_regressions(results, baseline.get(key, {}), args.threshold)
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        failed = failed or bool(regressions)
+
+        if args.update_baseline:
+            save_baseline(BASELINE_NAME, key, results)
+
+    return 1 if failed and not args.update_baseline else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
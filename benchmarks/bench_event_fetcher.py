@@ -0,0 +1,90 @@
+"""
+End-to-end EventFetcher throughput benchmark against the local replay node.
+
+Runs `event_fetcher.fetch_and_save_events` over all configured pools from
+the earliest deploy block to the replay chain head, then reports wall time,
+stored events per second and RPC calls per method.
+
+    python -m benchmarks.bench_event_fetcher --events 20000
+    python -m benchmarks.bench_event_fetcher --latency-ms 30 --rate-limit-every 200 --max-logs 10000
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+from benchmarks.harness import (
+    configure_environment, working_directory, load_baseline, save_baseline,
+    check_regressions, report, DEFAULT_THRESHOLD
+)
+from benchmarks.rpc_replay_node import add_node_arguments, build_node
+
+BASELINE_NAME = "event_fetcher"
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EventFetcher against the local replay node")
+    add_node_arguments(parser)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed ratio over baseline before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+
+    args = parser.parse_args()
+
+    # The RPC URL is read when src.config is imported, so it has to be known before building the chain
+    port = find_free_port()
+    configure_environment({"ALCHEMY_URL": f"http://127.0.0.1:{port}"})
+    node = build_node(args)
+    node.start(port=port)
+
+    from src.config import POOLS
+    from src.blockchain.event_fetcher import event_fetcher
+
+    from_block = min(pool['deploy_block'] for pool in POOLS)
+    to_block = node.chain.head
+    try:
+        with working_directory():
+            started = time.perf_counter()
+            asyncio.run(event_fetcher.fetch_and_save_events(POOLS, from_block, to_block))
+            seconds = time.perf_counter() - started
+            try:
+                with open(os.path.join('data', 'pools_events.json'), 'r') as f:
+                    stored_events = len(json.load(f))
+            except FileNotFoundError:
+                stored_events = 0
+    finally:
+        node.stop()
+
+    stats = node.stats()
+    results = {
+        "fetch_and_save_events": {
+            "seconds": round(seconds, 4),
+            "events_per_second": round(stored_events / seconds, 1) if seconds else 0,
+        },
+        "rpc_calls": dict(sorted(stats["calls"].items())),
+        "http": {"requests": stats["http_requests"], "rate_limited": stats["rate_limited"]},
+    }
+    print(f"\nStored {stored_events} of {len(node.chain.logs)} replayed logs (blocks {from_block}-{to_block})")
+
+    key = os.path.basename(args.fixture) if args.fixture else f"{args.events}e_{args.providers}p"
+    baseline = load_baseline(BASELINE_NAME).get(key, {})
+    report("EventFetcher against replay node", results, baseline)
+
+    # Higher throughput is better, so it is not checked against the ceiling
+    checked = {stage: {m: v for m, v in metrics.items() if m != "events_per_second"} for stage, metrics in results.items()}
+    regressions = check_regressions(checked, baseline, args.threshold)
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+
+    if args.update_baseline:
+        save_baseline(BASELINE_NAME, key, results)
+        return 0
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Startup-time benchmark.
+
+Imports each entry-point module in a fresh interpreter under
+`python -X importtime` and reports the total import time, wall time and
+whether the heavy dependencies (web3, eth_abi, aiohttp, numpy) were pulled in.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module src.app --repeat 10 --top 15
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from benchmarks.harness import (
+    REPO_ROOT, BENCH_ENV, working_directory, load_baseline, save_baseline,
+    check_regressions, report, DEFAULT_THRESHOLD
+)
+
+BASELINE_NAME = "startup"
+
+MODULES = [
+    "src.config",
+    "src.data.state_manager",
+    "src.calculator.rewards",
+    "src.blockchain.event_fetcher",
+    "src.app",
+    "src.utils.merkl_converter",
+    "src.utils.merkl_validator",
+    "src.utils.rewards_validator",
+]
+
+HEAVY_MODULES = ("web3", "eth_abi", "aiohttp", "numpy")
+
+def parse_importtime(stderr):
+    """
+    :return: List of (cumulative_us, self_us, module, depth) for every
+        `-X importtime` line.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(cumulative_us), int(self_us), name.strip(), depth))
+    return entries
+
+def measure_import(module):
+    env = dict(os.environ, **BENCH_ENV, PYTHONPATH=REPO_ROOT)
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-4000:]}")
+    entries = parse_importtime(completed.stderr)
+    imported = {name for _, _, name, _ in entries}
+    return {
+        "import_seconds": sum(self_us for _, self_us, _, _ in entries) / 1e6,
+        "wall_seconds": wall,
+        "heavy": sorted(name for name in HEAVY_MODULES if name in imported),
+        "entries": entries,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import/startup time of entry-point modules")
+    parser.add_argument("--module", nargs="+", default=MODULES, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per module; the fastest is reported")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest top-level imports per module")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed ratio over baseline before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+
+    args = parser.parse_args()
+
+    results = {}
+    heavy = {}
+    slowest = {}
+    # Run from a scratch data/ layout so importing never touches the repository's state files
+    with working_directory():
+        for module in args.module:
+            runs = [measure_import(module) for _ in range(args.repeat)]
+            best = min(runs, key=lambda run: run["import_seconds"])
+            results[module] = {
+                "import_seconds": round(best["import_seconds"], 4),
+                "wall_seconds": round(min(run["wall_seconds"] for run in runs), 4),
+            }
+            heavy[module] = best["heavy"]
+            slowest[module] = sorted((e for e in best["entries"] if e[3] == 1), reverse=True)[:args.top]
+
+    baseline = load_baseline(BASELINE_NAME).get(sys.version.split()[0], {})
+    report("Import time per entry point (fastest run)", results, baseline)
+    for module in args.module:
+        if heavy[module]:
+            print(f"  {module} imports {', '.join(heavy[module])}")
+        for cumulative_us, _, name, _ in slowest[module]:
+            print(f"      {cumulative_us / 1000:8.1f} ms  {name}")
+
+    regressions = check_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+
+    if args.update_baseline:
+        # Import times depend heavily on the interpreter version, so baselines are kept per version
+        save_baseline(BASELINE_NAME, sys.version.split()[0], results)
+        return 0
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Shared helpers for the benchmark scripts: program configuration, stage
+timing/memory measurement, child-process passes and JSON baselines.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import contextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'baselines')
+DEFAULT_THRESHOLD = 1.25
+
+# Fixed program window so results don't depend on the local .env (must be set before importing src.config)
+BENCH_ENV = {
+    "START_DATE": "2024-09-09T00:00:00",
+    "PROGRAM_DURATION_WEEKS": "30",
+    "TOTAL_REWARDS": "50000",
+}
+
+RESULT_MARKER = "BENCH_RESULT "
+
+def configure_environment(extra_env=None):
+    os.environ.update(BENCH_ENV)
+    if extra_env:
+        os.environ.update(extra_env)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+@contextmanager
+def working_directory():
+    """Run inside a fresh temporary directory laid out like the repository's data/ folder."""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix='tlp_bench_')
+    os.makedirs(os.path.join(path, 'data', 'balances'))
+    os.makedirs(os.path.join(path, 'logs'))
+    shutil.copytree(os.path.join(REPO_ROOT, 'abi'), os.path.join(path, 'abi'))
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+class StageRecorder:
+    """
+    Records wall time per stage, or peak traced memory per stage when
+    `memory` is set (tracemalloc slows code down, so the two are measured
+    in separate passes).
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.results[name] = {"peak_mb": round(peak / 2**20, 3)}
+        else:
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.results[name] = {"seconds": round(time.perf_counter() - started, 4)}
+
+def emit_result(result):
+    """Print a child pass result for run_child to pick up."""
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+def run_child(module, args):
+    """Run `python -m module args...` from the repository root and return its emitted result."""
+    completed = subprocess.run(
+        [sys.executable, '-m', module, *args],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Benchmark pass {module} {' '.join(args)} failed:\n{completed.stderr[-4000:]}")
+
+def merge_stage_results(*passes):
+    merged = {}
+    for stage_results in passes:
+        for stage, metrics in stage_results.items():
+            merged.setdefault(stage, {}).update(metrics)
+    return merged
+
+def load_baseline(name):
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(name, key, results):
+    baseline = load_baseline(name)
+    baseline[key] = results
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(os.path.join(BASELINE_DIR, f"{name}.json"), 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def check_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare stage metrics against a baseline.
+
+    :return: List of human-readable regression messages (empty if none).
+    """
+    regressions = []
+    for stage, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(stage, {}).get(metric)
+            if reference and value > reference * threshold:
+                regressions.append(f"{stage}.{metric}: {value} vs baseline {reference} (> {threshold:.2f}x)")
+    return regressions
+
+def report(title, results, baseline=None):
+    print(f"\n{title}")
+    for stage, metrics in results.items():
+        parts = []
+        for metric, value in metrics.items():
+            reference = (baseline or {}).get(stage, {}).get(metric)
+            parts.append(f"{metric}={value}" + (f" (baseline {reference})" if reference else ""))
+        print(f"  {stage:<28} {'  '.join(parts)}")
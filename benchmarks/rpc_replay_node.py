@@ -0,0 +1,443 @@
+"""
+Local stand-in for the Arbitrum JSON-RPC endpoint.
+
+Serves eth_getLogs, eth_getBlockByNumber, eth_getTransactionByHash, eth_call
+(including Multicall3 aggregate3 over the recorded calls) and eth_blockNumber
+from an in-memory chain built from a recorded fixture
+file or from the synthetic event generator. Latency, HTTP 429 responses and
+provider-style result-size limits can be injected, and every request is
+counted per method.
+
+    python -m benchmarks.rpc_replay_node --events 20000 --port 8545
+    python -m benchmarks.rpc_replay_node --fixture fixtures/chain.json --latency-ms 40 --rate-limit-every 50
+
+Fixture format (all numbers as JSON integers, hashes/addresses as 0x hex):
+    {"head": int,
+     "blocks": {"<number>": <timestamp>},
+     "logs": [{"address", "topics", "data", "blockNumber", "transactionHash", "logIndex"}],
+     "transactions": {"<hash>": {"from", "to"}},
+     "calls": {"<to lowercase>:<calldata lowercase>": "<0x result>"}}
+"""
+import json
+import time
+import random
+import bisect
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import encode_abi, decode_abi
+from eth_utils import function_signature_to_4byte_selector
+
+ZERO_HASH = '0x' + '00' * 32
+# Same as src.blockchain.multicall.MULTICALL3_ADDRESS (src is not imported here: importing it reads the RPC URL)
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+AGGREGATE3_SELECTOR = '0x' + function_signature_to_4byte_selector('aggregate3((address,bool,bytes)[])').hex()
+
+def _to_hex(value):
+    return hex(value)
+
+def _pad_address(address):
+    return '0x' + '00' * 12 + address.lower()[2:]
+
+class ReplayChain:
+    """In-memory chain data indexed for the served RPC methods."""
+
+    def __init__(self, head, blocks, logs, transactions, calls):
+        self.head = head
+        self.blocks = {int(number): timestamp for number, timestamp in blocks.items()}
+        self.logs = sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex']))
+        self.log_blocks = [log['blockNumber'] for log in self.logs]
+        self.transactions = {tx_hash.lower(): tx for tx_hash, tx in transactions.items()}
+        self.calls = {key.lower(): result for key, result in calls.items()}
+        self._block_numbers = sorted(self.blocks)
+
+    @classmethod
+    def from_fixture(cls, path):
+        with open(path, 'r') as f:
+            fixture = json.load(f)
+        return cls(fixture['head'], fixture['blocks'], fixture['logs'], fixture['transactions'], fixture['calls'])
+
+    def to_fixture(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                "head": self.head,
+                "blocks": {str(number): timestamp for number, timestamp in self.blocks.items()},
+                "logs": self.logs,
+                "transactions": self.transactions,
+                "calls": self.calls,
+            }, f)
+
+    def block_timestamp(self, number):
+        if number in self.blocks:
+            return self.blocks[number]
+        # Interpolate timestamps of blocks without logs from the nearest known block (~4 blocks/s)
+        index = bisect.bisect_right(self._block_numbers, number) - 1
+        if index < 0:
+            nearest = self._block_numbers[0] if self._block_numbers else number
+        else:
+            nearest = self._block_numbers[index]
+        return self.blocks.get(nearest, 1_700_000_000) + (number - nearest) // 4
+
+    def get_logs(self, from_block, to_block, addresses, topic0s):
+        start = bisect.bisect_left(self.log_blocks, from_block)
+        end = bisect.bisect_right(self.log_blocks, to_block)
+        return [
+            log for log in self.logs[start:end]
+            if (addresses is None or log['address'].lower() in addresses)
+            and (topic0s is None or log['topics'][0] in topic0s)
+        ]
+
+def build_synthetic_chain(n_events, n_providers, seed=42):
+    """
+    Build a chain whose logs encode synthetic events for every configured pool.
+    Requires src.config to be importable (run configure_environment first).
+    """
+    from eth_abi import encode_abi
+    from eth_utils import keccak
+    from benchmarks.synthetic import generate_events
+    from src.config import POOLS
+    from src.utils.helpers import get_pool_abi
+
+    pools = {pool['address']: pool for pool in POOLS}
+    event_abis = {}
+    for pool in POOLS:
+        for item in get_pool_abi(pool):
+            if item['type'] == 'event' and item['name'] in pool['events']:
+                signature = f"{item['name']}({','.join(i['type'] for i in item['inputs'])})"
+                event_abis[(pool['address'], item['name'])] = (item, '0x' + keccak(text=signature).hex())
+
+    events = generate_events(n_events, n_providers, seed)
+    blocks, logs, transactions = {}, [], {}
+    for event in events:
+        event_abi, topic0 = event_abis[(event['pool_address'], event['event'])]
+        args = dict(event['args'])
+        args.setdefault('sender', event['provider'])
+        topics = [topic0]
+        data_types, data_values = [], []
+        for abi_input in event_abi['inputs']:
+            value = args.get(abi_input['name'], [] if abi_input['type'].endswith('[]') else 0)
+            if abi_input['indexed']:
+                if abi_input['type'] == 'address':
+                    topics.append(_pad_address(value))
+                else:
+                    topics.append('0x' + encode_abi([abi_input['type']], [value]).hex())
+            else:
+                data_types.append(abi_input['type'])
+                data_values.append(value)
+
+        tx_hash = '0x' + event['transactionHash'].removeprefix('0x')
+        blocks[event['blockNumber']] = event['timestamp']
+        transactions[tx_hash] = {"from": event['provider'], "to": event['pool_address']}
+        logs.append({
+            "address": event['pool_address'],
+            "topics": topics,
+            "data": '0x' + encode_abi(data_types, data_values).hex(),
+            "blockNumber": event['blockNumber'],
+            "transactionHash": tx_hash,
+            "logIndex": 0,
+        })
+
+    calls = {}
+    selectors = {"token0": "0x0dfe1681", "token1": "0xd21220a7", "coins": "0xc6610657"}
+    for address, pool in pools.items():
+        token0 = pool['tokens'][0]['token0']['address']
+        token1 = pool['tokens'][1]['token1']['address']
+        calls[f"{address}:{selectors['token0']}"] = _pad_address(token0)
+        calls[f"{address}:{selectors['token1']}"] = _pad_address(token1)
+        calls[f"{address}:{selectors['coins']}{0:064x}"] = _pad_address(token0)
+        calls[f"{address}:{selectors['coins']}{1:064x}"] = _pad_address(token1)
+
+    head = max(blocks) + 1000 if blocks else 1000
+    blocks.setdefault(head, max(blocks.values()) + 250 if blocks else 1_700_000_000)
+    return ReplayChain(head, blocks, logs, transactions, calls)
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class ReplayNode:
+    """
+    JSON-RPC server over a ReplayChain.
+
+    :param latency_ms: Added delay per HTTP request.
+    :param rate_limit_every: Answer every Nth HTTP request with a 429 (0 disables).
+    :param max_logs: eth_getLogs result-size limit; larger results get a -32005 error (0 disables).
+    :param finality_lag: Blocks between "latest" and "finalized".
+    """
+
+    def __init__(self, chain, latency_ms=0, jitter_ms=0, rate_limit_every=0, retry_after=1, max_logs=0, finality_lag=0):
+        self.chain = chain
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.max_logs = max_logs
+        self.finality_lag = finality_lag
+        self.call_counts = Counter()
+        self.http_requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --- request accounting ---
+
+    def _admit_request(self):
+        """Count the HTTP request and decide whether to answer it with a 429."""
+        with self._lock:
+            self.http_requests += 1
+            limited = bool(self.rate_limit_every) and self.http_requests % self.rate_limit_every == 0
+            if limited:
+                self.rate_limited += 1
+            return limited
+
+    def stats(self):
+        with self._lock:
+            return {
+                "http_requests": self.http_requests,
+                "rate_limited": self.rate_limited,
+                "calls": dict(self.call_counts),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.call_counts.clear()
+            self.http_requests = 0
+            self.rate_limited = 0
+
+    # --- RPC methods ---
+
+    def _resolve_block(self, tag):
+        if tag in (None, 'latest', 'pending'):
+            return self.chain.head
+        if tag in ('finalized', 'safe'):
+            return self.chain.head - self.finality_lag
+        if tag == 'earliest':
+            return 0
+        return int(tag, 16) if isinstance(tag, str) else int(tag)
+
+    def _block(self, number):
+        return {
+            "number": _to_hex(number),
+            "hash": '0x' + f"{number:064x}",
+            "parentHash": '0x' + f"{max(number - 1, 0):064x}",
+            "timestamp": _to_hex(self.chain.block_timestamp(number)),
+            "nonce": '0x' + '00' * 8,
+            "miner": '0x' + '00' * 20,
+            "difficulty": '0x1',
+            "totalDifficulty": '0x1',
+            "extraData": '0x',
+            "size": '0x0',
+            "gasLimit": '0x4000000000000',
+            "gasUsed": '0x0',
+            "logsBloom": '0x' + '00' * 256,
+            "transactionsRoot": ZERO_HASH,
+            "stateRoot": ZERO_HASH,
+            "receiptsRoot": ZERO_HASH,
+            "sha3Uncles": ZERO_HASH,
+            "transactions": [],
+            "uncles": [],
+        }
+
+    def _log(self, log):
+        return {
+            "address": log['address'],
+            "topics": log['topics'],
+            "data": log['data'],
+            "blockNumber": _to_hex(log['blockNumber']),
+            "blockHash": '0x' + f"{log['blockNumber']:064x}",
+            "transactionHash": log['transactionHash'],
+            "transactionIndex": '0x0',
+            "logIndex": _to_hex(log['logIndex']),
+            "removed": False,
+        }
+
+    def eth_blockNumber(self):
+        return _to_hex(self.chain.head)
+
+    def eth_chainId(self):
+        return _to_hex(42161)
+
+    def net_version(self):
+        return "42161"
+
+    def web3_clientVersion(self):
+        return "tlp-replay-node/1.0"
+
+    def eth_getBlockByNumber(self, tag, full_transactions=False):
+        number = self._resolve_block(tag)
+        return self._block(number) if number <= self.chain.head else None
+
+    def eth_getLogs(self, log_filter):
+        from_block = self._resolve_block(log_filter.get('fromBlock'))
+        to_block = self._resolve_block(log_filter.get('toBlock'))
+        address = log_filter.get('address')
+        addresses = None if address is None else {a.lower() for a in ([address] if isinstance(address, str) else address)}
+        topics = log_filter.get('topics') or []
+        topic0s = None
+        if topics and topics[0] is not None:
+            topic0s = {topics[0]} if isinstance(topics[0], str) else set(topics[0])
+        logs = self.chain.get_logs(from_block, to_block, addresses, topic0s)
+        if self.max_logs and len(logs) > self.max_logs:
+            raise RpcError(-32005, f"query returned more than {self.max_logs} results")
+        return [self._log(log) for log in logs]
+
+    def eth_getTransactionByHash(self, tx_hash):
+        tx = self.chain.transactions.get(tx_hash.lower())
+        if tx is None:
+            return None
+        return {
+            "hash": tx_hash,
+            "from": tx['from'],
+            "to": tx.get('to'),
+            "blockHash": ZERO_HASH,
+            "blockNumber": '0x0',
+            "transactionIndex": '0x0',
+            "value": '0x0',
+            "gas": '0x0',
+            "gasPrice": '0x0',
+            "input": '0x',
+            "nonce": '0x0',
+            "v": '0x0',
+            "r": ZERO_HASH,
+            "s": ZERO_HASH,
+        }
+
+    def eth_call(self, call, block_tag='latest'):
+        to = call.get('to', '').lower()
+        data = call.get('data', call.get('input', '')).lower()
+        if to == MULTICALL3_ADDRESS.lower() and data.startswith(AGGREGATE3_SELECTOR):
+            return self._aggregate3(data)
+        key = f"{to}:{data}"
+        if key not in self.chain.calls:
+            raise RpcError(-32000, "execution reverted")
+        return self.chain.calls[key]
+
+    def _aggregate3(self, data):
+        """Multicall3 aggregate3 over the recorded calls (counted as one eth_call, like on a real node)."""
+        (calls,) = decode_abi(['(address,bool,bytes)[]'], bytes.fromhex(data[len(AGGREGATE3_SELECTOR):]))
+        results = []
+        for target, allow_failure, calldata in calls:
+            result = self.chain.calls.get(f"{target.lower()}:0x{calldata.hex()}")
+            if result is None and not allow_failure:
+                raise RpcError(3, "execution reverted: Multicall3: call failed")
+            results.append((result is not None, bytes.fromhex(result[2:]) if result else b''))
+        return '0x' + encode_abi(['(bool,bytes)[]'], [results]).hex()
+
+    def dispatch(self, request):
+        method = request.get('method')
+        with self._lock:
+            self.call_counts[method] += 1
+        response = {"jsonrpc": "2.0", "id": request.get('id')}
+        handler = getattr(self, method, None) if method and (method.startswith('eth_') or method in ('net_version', 'web3_clientVersion')) else None
+        try:
+            if handler is None:
+                raise RpcError(-32601, f"Method not found: {method}")
+            response["result"] = handler(*request.get('params', []))
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        return response
+
+    # --- server lifecycle ---
+
+    def start(self, host='127.0.0.1', port=0):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._send(200, node.stats())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if node.latency_ms or node.jitter_ms:
+                    time.sleep((node.latency_ms + random.uniform(0, node.jitter_ms)) / 1000)
+                if node._admit_request():
+                    self._send(429, {"error": "Too Many Requests"}, {"Retry-After": str(node.retry_after)})
+                    return
+                if isinstance(payload, list):
+                    self._send(200, [node.dispatch(request) for request in payload])
+                else:
+                    self._send(200, node.dispatch(payload))
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def add_node_arguments(parser):
+    parser.add_argument("--fixture", help="Recorded chain fixture (JSON); synthetic data is generated otherwise")
+    parser.add_argument("--events", type=int, default=5_000, help="Synthetic events")
+    parser.add_argument("--providers", type=int, default=500, help="Synthetic providers")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with HTTP 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--max-logs", type=int, default=0, help="eth_getLogs result-size limit")
+    parser.add_argument("--finality-lag", type=int, default=0, help="Blocks between latest and finalized")
+
+def build_node(args):
+    if args.fixture:
+        chain = ReplayChain.from_fixture(args.fixture)
+    else:
+        chain = build_synthetic_chain(args.events, args.providers, args.seed)
+    return ReplayNode(
+        chain, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rate_limit_every=args.rate_limit_every, retry_after=args.retry_after,
+        max_logs=args.max_logs, finality_lag=args.finality_lag
+    )
+
+if __name__ == "__main__":
+    from benchmarks.harness import configure_environment
+    configure_environment()
+
+    parser = argparse.ArgumentParser(description="Local JSON-RPC replay node for fetch benchmarks")
+    add_node_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--save-fixture", help="Write the chain to a fixture file and exit")
+
+    args = parser.parse_args()
+    node = build_node(args)
+
+    if args.save_fixture:
+        node.chain.to_fixture(args.save_fixture)
+        print(f"Fixture saved to {args.save_fixture}")
+    else:
+        print(f"Replay node serving {len(node.chain.logs)} logs up to block {node.chain.head} at {node.start(args.host, args.port)}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            node.stop()
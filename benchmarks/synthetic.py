@@ -0,0 +1,91 @@
+"""
+Seeded synthetic data for benchmarks.
+
+Generates events in the `data/pools_events.json` schema written by
+EventFetcher (Curve and UniV3 pools from src.config.POOLS) and daily price
+history for every token in src.config.TOKENS.
+"""
+import random
+from eth_utils import to_checksum_address
+from src.config import POOLS, TOKENS, START_TIMESTAMP, END_TIMESTAMP
+
+DAY_SECONDS = 24 * 60 * 60
+
+# Typical position sizes in whole tokens, per symbol
+TOKEN_SCALE = {"tBTC": 0.5, "WBTC": 0.5, "ETH": 8.0}
+
+def generate_providers(n_providers, rng):
+    return [to_checksum_address('0x' + rng.getrandbits(160).to_bytes(20, 'big').hex()) for _ in range(n_providers)]
+
+def _random_amount(rng, token):
+    return int(rng.uniform(0.001, 2.0) * TOKEN_SCALE.get(token['symbol'], 1.0) * 10 ** token['decimals'])
+
+def _build_args(event_name, provider, amounts, rng):
+    if event_name in ("AddLiquidity", "RemoveLiquidity", "RemoveLiquidityImbalance"):
+        return {"provider": provider, "token_amounts": amounts, "fees": [0, 0], "token_supply": rng.getrandbits(80)}
+    if event_name == "RemoveLiquidityOne":
+        token_id = 0 if amounts[0] else 1
+        return {"provider": provider, "token_id": token_id, "token_amount": rng.getrandbits(64), "coin_amount": amounts[token_id]}
+    # UniV3 Mint/Burn
+    return {"owner": provider, "tickLower": -887220, "tickUpper": 887220, "amount": rng.getrandbits(64), "amount0": amounts[0], "amount1": amounts[1]}
+
+def generate_events(n_events, n_providers, seed=42):
+    """
+    Generate `n_events` liquidity events spread over `n_providers` providers
+    and all configured pools, ordered by block like the fetcher output.
+    """
+    rng = random.Random(seed)
+    providers = generate_providers(n_providers, rng)
+    first_timestamp = START_TIMESTAMP - 60 * DAY_SECONDS
+    events = []
+    for _ in range(n_events):
+        pool = rng.choice(POOLS)
+        token0 = pool['tokens'][0]['token0']
+        token1 = pool['tokens'][1]['token1']
+        provider = rng.choice(providers)
+        is_add = rng.random() < 0.6
+        if "Mint" in pool['events']:
+            event_name = "Mint" if is_add else "Burn"
+        else:
+            event_name = "AddLiquidity" if is_add else rng.choice(["RemoveLiquidity", "RemoveLiquidityOne", "RemoveLiquidityImbalance"])
+
+        amounts = [_random_amount(rng, token0), _random_amount(rng, token1)]
+        if event_name == "RemoveLiquidityOne":
+            amounts[rng.randrange(2)] = 0
+
+        events.append({
+            "event": event_name,
+            "args": _build_args(event_name, provider, amounts, rng),
+            "provider": provider,
+            "timestamp": rng.randint(first_timestamp, END_TIMESTAMP),
+            "transactionHash": rng.getrandbits(256).to_bytes(32, 'big').hex(),
+            "logIndex": rng.randrange(64),
+            "_from": provider,
+            "pool_address": pool['address'],
+            "tokens": {"token0": token0, "token1": token1},
+            "amounts": amounts,
+            "action": "add" if is_add else "remove",
+        })
+    events.sort(key=lambda e: e['timestamp'])
+    for block_number, event in enumerate(events, start=250_000_000):
+        event['blockNumber'] = block_number
+    return events
+
+def generate_price_history(seed=42):
+    """
+    Daily [timestamp_ms, price] points from 90 days before the program start
+    to one day after its end, as a seeded random walk per token.
+    """
+    rng = random.Random(seed)
+    start_prices = {"tbtc": 60000.0, "wrapped-bitcoin": 60000.0, "ethereum": 2500.0, "arbitrum": 0.6, "threshold-network-token": 0.02}
+    first_day = (START_TIMESTAMP // DAY_SECONDS - 90) * DAY_SECONDS
+    last_day = (END_TIMESTAMP // DAY_SECONDS + 1) * DAY_SECONDS
+    history = {}
+    for coingecko_id in TOKENS.values():
+        price = start_prices.get(coingecko_id, 1.0)
+        points = []
+        for timestamp in range(first_day, last_day + 1, DAY_SECONDS):
+            price *= 1 + rng.gauss(0, 0.02)
+            points.append([timestamp * 1000, price])
+        history[coingecko_id] = points
+    return history
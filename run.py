@@ -1,13 +1,21 @@
 import os
 import asyncio
 import logging
+import argparse
 from src.app import create_app, main
+from src.utils.profiling import run_profiler
 from threading import Thread
 
 async def run_main():
     await main()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the processing loop and the Flask API")
+    parser.add_argument("--profile", action="store_true", help="Profile each pipeline stage into logs/profiles/<run> (same as TLP_PROFILE=1)")
+    parser.add_argument("--profile-every", type=int, help="Only profile every Nth run (same as TLP_PROFILE_EVERY)")
+    args = parser.parse_args()
+    run_profiler.configure(enabled=True if args.profile else None, every=args.profile_every)
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -1,42 +1,83 @@
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, timedelta, timezone
-from flask import Flask, jsonify, send_file
+from flask import Flask, Response, g, jsonify, request, send_file
 import signal
 import sys
 from flask_cors import CORS
 import asyncio
 import os
+import time
 import traceback
+from contextlib import contextmanager
 
-from src.config import END_DATE, POOLS
+from src.config import END_DATE, POOLS, RUN_INTERVAL_SECONDS, ERROR_RETRY_DELAY_SECONDS
 from src.blockchain.web3_client import web3_client
-from src.blockchain.event_fetcher import event_fetcher
+from src.blockchain.event_fetcher import event_fetcher, PROVISIONAL_EVENTS_FILE
 from src.data.price_fetcher import update_price_data
 from src.calculator.rewards import calculate_rewards
-from src.data.state_manager import save_state, load_state
-from src.data.json_logger import save_json_data
+from src.data.state_manager import save_state, load_state, lowest_event_cursor
+from src.data.json_logger import save_json_data, remove_previous_rewards_file
+from src.data.snapshot_store import snapshot_store
 from src.calculator.balances import balance_calculator
 from src.calculator.daily_balances import daily_balance_calculator
+from src.data.balance_store import daily_balance_store
+from src.data.json_formatter import format_rewards, format_provider_standing
+from src.utils.helpers import format_decimal
+from src.utils.metrics import (
+    API_LATENCY, BLOCKS_BEHIND_HEAD, LAST_RUN_TIMESTAMP, render_metrics, time_stage
+)
+from src.utils.profiling import run_profiler
 
-log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+LOG_FILE = os.path.join('logs', 'app.log')
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
+logger = logging.getLogger()
+_logging_configured = False
 
-file_handler = RotatingFileHandler('logs/app.log', maxBytes=1024 * 1024 * 100, backupCount=20)
-file_handler.setFormatter(log_formatter)
+def configure_logging():
+    """Attach the console and rotating file handlers to the root logger (once), creating logs/ if needed."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(log_formatter)
+
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=1024 * 1024 * 100, backupCount=20)
+    file_handler.setFormatter(log_formatter)
 
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+    _logging_configured = True
 
 def create_app():
+    configure_logging()
     app = Flask(__name__)
     CORS(app)
 
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # Label by route pattern, not raw path, to keep cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            API_LATENCY.labels(
+                endpoint=endpoint, method=request.method, status=str(response.status_code)
+            ).observe(time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
     @app.route('/api/get_latest_rewards', methods=['GET'])
     def get_latest_rewards():
         state = load_state()
@@ -51,6 +92,75 @@ def create_app():
             logger.warning("No latest rewards file found in state")
         return jsonify({"error": "No rewards data available"}), 404
 
+    @app.route('/api/provisional_events', methods=['GET'])
+    def get_provisional_events():
+        full_path = os.path.join(os.getcwd(), PROVISIONAL_EVENTS_FILE)
+        if os.path.exists(full_path):
+            return send_file(full_path, mimetype='application/json')
+        return jsonify({"error": "No provisional events available"}), 404
+
+    @app.route('/api/scenarios', methods=['POST'])
+    def post_scenarios():
+        # numpy is only needed here, so it is not imported at startup
+        from src.calculator.scenarios import run_scenarios
+
+        if daily_balance_store.last_day() is None:
+            return jsonify({"error": "No daily balances available"}), 404
+        try:
+            return jsonify(run_scenarios(request.get_json(silent=True) or {}))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    def parse_as_of():
+        """:return: The `as_of` query parameter (ISO format, UTC unless it has an offset), or now."""
+        value = request.args.get('as_of')
+        if not value:
+            return datetime.now(timezone.utc)
+        as_of = datetime.fromisoformat(value)
+        return as_of if as_of.tzinfo else as_of.replace(tzinfo=timezone.utc)
+
+    @app.route('/api/rewards', methods=['GET'])
+    def get_rewards():
+        try:
+            as_of = parse_as_of()
+        except ValueError:
+            return jsonify({"error": "as_of must be an ISO date"}), 400
+        if daily_balance_store.last_day() is None:
+            return jsonify({"error": "No daily balances available"}), 404
+        from src.calculator.standings import rewards_as_of
+        rewards_data = rewards_as_of(as_of)
+        return jsonify({
+            "as_of": as_of.isoformat(),
+            "total_weighted_liquidity": format_decimal(rewards_data["total_weighted_liquidity"]),
+            "rewards": format_rewards(rewards_data["rewards"])
+        })
+
+    @app.route('/api/balances/<address>', methods=['GET'])
+    def get_provider_balances(address):
+        try:
+            as_of = parse_as_of()
+        except ValueError:
+            return jsonify({"error": "as_of must be an ISO date"}), 400
+        from src.calculator.standings import provider_standing
+        standing = provider_standing(address, as_of) if daily_balance_store.last_day() is not None else None
+        if standing is None:
+            return jsonify({"error": f"No balances for provider {address}"}), 404
+        return jsonify(format_provider_standing(address, as_of, standing))
+
+    @app.route('/api/snapshots', methods=['GET'])
+    def get_snapshots():
+        return jsonify({"snapshots": [
+            {"name": entry["name"], "kind": "base" if entry["base"] == entry["name"] else "delta"}
+            for entry in snapshot_store.entries()
+        ]})
+
+    @app.route('/api/snapshots/<name>', methods=['GET'])
+    def get_snapshot(name):
+        snapshot = snapshot_store.load(name)
+        if snapshot is None:
+            return jsonify({"error": f"No snapshot named {name}"}), 404
+        return jsonify(snapshot)
+
     logger.info("Application created")
     return app
 
@@ -61,12 +171,23 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+@contextmanager
+def pipeline_stage(name):
+    """Time a main() stage for /metrics and profile it when the run is sampled."""
+    with time_stage(name), run_profiler.stage(name):
+        yield
+
 async def main():
+    configure_logging()
     logger.info("Starting main async loop")
     while datetime.now(timezone.utc) <= END_DATE + timedelta(days=45):
+        run_profiler.begin_run()
         try:
-            await update_price_data()
-            current_block = web3_client.get_latest_block()
+            with pipeline_stage('update_prices'):
+                await update_price_data()
+            latest_block = web3_client.get_latest_block()
+            # Only blocks at or below the confirmed block are fetched permanently
+            current_block = web3_client.get_confirmed_block(latest_block)
             
             state = load_state()
             logger.info(f"State loaded. Last processed block: {state['last_processed_block']}")
@@ -76,15 +197,26 @@ async def main():
                 last_processed_block = min(pool['deploy_block'] for pool in POOLS)
 
             if last_processed_block + 1 <= current_block:
-                await event_fetcher.fetch_and_save_events(POOLS, last_processed_block + 1, current_block)
+                with pipeline_stage('fetch_events'):
+                    await event_fetcher.fetch_and_save_events(POOLS, last_processed_block + 1, current_block)
             else:
                 logger.info("No new blocks to process.")
+            # Measured from the pool/event pair that lags most, e.g. after a chunk that failed
+            BLOCKS_BEHIND_HEAD.set(latest_block - lowest_event_cursor(load_state(), POOLS, last_processed_block))
+
+            # The unconfirmed tail is re-scanned on every run instead of being marked processed
+            with pipeline_stage('provisional_events'):
+                await event_fetcher.refresh_provisional_events(POOLS, max(last_processed_block, current_block) + 1, latest_block)
             
-            balance_calculator.calculate_balances()
+            with pipeline_stage('calculate_balances'):
+                balance_calculator.calculate_balances()
             
-            daily_balance_calculator.calculate_daily_balances()
+            with pipeline_stage('calculate_daily_balances'):
+                daily_balance_calculator.calculate_daily_balances(balance_calculator.provider_liquidity)
             
-            rewards_data = calculate_rewards()
+            with pipeline_stage('calculate_rewards'):
+                # Reuse the balances the daily stage already read from the store
+                rewards_data = calculate_rewards(daily_balance_calculator.daily_balances)
             
             combined_data = {
                 "total_weighted_liquidity": rewards_data.get("total_weighted_liquidity"),
@@ -93,8 +225,10 @@ async def main():
                 "daily_balances": daily_balance_calculator.daily_balances
             }
             
-            rewards_file = save_json_data(combined_data)
+            with pipeline_stage('save_snapshot'):
+                rewards_file = save_json_data(combined_data)
             
+            previous_rewards_file = state.get('latest_rewards_file')
             state['last_processed_block'] = current_block
             state['latest_rewards_file'] = rewards_file
             state['last_balance_timestamp'] = balance_calculator.last_processed_timestamp
@@ -105,15 +239,17 @@ async def main():
                 state['last_balance_timestamp'],
                 state['last_daily_balance_date']
             )
+            remove_previous_rewards_file(previous_rewards_file, rewards_file)
             
+            LAST_RUN_TIMESTAMP.set_to_current_time()
             logger.info(f"State saved. Last processed block: {current_block}, Last balance timestamp: {balance_calculator.last_processed_timestamp}, Last daily balance date: {state['last_daily_balance_date']}")
         except Exception as e:
             logger.error(f"An error occurred in the main loop: {str(e)}")
             logger.error(traceback.format_exc())
-            await asyncio.sleep(10800)
+            await asyncio.sleep(min(ERROR_RETRY_DELAY_SECONDS, RUN_INTERVAL_SECONDS))
         
-        logger.info(f"Sleeping for 24 hours")
-        await asyncio.sleep(86400)
+        logger.info(f"Sleeping for {RUN_INTERVAL_SECONDS} seconds")
+        await asyncio.sleep(RUN_INTERVAL_SECONDS)
 
 if __name__ == "__main__":
     app = create_app()
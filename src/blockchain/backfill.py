@@ -0,0 +1,372 @@
+"""
+Parallel historical backfill through a lease-based work queue.
+
+`init` splits [start, to_block] of every pool/event into range tasks in a
+SQLite queue. `work` runs worker processes that lease tasks, fetch and
+decode their logs and write one segment file per task; workers on other
+machines can share the same queue file. `merge` folds the segments into the
+canonical event store in a deterministic order and advances the per-event
+cursors, after which the regular main() loop continues from the tip.
+
+    python -m src.blockchain.backfill init --to-block 250000000
+    python -m src.blockchain.backfill work --workers 8
+    python -m src.blockchain.backfill status
+    python -m src.blockchain.backfill merge
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import multiprocessing
+from collections import namedtuple
+from src.config import (
+    POOLS, BACKFILL_QUEUE_FILE, BACKFILL_SEGMENTS_DIR, BACKFILL_RANGE_SIZE,
+    BACKFILL_LEASE_SECONDS, BACKFILL_MAX_ATTEMPTS
+)
+from src.data.state_manager import load_state, update_state, get_event_cursor, save_event_cursor, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+BackfillTask = namedtuple('BackfillTask', ['id', 'pool_address', 'event_name', 'from_block', 'to_block', 'attempts'])
+
+# Seconds an idle worker waits before checking whether a leased task expired
+IDLE_POLL_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    pool_address TEXT NOT NULL,
+    event_name TEXT NOT NULL,
+    from_block INTEGER NOT NULL,
+    to_block INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    segment TEXT,
+    event_count INTEGER,
+    error TEXT,
+    UNIQUE (pool_address, event_name, from_block)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class BackfillQueue:
+    """
+    Durable task queue in a SQLite file.
+
+    A task is `pending`, `leased` (owned by a worker until `lease_expires`),
+    `done` or `failed` (after BACKFILL_MAX_ATTEMPTS). Leasing takes a write
+    lock, so concurrent workers never get the same task; an expired lease
+    makes the task available again.
+    """
+
+    def __init__(self, path=BACKFILL_QUEUE_FILE, lease_seconds=BACKFILL_LEASE_SECONDS, max_attempts=BACKFILL_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def add_ranges(self, pool_address, event_name, from_block, to_block, range_size):
+        """Queue [from_block, to_block] as tasks of `range_size` blocks. Existing tasks are kept."""
+        rows = []
+        start = from_block
+        while start <= to_block:
+            end = min(start + range_size - 1, to_block)
+            rows.append((pool_address, event_name, start, end))
+            start = end + 1
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO tasks (pool_address, event_name, from_block, to_block) VALUES (?, ?, ?, ?)", rows
+        )
+        return len(rows)
+
+    def lease(self, owner):
+        """:return: The next available BackfillTask leased to `owner`, or None."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A worker that died on its last attempt leaves an expired lease behind
+            self.conn.execute(
+                """UPDATE tasks SET status = 'failed', error = COALESCE(error, 'lease expired on last attempt')
+                   WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                (now, self.max_attempts)
+            )
+            row = self.conn.execute(
+                """SELECT id, pool_address, event_name, from_block, to_block, attempts FROM tasks
+                   WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ?
+                   ORDER BY id LIMIT 1""",
+                (now, self.max_attempts)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ? WHERE id = ?",
+                (owner, now + self.lease_seconds, row[0])
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        task = BackfillTask(*row)
+        return task._replace(attempts=task.attempts + 1)
+
+    def renew(self, task_id, owner):
+        """Extend a lease. :return: False if the lease was lost (expired and taken by another worker)."""
+        cursor = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+            (time.time() + self.lease_seconds, task_id, owner)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, owner, segment, event_count):
+        cursor = self.conn.execute(
+            """UPDATE tasks SET status = 'done', segment = ?, event_count = ?, error = NULL, lease_expires = NULL
+               WHERE id = ? AND lease_owner = ? AND status = 'leased'""",
+            (segment, event_count, task_id, owner)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, owner, error):
+        """Release a task for retry, or mark it failed once it used up its attempts."""
+        self.conn.execute(
+            """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                   error = ?, lease_owner = NULL, lease_expires = NULL
+               WHERE id = ? AND lease_owner = ? AND status = 'leased'""",
+            (self.max_attempts, error, task_id, owner)
+        )
+
+    def retry_failed(self):
+        """Give failed tasks a fresh set of attempts. :return: Number of tasks reset."""
+        return self.conn.execute("UPDATE tasks SET status = 'pending', attempts = 0 WHERE status = 'failed'").rowcount
+
+    def counts(self):
+        """:return: {status: task count}."""
+        counts = dict.fromkeys(('pending', 'leased', 'done', 'failed'), 0)
+        counts.update(self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        return counts
+
+    def has_open_tasks(self):
+        """True while any task may still be leased now or after a lease expires."""
+        return self.conn.execute(
+            "SELECT 1 FROM tasks WHERE status IN ('pending', 'leased') LIMIT 1"
+        ).fetchone() is not None
+
+    def done_tasks(self):
+        return self.conn.execute(
+            "SELECT pool_address, event_name, from_block, to_block, segment FROM tasks WHERE status = 'done' ORDER BY id"
+        ).fetchall()
+
+def segment_path(task, segments_dir=BACKFILL_SEGMENTS_DIR):
+    # Deterministic per task, so a retried task overwrites its earlier partial attempt
+    return os.path.join(segments_dir, f"{task.pool_address}_{task.event_name}_{task.from_block}_{task.to_block}.json")
+
+def init_queue(queue, to_block, range_size=BACKFILL_RANGE_SIZE, pools=POOLS):
+    """
+    Queue every pool/event from its deploy block (or stored cursor) up to `to_block`.
+    The pools' token attributes are resolved here and stored in the queue, so
+    workers never write program_state.json; only merge_segments does.
+
+    :return: Number of range tasks queued.
+    """
+    from src.blockchain.event_fetcher import event_fetcher
+
+    queued_to_block = queue.get_meta('to_block')
+    if queued_to_block is not None and queued_to_block != to_block:
+        raise ValueError(f"Queue {queue.path} was initialized up to block {queued_to_block}; remove it to start a new backfill")
+    queue.set_meta('to_block', to_block)
+    event_fetcher.resolve_pool_tokens(pools, persist=False)
+    queue.set_meta('pool_tokens', {
+        pool['address']: list(event_fetcher.pool_tokens[pool['address']])
+        for pool in pools if pool['address'] in event_fetcher.pool_tokens
+    })
+
+    state = load_state()
+    queued = 0
+    for pool in pools:
+        for event_name in pool.get('events', []):
+            cursor = get_event_cursor(state, pool['address'], event_name)
+            from_block = max(pool['deploy_block'], cursor + 1 if cursor is not None else 0)
+            if from_block <= to_block:
+                queued += queue.add_ranges(pool['address'], event_name, from_block, to_block, range_size)
+    logger.info(f"Queued {queued} range tasks up to block {to_block} in {queue.path}")
+    return queued
+
+def process_task(queue, task, owner, pools_by_address, pool_tokens):
+    """
+    Fetch one task's range chunk by chunk and write its segment.
+
+    :param pool_tokens: {pool address: [token0, token1]} as init_queue stored them.
+    :return: True if completed.
+    """
+    from src.blockchain.event_fetcher import event_fetcher, LOG_FETCH_CHUNK_SIZE
+
+    pool = pools_by_address.get(task.pool_address)
+    decoder = event_fetcher.decoders.for_pool(pool, task.event_name) if pool else None
+    if decoder is None:
+        queue.fail(task.id, owner, f"Unknown pool or event {task.pool_address} {task.event_name}")
+        return False
+    if task.pool_address not in pool_tokens:
+        queue.fail(task.id, owner, f"Tokens of pool {task.pool_address} were not resolved by init")
+        return False
+    token0, token1 = pool_tokens[task.pool_address]
+
+    events = []
+    current_from = task.from_block
+    while current_from <= task.to_block:
+        current_to = min(current_from + LOG_FETCH_CHUNK_SIZE - 1, task.to_block)
+        chunk_events = event_fetcher.fetch_chunk(pool, decoder, current_from, current_to, token0, token1)
+        if chunk_events is None:
+            queue.fail(task.id, owner, f"Failed to fetch logs for {current_from}-{current_to}")
+            return False
+        events.extend(chunk_events)
+        if not queue.renew(task.id, owner):
+            logger.warning(f"Lost lease on task {task.id}; another worker will redo it")
+            return False
+        current_from = current_to + 1
+
+    path = segment_path(task)
+    write_json_atomic(path, events)
+    if not queue.complete(task.id, owner, path, len(events)):
+        logger.warning(f"Lost lease on task {task.id} before completing it; its segment will be rewritten")
+        return False
+    logger.info(f"Task {task.id} done: {task.event_name} {task.from_block}-{task.to_block} for pool {task.pool_address}, {len(events)} events")
+    return True
+
+def run_worker(queue_path=BACKFILL_QUEUE_FILE, owner=None):
+    """Lease and process tasks until none are pending or leased. :return: Number of tasks completed."""
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    queue = BackfillQueue(queue_path)
+    pools_by_address = {pool['address']: pool for pool in POOLS}
+    pool_tokens = queue.get_meta('pool_tokens') or {}
+    completed = 0
+    try:
+        while True:
+            task = queue.lease(owner)
+            if task is None:
+                if not queue.has_open_tasks():
+                    break
+                # Tasks leased by other workers become available again if their lease expires
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            try:
+                completed += process_task(queue, task, owner, pools_by_address, pool_tokens)
+            except Exception as e:
+                logger.error(f"Task {task.id} failed: {str(e)}")
+                queue.fail(task.id, owner, str(e))
+    finally:
+        queue.close()
+    logger.info(f"Worker {owner} finished after completing {completed} tasks")
+    return completed
+
+def _worker_process(queue_path):
+    # Spawned processes don't inherit the parent's logging setup
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    run_worker(queue_path)
+
+def segment_sort_key(event):
+    return (event.get('blockNumber', 0), event.get('logIndex', 0), event['pool_address'], event['event'])
+
+def merge_segments(queue):
+    """
+    Append all segment events to the event store in (block, log index) order
+    and advance every queued pool/event cursor to the backfill's end block.
+
+    :return: Number of events read from segments.
+    """
+    from src.blockchain.event_fetcher import event_fetcher
+
+    counts = queue.counts()
+    if counts['pending'] or counts['leased'] or counts['failed']:
+        raise RuntimeError(f"Backfill is not complete: {counts}")
+    to_block = queue.get_meta('to_block')
+
+    events = []
+    for _, _, _, _, segment in queue.done_tasks():
+        with open(segment, 'r') as f:
+            events.extend(json.load(f))
+    events.sort(key=segment_sort_key)
+    if events:
+        event_fetcher.save_events(events)
+
+    state = load_state()
+    for pool_address, event_name in {(row[0], row[1]) for row in queue.done_tasks()}:
+        cursor = get_event_cursor(state, pool_address, event_name)
+        if cursor is None or cursor < to_block:
+            save_event_cursor(pool_address, event_name, to_block)
+    last_processed_block = load_state().get('last_processed_block')
+    if last_processed_block is None or last_processed_block < to_block:
+        update_state(last_processed_block=to_block)
+
+    logger.info(f"Merged {len(events)} events from {counts['done']} segments up to block {to_block}")
+    return len(events)
+
+def print_status(queue):
+    counts = queue.counts()
+    total = sum(counts.values())
+    print(f"Backfill up to block {queue.get_meta('to_block')}: {counts['done']}/{total} tasks done")
+    for status, count in counts.items():
+        print(f"  {status:<8} {count}")
+    for task_id, error in queue.conn.execute("SELECT id, error FROM tasks WHERE status = 'failed' ORDER BY id LIMIT 20"):
+        print(f"  task {task_id} failed: {error}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Parallel historical event backfill")
+    parser.add_argument("command", choices=["init", "work", "status", "merge", "retry-failed"])
+    parser.add_argument("--queue", default=BACKFILL_QUEUE_FILE, help="SQLite queue file (share it to add workers on other machines)")
+    parser.add_argument("--to-block", type=int, help="init: last block to backfill (defaults to the confirmed block)")
+    parser.add_argument("--range-size", type=int, default=BACKFILL_RANGE_SIZE, help="init: blocks per task")
+    parser.add_argument("--workers", type=int, default=1, help="work: number of worker processes")
+
+    args = parser.parse_args()
+    queue = BackfillQueue(args.queue)
+
+    if args.command == "init":
+        if args.to_block is None:
+            from src.blockchain.web3_client import web3_client
+            args.to_block = web3_client.get_confirmed_block()
+        init_queue(queue, args.to_block, args.range_size)
+        print_status(queue)
+    elif args.command == "work":
+        queue.close()
+        # Spawned (not forked) so every worker opens its own RPC session and SQLite connection
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=_worker_process, args=(args.queue,), name=f"worker-{i}") for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        queue = BackfillQueue(args.queue)
+        print_status(queue)
+    elif args.command == "status":
+        print_status(queue)
+    elif args.command == "retry-failed":
+        print(f"Reset {queue.retry_failed()} failed tasks")
+    else:
+        try:
+            merge_segments(queue)
+        except RuntimeError as e:
+            print(str(e))
+            sys.exit(1)
+    queue.close()
@@ -0,0 +1,114 @@
+import logging
+from eth_utils import keccak
+from eth_abi.registry import registry as abi_type_registry
+from eth_abi.decoding import TupleDecoder, ContextFramesBytesIO
+from src.utils.helpers import get_pool_abi
+
+logger = logging.getLogger(__name__)
+
+def event_signature(event_abi):
+    types = ','.join(input['type'] for input in event_abi['inputs'])
+    return f"{event_abi['name']}({types})"
+
+class EventDecoder:
+    """
+    Decoder for one event ABI, compiled once: the topic hash, the field
+    layout and the eth_abi tuple decoder for the non-indexed inputs.
+
+    Produces the same {'event', 'args'} dict as helpers.decode_log; indexed
+    arguments are kept as their raw topics.
+    """
+
+    __slots__ = ('name', 'signature', 'topic0', 'topic0_bytes', 'indexed_names', 'data_names', 'data_decoder')
+
+    def __init__(self, event_abi):
+        self.name = event_abi['name']
+        self.signature = event_signature(event_abi)
+        self.topic0_bytes = keccak(text=self.signature)
+        self.topic0 = '0x' + self.topic0_bytes.hex()
+        self.indexed_names = tuple(input['name'] for input in event_abi['inputs'] if input['indexed'])
+        data_inputs = [input for input in event_abi['inputs'] if not input['indexed']]
+        self.data_names = tuple(input['name'] for input in data_inputs)
+        # What eth_abi.decode_abi builds on every call
+        self.data_decoder = TupleDecoder(decoders=[abi_type_registry.get_decoder(input['type']) for input in data_inputs])
+
+    def decode(self, log):
+        data = log['data']
+        if isinstance(data, str):
+            data = bytes.fromhex(data[2:])
+        values = self.data_decoder(ContextFramesBytesIO(data))
+
+        args = dict(zip(self.indexed_names, log['topics'][1:]))
+        args.update(zip(self.data_names, values))
+        return {'event': self.name, 'args': args}
+
+    def decode_logs(self, logs):
+        """
+        Decode a chunk of logs in one pass.
+
+        :return: One decoded event per log, None where decoding failed.
+        """
+        decode = self.decode
+        decoded = []
+        for log in logs:
+            try:
+                decoded.append(decode(log))
+            except Exception as e:
+                logger.error(f"Failed to decode {self.name} log {log.get('transactionHash', b'').hex()}: {e}")
+                decoded.append(None)
+        return decoded
+
+class DecoderRegistry:
+    """
+    Event decoders keyed by topic0, plus per-pool lookup by event name.
+    Pools sharing an ABI share its decoders.
+    """
+
+    def __init__(self):
+        self._by_topic = {}
+        self._by_pool = {}
+
+    def register_abi(self, abi):
+        """:return: {event name: EventDecoder} for every event in `abi`."""
+        decoders = {}
+        for item in abi:
+            if item.get('type') != 'event':
+                continue
+            decoder = EventDecoder(item)
+            # Keep the first decoder registered for a topic so every pool shares one instance
+            decoder = self._by_topic.setdefault(decoder.topic0_bytes, decoder)
+            decoders[decoder.name] = decoder
+        return decoders
+
+    def register_pool(self, pool):
+        self._by_pool[pool['address']] = self.register_abi(get_pool_abi(pool))
+
+    def register_pools(self, pools):
+        for pool in pools:
+            self.register_pool(pool)
+
+    def for_pool(self, pool, event_name):
+        """:return: The pool's decoder for `event_name`, or None if its ABI has no such event."""
+        if pool['address'] not in self._by_pool:
+            self.register_pool(pool)
+        return self._by_pool[pool['address']].get(event_name)
+
+    def for_topic(self, topic0):
+        if isinstance(topic0, str):
+            topic0 = bytes.fromhex(topic0.removeprefix('0x'))
+        return self._by_topic.get(bytes(topic0))
+
+    def decode_logs(self, logs):
+        """
+        Decode logs of any registered event by their topic0.
+
+        :return: One decoded event per log, None for unknown topics or failed decodes.
+        """
+        decoded = []
+        for log in logs:
+            decoder = self.for_topic(log['topics'][0]) if log['topics'] else None
+            if decoder is None:
+                decoded.append(None)
+                continue
+            decoded.extend(decoder.decode_logs([log]))
+        return decoded
@@ -1,12 +1,14 @@
 import json
 import os
-from web3 import Web3
 import logging
 from src.blockchain.web3_client import web3_client
-from src.config import END_TIMESTAMP
+from src.config import END_TIMESTAMP, POOLS
+from src.data.state_manager import load_state, update_state, get_event_cursor, save_event_cursor, write_json_atomic
+from src.utils.metrics import EVENTS_FETCHED
+from src.utils.lazy import LazyProxy
+from src.calculator.records import EventRecord
 from src.utils.helpers import (
-    get_event_abi, create_event_signature, decode_log, 
-    get_ordered_token_amounts, get_tokens_from_contract, 
+    get_ordered_token_amounts, get_tokens_from_contract, get_token_attr_by_address, get_pool_abi,
     convert_to_serializable
 )
 
@@ -15,152 +17,346 @@ logger = logging.getLogger(__name__)
 # Define a reasonable chunk size for fetching logs
 LOG_FETCH_CHUNK_SIZE = 1_000_000 # Use the requested chunk size
 
+EVENTS_FILE = os.path.join('data', 'pools_events.json')
+# Chunks stored during a run, one event per line; folded into EVENTS_FILE once per run
+PENDING_EVENTS_FILE = os.path.join('data', 'pools_events_pending.ndjson')
+# Events from blocks that are not yet confirmed; rebuilt from scratch on every run
+PROVISIONAL_EVENTS_FILE = os.path.join('data', 'pools_events_provisional.json')
+
+def event_key(event):
+    """Identity of a stored event, used to drop duplicates written by a resumed chunk."""
+    return (event.get('transactionHash'), event.get('logIndex'), event.get('pool_address'), event.get('event'))
+
+def pool_token_calls(pool):
+    """:return: Calldata reading a pool's two token addresses, chosen from its ABI, or None."""
+    from src.blockchain.multicall import encode_call
+
+    functions = {item['name'] for item in get_pool_abi(pool) if item.get('type') == 'function'}
+    if 'token0' in functions and 'token1' in functions:
+        return [encode_call('token0()'), encode_call('token1()')]
+    if 'coins' in functions:
+        return [encode_call('coins(uint256)', ['uint256'], [index]) for index in (0, 1)]
+    return None
+
 class EventFetcher:
     def __init__(self):
+        # Imported here rather than at module level: eth_abi/eth_utils are only needed once fetching starts
+        from src.blockchain.decoders import DecoderRegistry
+
         self.w3 = web3_client.w3
+        # Decoders for every configured pool's events, compiled once
+        self.decoders = DecoderRegistry()
+        self.decoders.register_pools(POOLS)
+        # Pool address -> (token0, token1) attributes; pool tokens never change once deployed
+        self.pool_tokens = {}
 
-    async def fetch_and_save_events(self, pools, from_block, to_block):
-        new_events = []
+    def resolve_pool_tokens(self, pools, persist=True):
+        """
+        Make token metadata available for `pools`. Token addresses are read
+        once per pool, all unknown pools in a single Multicall3 batch, and
+        (when `persist` is set) saved in state under `pool_tokens` so later
+        runs make no calls.
+        """
+        cached_addresses = load_state().get('pool_tokens', {})
+        unresolved = []
+        for pool in pools:
+            if pool['address'] in self.pool_tokens:
+                continue
+            tokens = self._token_attrs(pool, cached_addresses.get(pool['address']))
+            if tokens:
+                self.pool_tokens[pool['address']] = tokens
+            else:
+                unresolved.append(pool)
+
+        if not unresolved:
+            return
+
+        resolved_addresses = {}
+        for pool, addresses in self._read_pool_token_addresses(unresolved):
+            tokens = self._token_attrs(pool, addresses)
+            if tokens:
+                self.pool_tokens[pool['address']] = tokens
+                resolved_addresses[pool['address']] = list(addresses)
+            else:
+                logger.error(f"Unable to find token attributes for addresses {addresses} of pool {pool['address']}")
+
+        if resolved_addresses and persist:
+            update_state(pool_tokens={**cached_addresses, **resolved_addresses})
+            logger.info(f"Resolved and cached token addresses for {len(resolved_addresses)} pools")
+
+    def get_pool_tokens(self, pool):
+        """:return: (token0, token1) attributes of the pool, or (None, None) if they can't be resolved."""
+        if pool['address'] not in self.pool_tokens:
+            self.resolve_pool_tokens([pool])
+        return self.pool_tokens.get(pool['address'], (None, None))
+
+    def _token_attrs(self, pool, addresses):
+        if not addresses:
+            return None
+        token0 = get_token_attr_by_address(addresses[0], pool)
+        token1 = get_token_attr_by_address(addresses[1], pool)
+        return (token0, token1) if token0 and token1 else None
+
+    def _read_pool_token_addresses(self, pools):
+        """:return: List of (pool, (token0 address, token1 address)) for the pools that could be read."""
+        from src.blockchain.multicall import aggregate3, decode_result
+
+        calls = []
+        readable = []
         for pool in pools:
-            events = await self.fetch_events(pool, from_block, to_block)
-            new_events.extend(events)
+            pool_calls = pool_token_calls(pool)
+            if pool_calls is None:
+                logger.error(f"Unable to determine token addresses for pool {pool['address']}")
+                continue
+            readable.append(pool)
+            calls.extend((pool['address'], calldata) for calldata in pool_calls)
 
-        if new_events:
-            self.save_events(new_events)
+        addresses = {}
+        try:
+            results = aggregate3(self.w3, calls)
+        except Exception as e:
+            # E.g. a node or chain without Multicall3: fall back to one call per token
+            logger.warning(f"Multicall3 pool token lookup failed, reading pools individually: {str(e)}")
+            for pool in readable:
+                token0, token1 = get_tokens_from_contract(self.w3, pool)
+                if token0 and token1:
+                    addresses[pool['address']] = (token0['address'], token1['address'])
+            return [(pool, addresses[pool['address']]) for pool in readable if pool['address'] in addresses]
+
+        for index, pool in enumerate(readable):
+            (success0, data0), (success1, data1) = results[2 * index], results[2 * index + 1]
+            if not (success0 and success1):
+                logger.error(f"Token address calls reverted for pool {pool['address']}")
+                continue
+            addresses[pool['address']] = (decode_result(['address'], data0)[0], decode_result(['address'], data1)[0])
+        return [(pool, addresses[pool['address']]) for pool in readable if pool['address'] in addresses]
+
+    async def fetch_and_save_events(self, pools, from_block, to_block):
+        """
+        Fetch and store events for all pools up to `to_block`.
+
+        Each pool/event pair resumes from its own committed cursor when one
+        exists, so a crash mid-backfill only refetches the interrupted chunk.
+        Chunks are appended to the pending events file as they are fetched and
+        merged into the event store once at the end.
+        """
+        # Chunks a crashed run stored but never merged
+        self.merge_pending_events()
+        self.resolve_pool_tokens(pools)
+        new_events = []
+        try:
+            for pool in pools:
+                events = await self.fetch_events(pool, from_block, to_block)
+                new_events.extend(events)
+        finally:
+            self.merge_pending_events()
 
         return new_events
 
-    async def fetch_events(self, pool, from_block, to_block):
-        contract = self.w3.eth.contract(address=pool["address"], abi=pool["abi"])
+    async def refresh_provisional_events(self, pools, from_block, to_block):
+        """
+        Re-fetch the unconfirmed tail [from_block, to_block] and replace the
+        provisional buffer with it. Nothing here is appended to the permanent
+        event store or advances any cursor, so a reorg inside the tail is
+        simply picked up by the next refresh.
+        """
+        provisional_events = []
+        if from_block <= to_block:
+            self.resolve_pool_tokens(pools)
+            for pool in pools:
+                provisional_events.extend(await self.fetch_events(pool, from_block, to_block, persist=False))
+
+        write_json_atomic(PROVISIONAL_EVENTS_FILE, {
+            "from_block": from_block,
+            "to_block": to_block,
+            "events": [event.to_dict() for event in provisional_events]
+        })
+        logger.info(f"Provisional buffer holds {len(provisional_events)} events from unconfirmed blocks {from_block}-{to_block}")
+        return provisional_events
+
+    async def fetch_events(self, pool, from_block, to_block, persist=True):
+        """
+        Fetch, decode and (when `persist` is set) store a pool's events chunk by chunk.
+        With persist=False the range is fetched as given, ignoring and not advancing cursors.
+
+        :return: The pool's fetched events as EventRecords.
+        """
         events = []
-        total_range = to_block - from_block
+        state = load_state()
 
-        logger.info(f"Processing blocks from {from_block} to {to_block} (Range: {total_range}) for pool {pool['address']}")
+        logger.info(f"Processing blocks from {from_block} to {to_block} (Range: {to_block - from_block}) for pool {pool['address']}")
 
         try:
             event_names = pool.get("events", [])
-            token0, token1 = get_tokens_from_contract(self.w3, pool)
+            token0, token1 = self.get_pool_tokens(pool)
 
             for event_name in event_names:
-                event_abi = get_event_abi(contract, event_name)
-                if not event_abi:
+                decoder = self.decoders.for_pool(pool, event_name)
+                if decoder is None:
                     logger.warning(f"Event {event_name} not found in ABI for pool {pool['address']}")
                     continue
 
-                event_signature = create_event_signature(event_abi)
-                if not event_signature:
-                    logger.warning(f"Could not create signature for event {event_name}")
-                    continue
-
-                event_signature_hash = Web3.keccak(text=event_signature).hex()
-                
-                all_logs_for_event = [] # Store logs for the current event across chunks
+                cursor = get_event_cursor(state, pool["address"], event_name) if persist else None
+                current_from = cursor + 1 if cursor is not None else from_block
+                if current_from > from_block:
+                    logger.info(f"Resuming {event_name} for pool {pool['address']} from checkpoint block {current_from}")
 
                 # --- Chunking Logic ---
-                current_from = from_block
                 while current_from <= to_block:
                     current_to = min(current_from + LOG_FETCH_CHUNK_SIZE - 1, to_block)
                     logger.info(f"Fetching {event_name} logs for chunk: {current_from} - {current_to} for pool {pool['address']}")
 
-                    chunk_logs = web3_client.call_with_retry(self.w3.eth.get_logs, {
-                        'fromBlock': current_from,
-                        'toBlock': current_to,
-                        'address': pool["address"],
-                        'topics': [event_signature_hash]
-                    })
+                    chunk_events = self.fetch_chunk(pool, decoder, current_from, current_to, token0, token1)
 
                     # Handle case where retry mechanism returns None after max retries
-                    if chunk_logs is None:
-                        logger.error(f"Failed to fetch logs for chunk {current_from}-{current_to} for {event_name} on pool {pool['address']} after retries. Skipping this chunk.")
-                        # Decide if we should stop processing this event entirely or just skip the chunk
-                        # For now, we'll skip the chunk and continue to the next one
-                    else:
-                         all_logs_for_event.extend(chunk_logs)
-                         logger.info(f"Fetched {len(chunk_logs)} logs in chunk {current_from}-{current_to}")
+                    if chunk_events is None:
+                        logger.error(f"Failed to fetch logs for chunk {current_from}-{current_to} for {event_name} on pool {pool['address']} after retries. Will resume from this chunk on the next run.")
+                        break
+
+                    # Store the chunk, then commit the cursor: a restart resumes right after it
+                    if persist:
+                        if chunk_events:
+                            self.append_pending_events(chunk_events)
+                            EVENTS_FETCHED.labels(pool=pool["address"]).inc(len(chunk_events))
+                        save_event_cursor(pool["address"], event_name, current_to)
+                    # Kept as compact records: a full backfill returns every event of the pool
+                    events.extend(EventRecord.from_dict(event) for event in chunk_events)
 
                     current_from = current_to + 1
                 # --- End Chunking Logic ---
-
-                logger.info(f"Fetched a total of {len(all_logs_for_event)} {event_name} events for pool {pool['address']} across all chunks.")
-                
-                # Process the fetched logs (accumulated from all chunks)
-                for log in all_logs_for_event:
-                    try:
-                        # block = self.w3.eth.get_block(log['blockNumber'])
-                        block = web3_client.call_with_retry(self.w3.eth.get_block, log['blockNumber'])
-                        if block is None:
-                            logger.error(f"Failed to get block {log['blockNumber']} after retries. Skipping event log.")
-                            continue # Skip this specific log if block fetching failed
-                            
-                        event_timestamp = block['timestamp']
-                        if int(pool["deploy_date"].timestamp()) <= event_timestamp <= END_TIMESTAMP:
-                            # tx = self.w3.eth.get_transaction(log['transactionHash'])
-                            tx = web3_client.call_with_retry(self.w3.eth.get_transaction, log['transactionHash'])
-                            if tx is None:
-                                logger.error(f"Failed to get transaction {log['transactionHash'].hex()} after retries. Skipping event log.")
-                                continue # Skip this specific log if transaction fetching failed
-                                
-                            decoded_event = decode_log(event_abi, log)
-                            
-                            provider_from_args = decoded_event['args'].get('provider') or decoded_event['args'].get('owner')
-                            tx_from = tx['from']
-                            
-                            if provider_from_args and provider_from_args.lower() == tx_from.lower():
-                                decoded_event['provider'] = provider_from_args
-                            else:
-                                decoded_event['provider'] = tx_from
-
-                            decoded_event['timestamp'] = event_timestamp
-                            decoded_event['transactionHash'] = log['transactionHash']
-                            decoded_event['_from'] = tx_from
-                            decoded_event['pool_address'] = pool["address"]
-                            if token0 and token1:
-                                decoded_event['tokens'] = {"token0": token0, "token1": token1}
-                            else:
-                                logger.warning(f"Unable to get token information for pool {pool['address']}")
-                                continue
-                            amounts = get_ordered_token_amounts(decoded_event)
-                            decoded_event['amounts'] = amounts
-                            event_type = decoded_event['event']
-                            if event_type in ["AddLiquidity", "Mint"]:
-                                decoded_event['action'] = "add"
-                            elif event_type in ["RemoveLiquidity", "RemoveLiquidityImbalance", "RemoveLiquidityOne", "Burn"]:
-                                decoded_event['action'] = "remove"
-                            else:
-                                decoded_event['action'] = "unknown"
-                                logger.warning(f"Unknown event type: {event_type}")
-                                continue
-
-                            decoded_event = convert_to_serializable(decoded_event)
-
-                            events.append(decoded_event)
-                    except Exception as e:
-                        # Log error for specific event processing but continue loop
-                        logger.error(f"Error processing individual event log {log.get('transactionHash', 'N/A').hex()}: {str(e)}") 
         except Exception as e:
             # Log error for fetching process of a specific pool but continue to next pool
-            logger.error(f"Failed during overall event fetching process for pool {pool['address']}: {str(e)}") 
+            logger.error(f"Failed during overall event fetching process for pool {pool['address']}: {str(e)}")
 
         logger.info(f"Finished processing pool {pool['address']}. Found {len(events)} eligible events.")
         return events
 
-    def save_events(self, new_events):
-        file_path = os.path.join('data', 'pools_events.json')
-        try:
-            with open(file_path, 'r+') as f:
+    def fetch_chunk(self, pool, decoder, from_block, to_block, token0, token1):
+        """
+        Fetch and decode one event's logs of a pool for a block range.
+
+        :return: List of event dicts, or None if the logs could not be fetched.
+        """
+        chunk_logs = web3_client.call_with_retry(self.w3.eth.get_logs, {
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': pool["address"],
+            'topics': [decoder.topic0]
+        }, rpc_method='eth_getLogs')
+        if chunk_logs is None:
+            return None
+
+        logger.info(f"Fetched {len(chunk_logs)} logs in chunk {from_block}-{to_block}")
+        return self.process_logs(pool, decoder, chunk_logs, token0, token1)
+
+    def process_logs(self, pool, decoder, logs, token0, token1):
+        events = []
+        for log, decoded_event in zip(logs, decoder.decode_logs(logs)):
+            if decoded_event is None:
+                continue
+            try:
+                decoded_event = self.process_log(pool, decoded_event, log, token0, token1)
+                if decoded_event is not None:
+                    events.append(decoded_event)
+            except Exception as e:
+                # Log error for specific event processing but continue loop
+                logger.error(f"Error processing individual event log {log.get('transactionHash', 'N/A').hex()}: {str(e)}")
+        return events
+
+    def process_log(self, pool, decoded_event, log, token0, token1):
+        block = web3_client.call_with_retry(self.w3.eth.get_block, log['blockNumber'], rpc_method='eth_getBlockByNumber')
+        if block is None:
+            logger.error(f"Failed to get block {log['blockNumber']} after retries. Skipping event log.")
+            return None
+
+        event_timestamp = block['timestamp']
+        if not int(pool["deploy_date"].timestamp()) <= event_timestamp <= END_TIMESTAMP:
+            return None
+
+        tx = web3_client.call_with_retry(self.w3.eth.get_transaction, log['transactionHash'], rpc_method='eth_getTransactionByHash')
+        if tx is None:
+            logger.error(f"Failed to get transaction {log['transactionHash'].hex()} after retries. Skipping event log.")
+            return None
+
+        provider_from_args = decoded_event['args'].get('provider') or decoded_event['args'].get('owner')
+        tx_from = tx['from']
+
+        if provider_from_args and provider_from_args.lower() == tx_from.lower():
+            decoded_event['provider'] = provider_from_args
+        else:
+            decoded_event['provider'] = tx_from
+
+        decoded_event['timestamp'] = event_timestamp
+        decoded_event['transactionHash'] = log['transactionHash']
+        decoded_event['logIndex'] = log['logIndex']
+        decoded_event['blockNumber'] = log['blockNumber']
+        decoded_event['_from'] = tx_from
+        decoded_event['pool_address'] = pool["address"]
+        if token0 and token1:
+            decoded_event['tokens'] = {"token0": token0, "token1": token1}
+        else:
+            logger.warning(f"Unable to get token information for pool {pool['address']}")
+            return None
+        amounts = get_ordered_token_amounts(decoded_event)
+        decoded_event['amounts'] = amounts
+        event_type = decoded_event['event']
+        if event_type in ["AddLiquidity", "Mint"]:
+            decoded_event['action'] = "add"
+        elif event_type in ["RemoveLiquidity", "RemoveLiquidityImbalance", "RemoveLiquidityOne", "Burn"]:
+            decoded_event['action'] = "remove"
+        else:
+            decoded_event['action'] = "unknown"
+            logger.warning(f"Unknown event type: {event_type}")
+            return None
+
+        return convert_to_serializable(decoded_event)
+
+    def append_pending_events(self, events):
+        """Durably append a chunk's events to the pending events file, one JSON line each."""
+        with open(PENDING_EVENTS_FILE, 'a') as f:
+            f.write(''.join(json.dumps(event) + '\n' for event in events))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def merge_pending_events(self):
+        """
+        Merge the pending events file into the event store with one rewrite,
+        then remove it.
+
+        :return: Number of pending events read.
+        """
+        if not os.path.exists(PENDING_EVENTS_FILE):
+            return 0
+        events = []
+        with open(PENDING_EVENTS_FILE, 'r') as f:
+            for line in f:
                 try:
-                    existing_events = json.load(f)
+                    events.append(json.loads(line))
                 except json.JSONDecodeError:
-                    existing_events = []
-                
-                existing_events.extend(new_events)
-                f.seek(0)
-                json.dump(existing_events, f)
-                f.truncate()
+                    # Only the line being written when a run crashed; its chunk's cursor was never committed
+                    logger.warning(f"Skipping an incomplete line of {PENDING_EVENTS_FILE}")
+        if events:
+            self.save_events(events)
+        os.remove(PENDING_EVENTS_FILE)
+        return len(events)
+
+    def save_events(self, new_events):
+        file_path = EVENTS_FILE
+        try:
+            with open(file_path, 'r') as f:
+                existing_events = json.load(f)
         except FileNotFoundError:
-            with open(file_path, 'w') as f:
-                json.dump(new_events, f)
+            existing_events = []
+        except json.JSONDecodeError:
+            logger.error(f"Error decoding existing events in {file_path}. Starting a new events file.")
+            existing_events = []
+
+        # A chunk stored right before a crash (cursor not yet committed) is refetched on resume
+        existing_keys = {event_key(event) for event in existing_events if event.get('logIndex') is not None}
+        added_events = [event for event in new_events if event_key(event) not in existing_keys]
+        existing_events.extend(added_events)
+        write_json_atomic(file_path, existing_events)
 
-        logger.info(f"Saved {len(new_events)} new events to {file_path}")
+        logger.info(f"Saved {len(added_events)} new events to {file_path}")
 
-event_fetcher = EventFetcher()
\ No newline at end of file
+event_fetcher = LazyProxy(EventFetcher)
@@ -0,0 +1,63 @@
+import logging
+from eth_abi import encode_abi, decode_abi
+from eth_utils import function_signature_to_4byte_selector
+from src.blockchain.web3_client import web3_client
+
+logger = logging.getLogger(__name__)
+
+# Multicall3 is deployed at the same address on Arbitrum and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "type": "function",
+        "name": "aggregate3",
+        "stateMutability": "payable",
+        "inputs": [{
+            "name": "calls",
+            "type": "tuple[]",
+            "components": [
+                {"name": "target", "type": "address"},
+                {"name": "allowFailure", "type": "bool"},
+                {"name": "callData", "type": "bytes"}
+            ]
+        }],
+        "outputs": [{
+            "name": "returnData",
+            "type": "tuple[]",
+            "components": [
+                {"name": "success", "type": "bool"},
+                {"name": "returnData", "type": "bytes"}
+            ]
+        }]
+    }
+]
+# Keeps a single eth_call well under provider gas and response-size limits
+MULTICALL_BATCH_SIZE = 500
+
+def encode_call(signature, arg_types=(), args=()):
+    """
+    :param signature: Function signature, e.g. "coins(uint256)".
+    :return: Calldata for the function with the given arguments.
+    """
+    return function_signature_to_4byte_selector(signature) + encode_abi(list(arg_types), list(args))
+
+def decode_result(output_types, return_data):
+    return decode_abi(list(output_types), return_data)
+
+def aggregate3(w3, calls, allow_failure=True):
+    """
+    Execute read calls through Multicall3, MULTICALL_BATCH_SIZE per eth_call.
+
+    :param calls: List of (target address, calldata bytes).
+    :param allow_failure: If False, one reverting call reverts its whole batch.
+    :return: List of (success, return data bytes), in call order.
+    """
+    multicall = w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+    results = []
+    for start in range(0, len(calls), MULTICALL_BATCH_SIZE):
+        batch = [(target, allow_failure, calldata) for target, calldata in calls[start:start + MULTICALL_BATCH_SIZE]]
+        batch_results = web3_client.call_with_retry(multicall.functions.aggregate3(batch).call, rpc_method='eth_call')
+        if batch_results is None:
+            raise RuntimeError(f"Multicall3 aggregate3 failed for calls {start}-{start + len(batch) - 1}")
+        results.extend((success, bytes(return_data)) for success, return_data in batch_results)
+    return results
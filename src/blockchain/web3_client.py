@@ -1,14 +1,21 @@
-from web3 import Web3
-from web3.exceptions import ContractLogicError
 import time
 import logging
-import requests # Import requests to check for HTTP errors
-from src.config import RPC_URL, MAX_RETRIES, RETRY_DELAY
+from src.config import RPC_URL, MAX_RETRIES, RETRY_DELAY, CONFIRMATION_MODE, CONFIRMATION_DEPTH
+from src.utils.lazy import LazyProxy
+from src.utils.metrics import (
+    RPC_CALLS, RPC_LATENCY, RPC_RETRIES, RPC_RATE_LIMITED,
+    rpc_endpoint_label, rpc_method_label
+)
 
 logger = logging.getLogger(__name__)
 
+RPC_ENDPOINT = rpc_endpoint_label(RPC_URL)
+
 class Web3Client:
     def __init__(self):
+        # web3 takes ~0.5s to import, so it is only loaded once a client is needed
+        from web3 import Web3
+
         if not RPC_URL:
             logger.critical("RPC_URL is not configured. Please set ALCHEMY_URL or INFURA_KEY environment variable.")
             # Handle this case more gracefully, maybe raise an exception or exit
@@ -43,24 +50,47 @@ class Web3Client:
 
     def get_latest_block(self):
         # Wrap this call as well, though less likely to be rate-limited
-        return self.call_with_retry(self.w3.eth.get_block, 'latest')['number']
+        return self.call_with_retry(self.w3.eth.get_block, 'latest', rpc_method='eth_getBlockByNumber')['number']
+
+    def get_confirmed_block(self, latest_block=None):
+        """
+        Highest block considered safe from reorgs: the node's finalized block in
+        "finalized" mode, otherwise CONFIRMATION_DEPTH blocks behind the tip.
+        """
+        if CONFIRMATION_MODE == "finalized":
+            # web3 5.x rejects the 'finalized' tag in get_block, so the request is sent as is
+            block = self.call_with_retry(
+                self.w3.manager.request_blocking, 'eth_getBlockByNumber', ['finalized', False], rpc_method='eth_getBlockByNumber'
+            )
+            return block['number']
+        if latest_block is None:
+            latest_block = self.get_latest_block()
+        return max(latest_block - CONFIRMATION_DEPTH, 0)
 
     def is_contract(self, address):
-        code = self.call_with_retry(self.w3.eth.get_code, address)
+        code = self.call_with_retry(self.w3.eth.get_code, address, rpc_method='eth_getCode')
         return code is not None and len(code) > 0
 
     def call_with_retry(self, func, *args, **kwargs):
         retries = kwargs.pop('max_retries', MAX_RETRIES)
         delay = kwargs.pop('retry_delay', RETRY_DELAY)
         backoff_factor = kwargs.pop('backoff_factor', 2) # Exponential backoff factor
+        # JSON-RPC method for the metrics labels; web3 5.x names most eth methods just "caller"
+        method = kwargs.pop('rpc_method', None) or rpc_method_label(func)
+        import requests # Import requests to check for HTTP errors
+        from web3.exceptions import ContractLogicError
         
         for attempt in range(retries):
+            RPC_CALLS.labels(method=method, endpoint=RPC_ENDPOINT).inc()
             try:
-                return func(*args, **kwargs)
+                with RPC_LATENCY.labels(method=method, endpoint=RPC_ENDPOINT).time():
+                    return func(*args, **kwargs)
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 429: # Too Many Requests
+                    RPC_RATE_LIMITED.labels(method=method, endpoint=RPC_ENDPOINT).inc()
                     logger.warning(f"Rate limit exceeded (429). Attempt {attempt + 1}/{retries}. Retrying in {delay}s...")
                     if attempt < retries - 1:
+                        RPC_RETRIES.labels(method=method, endpoint=RPC_ENDPOINT).inc()
                         time.sleep(delay)
                         delay *= backoff_factor # Increase delay for next retry
                     else:
@@ -85,4 +115,4 @@ class Web3Client:
         return None # Or raise an error
 
 
-web3_client = Web3Client()
\ No newline at end of file
+web3_client = LazyProxy(Web3Client)
\ No newline at end of file
@@ -1,42 +1,83 @@
+import os
 import json
 import logging
 from datetime import datetime
 from src.config import POOLS
-from src.utils.helpers import (
-    normalize_address, load_events,
-    sort_events
-)
-from src.data.state_manager import load_state
-import copy  # Add this import at the top of the file
+from src.utils.helpers import normalize_address, load_events
+from src.data.state_manager import load_state, update_state, write_json_atomic
+from src.utils.lazy import LazyProxy
+from src.calculator.records import registry, EventRecord, BalanceEntry, replace_pool_balance
 
 logger = logging.getLogger(__name__)
 
+BALANCES_FILE = './data/balances/provider_balances.json'
+
+def file_stat(path):
+    """:return: (mtime, size, inode) of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
 def datetime_to_str(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
     return obj
 
 class BalanceCalculator:
+    """
+    Replays pool events into each provider's ledger of balance entries.
+
+    pools_events.json only ever grows at the end, so `balance_event_offset`
+    in the program state marks how many events have been applied. A new
+    event that sorts after everything in its provider's ledger is appended;
+    one that sorts before (a backfilled or late chunk) makes its provider
+    dirty, and only that provider's ledger is replayed from the event on,
+    which is what a rebuild from scratch would produce. Every provider whose
+    ledger changed is recorded in `dirty_providers` with the timestamp of its
+    earliest changed entry, for DailyBalanceCalculator to recompute from.
+    """
+
     def __init__(self):
         self.provider_liquidity = {}
         self.last_processed_timestamp = None
+        self.event_offset = None
+        self.dirty_providers = {}
+        self.saved_file_stat = None
 
     def load_balance_state(self):
         state = load_state()
         self.last_processed_timestamp = state.get('last_balance_timestamp')
+        self.event_offset = state.get('balance_event_offset')
+        self.dirty_providers = state.get('dirty_providers') or {}
         if self.last_processed_timestamp is None:
             logger.info("No last balance timestamp found. Starting from the beginning.")
 
     def load_balances(self):
+        if self.saved_file_stat is not None and self.saved_file_stat == file_stat(BALANCES_FILE):
+            # The ledgers in memory are the ones this calculator saved last
+            return
         try:
-            with open('./data/balances/provider_balances.json', 'r') as f:
-                self.provider_liquidity = json.load(f)
+            with open(BALANCES_FILE, 'r') as f:
+                provider_liquidity = json.load(f)
         except FileNotFoundError:
             logger.info("No existing balances file found. Starting with empty balances.")
+            return
+        self.provider_liquidity = {
+            provider: [BalanceEntry.from_dict(entry) for entry in entries]
+            for provider, entries in provider_liquidity.items()
+        }
 
     def save_balances(self):
-        with open('./data/balances/provider_balances.json', 'w') as f:
-            json.dump(self.provider_liquidity, f, indent=2, default=datetime_to_str)
+        provider_liquidity = {
+            provider: [entry.to_dict() for entry in entries]
+            for provider, entries in self.provider_liquidity.items()
+        }
+        # Atomic, so the ledgers on disk always match the recorded event offset; not
+        # indented, like pools_events.json, since json only has a C encoder for compact output
+        write_json_atomic(BALANCES_FILE, provider_liquidity, default=datetime_to_str)
+        self.saved_file_stat = file_stat(BALANCES_FILE)
 
     def calculate_balances(self):
         self.load_balance_state()
@@ -49,81 +90,129 @@ class BalanceCalculator:
         else:
             logger.info(f"Loaded {len(events)} events")
 
-        if self.last_processed_timestamp is None:
-            self.last_processed_timestamp = min(int(pool['deploy_date'].timestamp()) for pool in POOLS) - 1
-        
-        logger.info(f"Starting balance calculation from timestamp {self.last_processed_timestamp}")
+        start_timestamp = min(int(pool['deploy_date'].timestamp()) for pool in POOLS) - 1
+        offset = self.event_offset
+        if offset is None or offset > len(events):
+            # Without a valid offset the applied events are unknown
+            if self.provider_liquidity:
+                logger.warning(f"No usable event offset ({offset} for {len(events)} events). Recalculating all balances.")
+            self.provider_liquidity = {}
+            offset = 0
+
+        logger.info(f"Starting balance calculation from event {offset}")
 
-        new_events = [e for e in events if e['timestamp'] > self.last_processed_timestamp]
-        sorted_events = sorted(new_events, key=sort_events)
+        new_events = {}
+        for event in events[offset:]:
+            if event['timestamp'] > start_timestamp:
+                record = EventRecord.from_dict(event)
+                new_events.setdefault(normalize_address(record.provider), []).append(record)
 
-        if not sorted_events:
+        if not new_events:
             logger.info("No events found. Skipping balance calculation.")
+            if offset != len(events):
+                self.save_event_offset(len(events))
             return
 
-        for event in sorted_events:
-            provider = normalize_address(event['provider'])
-            if provider not in self.provider_liquidity:
-                self.provider_liquidity[provider] = []
-
-            pool_address = event['pool_address']
-            token0 = event['tokens']['token0']
-            token1 = event['tokens']['token1']
-            amounts = event['amounts']
-            action = event['action']
-            tx_event = event['event']   
-
-            balance_entry = {
-                'provider': provider,
-                'timestamp': event['timestamp'],
-                'event': tx_event,
-                'action': action,
-                'transactionHash': event['transactionHash'],
-                'txhash_counter': len(self.provider_liquidity[provider]),
-                'tokens': event['tokens'],
-                'amounts': amounts,
-                'pool_address': pool_address,
-                'pool_balances': {},
-                'total_token_balance': {}
-            }
-            
-            previous_pool_balances = copy.deepcopy(self.provider_liquidity[provider][-1]['pool_balances']) if self.provider_liquidity[provider] else {}
-            balance_entry['pool_balances'] = previous_pool_balances
-
-            if pool_address not in balance_entry['pool_balances']:
-                balance_entry['pool_balances'][pool_address] = {'token_balance': {}}
-            
-            token0_balance = balance_entry['pool_balances'][pool_address]['token_balance'].get(token0['symbol'], 0)
-            token1_balance = balance_entry['pool_balances'][pool_address]['token_balance'].get(token1['symbol'], 0)
-
-            if action == 'add':
-                token0_balance += amounts[0] / 10**token0['decimals']
-                token1_balance += amounts[1] / 10**token1['decimals']
-            elif action == 'remove':
-                token0_balance -= amounts[0] / 10**token0['decimals']
-                token1_balance -= amounts[1] / 10**token1['decimals']
-
-            balance_entry['pool_balances'][pool_address]['token_balance'] = {
-                token0['symbol']: token0_balance,
-                token1['symbol']: token1_balance
-            }
-
-            total_token_balance = {}
-            for pool_address, pool_data in balance_entry['pool_balances'].items():
-                token_balance = pool_data.get('token_balance', {})
-                for token_symbol, balance in token_balance.items():
-                    if token_symbol in total_token_balance:
-                        total_token_balance[token_symbol] += balance
-                    else:
-                        total_token_balance[token_symbol] = balance
-
-            balance_entry['total_token_balance'] = total_token_balance
-
-            self.provider_liquidity[provider].append(balance_entry)
-
-        self.last_processed_timestamp = max(event['timestamp'] for event in sorted_events)
+        replays = self.plan_replays(events, offset, start_timestamp, new_events)
+        event_count = len(events)
+        del events
+
+        # Until saved, the ledgers in memory no longer match the file
+        self.saved_file_stat = None
+        for provider, (keep, replayed) in replays.items():
+            provider_entries = self.provider_liquidity.setdefault(provider, [])
+            del provider_entries[keep:]
+            for event in replayed:
+                self.apply_event(provider, provider_entries, event)
+            if provider not in self.dirty_providers or replayed[0].timestamp < self.dirty_providers[provider]:
+                self.dirty_providers[provider] = replayed[0].timestamp
+
+        new_timestamp = max(event.timestamp for records in new_events.values() for event in records)
+        self.last_processed_timestamp = max(self.last_processed_timestamp or new_timestamp, new_timestamp)
         self.save_balances()
-
-        logger.info(f"Balances calculated up to timestamp {self.last_processed_timestamp}")
-
-balance_calculator = BalanceCalculator()
\ No newline at end of file
+        self.save_event_offset(event_count)
+
+        logger.info(f"Balances calculated up to timestamp {self.last_processed_timestamp}; {len(replays)} providers changed")
+
+    def save_event_offset(self, event_count):
+        """Record the applied events and the dirty providers once the ledgers are saved."""
+        self.event_offset = event_count
+        update_state(balance_event_offset=event_count, dirty_providers=self.dirty_providers)
+
+    def apply_event(self, provider, provider_entries, event):
+        pool_id = event.pool_id
+        token0 = registry.token(event.token0_id)
+        token1 = registry.token(event.token1_id)
+        amounts = event.amounts
+        action = event.action
+
+        # Pool balances are immutable tuples, so the previous entry's are shared rather than copied
+        previous_pool_balances = provider_entries[-1].pool_balances if provider_entries else ()
+        token_balance = dict(BalanceEntry.token_balances_of(previous_pool_balances, pool_id))
+
+        token0_balance = token_balance.get(token0['symbol'], 0)
+        token1_balance = token_balance.get(token1['symbol'], 0)
+
+        if action == 'add':
+            token0_balance += amounts[0] / 10**token0['decimals']
+            token1_balance += amounts[1] / 10**token1['decimals']
+        elif action == 'remove':
+            token0_balance -= amounts[0] / 10**token0['decimals']
+            token1_balance -= amounts[1] / 10**token1['decimals']
+
+        token_balance = {
+            token0['symbol']: token0_balance,
+            token1['symbol']: token1_balance
+        }
+
+        provider_entries.append(BalanceEntry(
+            provider=provider,
+            timestamp=event.timestamp,
+            event=event.event,
+            action=action,
+            transaction_hash=event.transaction_hash,
+            txhash_counter=len(provider_entries),
+            token0_id=event.token0_id,
+            token1_id=event.token1_id,
+            amounts=amounts,
+            pool_id=pool_id,
+            pool_balances=replace_pool_balance(previous_pool_balances, pool_id, tuple(token_balance.items()))
+        ))
+
+    def plan_replays(self, events, offset, start_timestamp, new_events):
+        """
+        :param new_events: {provider: [EventRecord]} of the events from `offset` on, in file order.
+        :return: {provider: (number of ledger entries kept, EventRecords to replay after them, sorted)}
+        """
+        replays = {}
+        late = {}
+        for provider, records in new_events.items():
+            records.sort(key=EventRecord.sort_key)
+            provider_entries = self.provider_liquidity.get(provider)
+            if provider_entries:
+                last = provider_entries[-1]
+                if records[0].sort_key()[1:] < (last.timestamp, 0 if last.action == 'add' else 1):
+                    late[provider] = []
+                    continue
+            replays[provider] = (len(provider_entries or ()), records)
+        if not late:
+            return replays
+
+        # A dirty provider's applied events and its new ones, in the order a full replay sorts them
+        for event in events[:offset]:
+            if event['timestamp'] > start_timestamp:
+                provider = normalize_address(event['provider'])
+                if provider in late:
+                    late[provider].append(EventRecord.from_dict(event))
+        for provider, applied in late.items():
+            new = new_events[provider]
+            new_ids = {id(event) for event in new}
+            merged = sorted(applied + new, key=EventRecord.sort_key)
+            keep = next(index for index, event in enumerate(merged) if id(event) in new_ids)
+            if len(applied) != len(self.provider_liquidity[provider]):
+                logger.warning(f"Ledger of {provider} has {len(self.provider_liquidity[provider])} entries for {len(applied)} events. Replaying it in full.")
+                keep = 0
+            replays[provider] = (keep, merged[keep:])
+        logger.info(f"Replaying the ledgers of {len(late)} providers with events before their last entry")
+        return replays
+balance_calculator = LazyProxy(BalanceCalculator)
\ No newline at end of file
@@ -1,16 +1,20 @@
 import json
 import logging
 from datetime import datetime, timedelta, timezone
-from src.utils.helpers import get_token_price
-from src.data.state_manager import load_state
-from src.config import START_DATE, TOKENS, END_DATE
+from src.data.state_manager import load_state, update_state
+from src.data.balance_store import DAY_SECONDS, daily_balance_store, to_day
+from src.calculator.records import BalanceEntry
+from src.config import START_DATE, TOKENS, END_DATE, DAILY_BALANCES_FILE, DAILY_BALANCES_JSON_EXPORT
+from src.utils.lazy import LazyProxy
 
 logger = logging.getLogger(__name__)
 
 class DailyBalanceCalculator:
-    def __init__(self, provider_balances_file, daily_balances_file):
+    def __init__(self, provider_balances_file, daily_balances_file, store=None):
         self.provider_balances_file = provider_balances_file
+        # Daily balances live in the run store; the JSON file is only an export
         self.daily_balances_file = daily_balances_file
+        self.store = store if store is not None else daily_balance_store
         
         last_calculated_date = load_state().get('last_daily_balance_date', None)
         
@@ -34,50 +38,7 @@ class DailyBalanceCalculator:
             return {}
 
     def load_daily_balances(self):
-        try:
-            with open(self.daily_balances_file, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            logger.info(f"Daily balances file not found. Starting with empty balances: {self.daily_balances_file}")
-            return {}
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON from {self.daily_balances_file}: {e}")
-            logger.error("File content might be corrupted. Starting with empty balances.")
-            # Optional: Backup corrupted file?
-            # Consider backing up the corrupted file here if needed
-            # import shutil
-            # backup_path = self.daily_balances_file + ".corrupted"
-            # try:
-            #     shutil.copy2(self.daily_balances_file, backup_path)
-            #     logger.info(f"Backed up corrupted file to {backup_path}")
-            # except Exception as backup_e:
-            #     logger.error(f"Failed to backup corrupted file: {backup_e}")
-            return {}
-
-    def save_daily_balances(self, daily_balances):
-        try:
-            with open(self.daily_balances_file, 'r+') as f:
-                try:
-                    existing_data = json.load(f)
-                except json.JSONDecodeError as e:
-                     logger.error(f"Error decoding existing JSON in {self.daily_balances_file} during save: {e}")
-                     logger.error("Overwriting corrupted file with new data.")
-                     existing_data = {}
-
-                for provider, data in daily_balances.items():
-                    if provider in existing_data:
-                        # Avoid duplicate entries if recalculating
-                        existing_dates = {entry['balance_date'] for entry in existing_data[provider]['balances']}
-                        new_entries = [entry for entry in data['balances'] if entry['balance_date'] not in existing_dates]
-                        existing_data[provider]['balances'].extend(new_entries)
-                    else:
-                        existing_data[provider] = data
-                f.seek(0)
-                json.dump(existing_data, f, indent=2)
-                f.truncate()
-        except FileNotFoundError:
-            with open(self.daily_balances_file, 'w') as f:
-                json.dump(daily_balances, f, indent=2)
+        return self.store.read_runs()
 
     def get_start_date(self):
         state = load_state()
@@ -86,59 +47,74 @@ class DailyBalanceCalculator:
             return START_DATE.replace(hour=0, minute=0, second=0, microsecond=0)
         return datetime.fromisoformat(last_calculated_date) + timedelta(days=1)
 
-    def calculate_daily_balances(self):
-        provider_balances = self.load_provider_balances()
-        existing_daily_balances = self.load_daily_balances()
+    def token_balances(self, entry):
+        balances = {}
+        for token, balance in entry.total_token_balance.items():
+            if TOKENS.get(token) is None:
+                logger.warning(f"Token {token} not found in TOKENS configuration.")
+                continue
+            balances[token] = balance
+        return balances
+
+    def provider_days(self, entries, from_day, end_day):
+        """
+        :param entries: A provider's BalanceEntry ledger, in timestamp order.
+        :return: [(day, {token: amount})] of the provider's balances at the end
+            of each day from from_day through end_day on which they changed
+            (the current balances for a day that is not over yet).
+        """
+        day_entries = {from_day: None}
+        for entry in entries:
+            day = entry.timestamp // DAY_SECONDS
+            if day > end_day:
+                break
+            # The day's last entry holds at its end; earlier days collapse into from_day
+            day_entries[max(day, from_day)] = entry
+        return [(day, self.token_balances(entry) if entry is not None else {}) for day, entry in day_entries.items()]
+
+    def calculate_daily_balances(self, provider_liquidity=None):
+        """:param provider_liquidity: BalanceCalculator's ledgers, instead of reading them from the provider balances file."""
         start_date = self.get_start_date()
         current_date = min(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0), END_DATE)
+        last_day = self.store.last_day()
+        dirty_providers = load_state().get('dirty_providers') or {}
 
-        if start_date > current_date:
+        if start_date > current_date and not dirty_providers:
             logger.info("No new daily balances to calculate.")
-            self.daily_balances = existing_daily_balances
+            self.daily_balances = self.load_daily_balances()
             return
 
-        new_balances = {}
-        for provider, events in provider_balances.items():
-            if provider not in new_balances:
-                new_balances[provider] = {'balances': []}
-
-            provider_daily_balances = new_balances[provider]['balances']
-            last_event = events[-1]
-
-            calculation_date = start_date
-            while calculation_date <= current_date:
-                token_usd_balance = {}
-                total_usd_balance = 0
-
-                for token, balance in last_event['total_token_balance'].items():
-                    try:
-                        token_identifier = TOKENS.get(token)
-                        if token_identifier is None:
-                            logger.warning(f"Token {token} not found in TOKENS configuration.")
-                            continue
-                        token_price = get_token_price(token_identifier, calculation_date)
-                        usd_balance = balance * token_price if balance * token_price >= 0.01 else 0
-                        token_usd_balance[token] = usd_balance
-                        total_usd_balance += usd_balance
-                    except Exception as e:
-                        logger.error(f"Error calculating USD balance for {token}: {str(e)}")
-
-                daily_balance = {
-                    'balance_date': calculation_date.isoformat(),
-                    'token_usd_balance': token_usd_balance,
-                    'total_usd_balance': total_usd_balance
-                }
-
-                provider_daily_balances.append(daily_balance)
-
-                calculation_date += timedelta(days=1)
-
-        self.save_daily_balances(new_balances)
-        self.last_calculated_date = current_date
+        # Each day holds a provider's balances at its end. They only change
+        # through events, so providers whose ledger did not change extend
+        # their runs in the store; the dirty ones are recomputed from the day
+        # of their earliest changed entry, which is what a rebuild would store
+        if provider_liquidity is None:
+            provider_liquidity = self.load_provider_balances()
+            parse = lambda entries: [BalanceEntry.from_dict(entry) for entry in entries]
+        else:
+            parse = lambda entries: entries
+        first_day = to_day(start_date) if last_day is None else to_day(START_DATE)
+        if last_day is None:
+            dirty_providers = {provider: 0 for provider in provider_liquidity}
+        end_day = max(to_day(current_date), last_day if last_day is not None else first_day)
+
+        balances = {}
+        for provider, timestamp in dirty_providers.items():
+            from_day = max(timestamp // DAY_SECONDS, first_day)
+            if from_day <= end_day:
+                balances[provider] = self.provider_days(parse(provider_liquidity.get(provider, [])), from_day, end_day)
+
+        self.store.replace_days(balances, end_day)
+        update_state(dirty_providers={})
+        if start_date <= current_date:
+            self.last_calculated_date = current_date
 
         self.daily_balances = self.load_daily_balances()
+        if DAILY_BALANCES_JSON_EXPORT:
+            self.store.export_json(self.daily_balances_file)
 
-daily_balance_calculator = DailyBalanceCalculator(
+# Built on first use: the constructor reads program_state.json
+daily_balance_calculator = LazyProxy(lambda: DailyBalanceCalculator(
     provider_balances_file='./data/balances/provider_balances.json',
-    daily_balances_file='./data/balances/daily_balances.json',
-)
\ No newline at end of file
+    daily_balances_file=DAILY_BALANCES_FILE,
+))
@@ -0,0 +1,214 @@
+import sys
+
+class MetadataRegistry:
+    """
+    Interns token metadata dicts and pool addresses behind small integer ids,
+    so records reference one shared copy instead of repeating it per entry.
+
+    Ids are only meaningful within the process; records are expanded back
+    to the full JSON schema by their to_dict() methods.
+    """
+
+    def __init__(self):
+        self._tokens = []
+        self._token_ids = {}
+        self._pools = []
+        self._pool_ids = {}
+
+    def token_id(self, token):
+        key = tuple(token.items())
+        token_id = self._token_ids.get(key)
+        if token_id is None:
+            token_id = len(self._tokens)
+            self._tokens.append({k: sys.intern(v) if isinstance(v, str) else v for k, v in token.items()})
+            self._token_ids[key] = token_id
+        return token_id
+
+    def token(self, token_id):
+        return self._tokens[token_id]
+
+    def pool_id(self, pool_address):
+        pool_id = self._pool_ids.get(pool_address)
+        if pool_id is None:
+            pool_id = len(self._pools)
+            self._pools.append(sys.intern(pool_address))
+            self._pool_ids[pool_address] = pool_id
+        return pool_id
+
+    def pool(self, pool_id):
+        return self._pools[pool_id]
+
+registry = MetadataRegistry()
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class EventRecord:
+    """A stored liquidity event, in the data/pools_events.json schema."""
+
+    __slots__ = (
+        'event', 'args', 'provider', 'timestamp', 'transaction_hash', 'log_index',
+        'block_number', 'sender', 'pool_id', 'token0_id', 'token1_id', 'amounts', 'action'
+    )
+
+    def __init__(self, event, args, provider, timestamp, transaction_hash, log_index, block_number,
+                 sender, pool_id, token0_id, token1_id, amounts, action):
+        self.event = event
+        self.args = args
+        self.provider = provider
+        self.timestamp = timestamp
+        self.transaction_hash = transaction_hash
+        self.log_index = log_index
+        self.block_number = block_number
+        self.sender = sender
+        self.pool_id = pool_id
+        self.token0_id = token0_id
+        self.token1_id = token1_id
+        self.amounts = amounts
+        self.action = action
+
+    @classmethod
+    def from_dict(cls, event, registry=registry):
+        tokens = event['tokens']
+        return cls(
+            event=_intern(event['event']),
+            args=event.get('args', {}),
+            provider=_intern(event['provider']),
+            timestamp=event['timestamp'],
+            transaction_hash=event['transactionHash'],
+            log_index=event.get('logIndex'),
+            block_number=event.get('blockNumber'),
+            sender=_intern(event.get('_from')),
+            pool_id=registry.pool_id(event['pool_address']),
+            token0_id=registry.token_id(tokens['token0']),
+            token1_id=registry.token_id(tokens['token1']),
+            amounts=tuple(event['amounts']),
+            action=_intern(event['action']),
+        )
+
+    @property
+    def pool_address(self):
+        return registry.pool(self.pool_id)
+
+    def sort_key(self):
+        """Same ordering as helpers.sort_events: provider, timestamp, adds before removes."""
+        return (self.provider, self.timestamp, 0 if self.action == 'add' else 1)
+
+    def to_dict(self, registry=registry):
+        event = {
+            'event': self.event,
+            'args': self.args,
+            'provider': self.provider,
+            'timestamp': self.timestamp,
+            'transactionHash': self.transaction_hash,
+        }
+        # Events stored before log positions were recorded don't carry them
+        if self.log_index is not None:
+            event['logIndex'] = self.log_index
+        if self.block_number is not None:
+            event['blockNumber'] = self.block_number
+        if self.sender is not None:
+            event['_from'] = self.sender
+        event['pool_address'] = registry.pool(self.pool_id)
+        event['tokens'] = {'token0': registry.token(self.token0_id), 'token1': registry.token(self.token1_id)}
+        event['amounts'] = list(self.amounts)
+        event['action'] = self.action
+        return event
+
+class BalanceEntry:
+    """
+    A provider's balances right after one of their events, in the
+    data/balances/provider_balances.json schema.
+
+    `pool_balances` is a tuple of (pool_id, ((symbol, balance), ...)) pairs.
+    It is immutable, so consecutive entries share every pool they didn't
+    touch instead of deep-copying the whole mapping; total_token_balance is
+    derived from it on demand.
+    """
+
+    __slots__ = (
+        'provider', 'timestamp', 'event', 'action', 'transaction_hash', 'txhash_counter',
+        'token0_id', 'token1_id', 'amounts', 'pool_id', 'pool_balances'
+    )
+
+    def __init__(self, provider, timestamp, event, action, transaction_hash, txhash_counter,
+                 token0_id, token1_id, amounts, pool_id, pool_balances):
+        self.provider = provider
+        self.timestamp = timestamp
+        self.event = event
+        self.action = action
+        self.transaction_hash = transaction_hash
+        self.txhash_counter = txhash_counter
+        self.token0_id = token0_id
+        self.token1_id = token1_id
+        self.amounts = amounts
+        self.pool_id = pool_id
+        self.pool_balances = pool_balances
+
+    @classmethod
+    def from_dict(cls, entry, registry=registry):
+        tokens = entry['tokens']
+        pool_balances = tuple(
+            (registry.pool_id(pool_address), tuple((_intern(symbol), balance) for symbol, balance in pool_data.get('token_balance', {}).items()))
+            for pool_address, pool_data in entry.get('pool_balances', {}).items()
+        )
+        return cls(
+            provider=_intern(entry['provider']),
+            timestamp=entry['timestamp'],
+            event=_intern(entry['event']),
+            action=_intern(entry['action']),
+            transaction_hash=entry['transactionHash'],
+            txhash_counter=entry.get('txhash_counter', 0),
+            token0_id=registry.token_id(tokens['token0']),
+            token1_id=registry.token_id(tokens['token1']),
+            amounts=tuple(entry['amounts']),
+            pool_id=registry.pool_id(entry['pool_address']),
+            pool_balances=pool_balances,
+        )
+
+    @staticmethod
+    def token_balances_of(pool_balances, pool_id):
+        """:return: The ((symbol, balance), ...) pairs held in a pool, or () if none."""
+        for entry_pool_id, token_balance in pool_balances:
+            if entry_pool_id == pool_id:
+                return token_balance
+        return ()
+
+    @property
+    def total_token_balance(self):
+        total_token_balance = {}
+        for _, token_balance in self.pool_balances:
+            for token_symbol, balance in token_balance:
+                if token_symbol in total_token_balance:
+                    total_token_balance[token_symbol] += balance
+                else:
+                    total_token_balance[token_symbol] = balance
+        return total_token_balance
+
+    def to_dict(self, registry=registry):
+        return {
+            'provider': self.provider,
+            'timestamp': self.timestamp,
+            'event': self.event,
+            'action': self.action,
+            'transactionHash': self.transaction_hash,
+            'txhash_counter': self.txhash_counter,
+            'tokens': {'token0': registry.token(self.token0_id), 'token1': registry.token(self.token1_id)},
+            'amounts': list(self.amounts),
+            'pool_address': registry.pool(self.pool_id),
+            'pool_balances': {
+                registry.pool(pool_id): {'token_balance': dict(token_balance)}
+                for pool_id, token_balance in self.pool_balances
+            },
+            'total_token_balance': self.total_token_balance,
+        }
+
+def replace_pool_balance(pool_balances, pool_id, token_balance):
+    """
+    :return: A copy of `pool_balances` with `pool_id` set to `token_balance`,
+        keeping the pool's position (new pools are appended).
+    """
+    for index, (entry_pool_id, _) in enumerate(pool_balances):
+        if entry_pool_id == pool_id:
+            return pool_balances[:index] + ((pool_id, token_balance),) + pool_balances[index + 1:]
+    return pool_balances + ((pool_id, token_balance),)
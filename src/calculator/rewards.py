@@ -3,20 +3,29 @@ import json
 from datetime import datetime, timezone
 from typing import Dict, List, Any
 
-from src.config import START_DATE, END_DATE, TOTAL_REWARDS
-from src.utils.helpers import normalize_address, get_token_price
+from src.config import START_DATE, END_DATE, TOTAL_REWARDS, T_REWARD_RATIO, DAILY_BALANCES_FILE
+from src.utils.helpers import normalize_address
+from src.data.price_table import get_daily_price
+from src.data.balance_store import DAY_SECONDS, BalanceRuns, daily_balance_store, day_to_date
 
 logger = logging.getLogger(__name__)
 
 class RewardsCalculator:
-    def __init__(self, daily_balances_file: str, start_date: datetime, end_date: datetime, total_rewards: float):
+    def __init__(self, daily_balances_file: str, start_date: datetime, end_date: datetime, total_rewards: float,
+                 balance_store=None, as_of: datetime = None):
         self.daily_balances_file = daily_balances_file
+        # When a DailyBalanceStore is given its balance runs are read instead of the JSON file
+        self.balance_store = balance_store
+        # Calculate as of this time instead of now
+        self.as_of = as_of
         self.start_date = start_date
         self.end_date = end_date
         self.total_rewards = total_rewards
         self.rewards_data = {}
 
     def load_daily_balances(self) -> Dict[str, Any]:
+        if self.balance_store is not None:
+            return self.balance_store.read_runs()
         try:
             with open(self.daily_balances_file, 'r') as f:
                 return json.load(f)
@@ -28,7 +37,9 @@ class RewardsCalculator:
             return {}
 
     def calculate_weighted_avg_liquidity(self, provider_liquidity: Dict[str, Any]) -> Dict[str, float]:
-        now_date = datetime.now(timezone.utc)
+        if isinstance(provider_liquidity, BalanceRuns):
+            return self.calculate_weighted_avg_liquidity_from_runs(provider_liquidity)
+        now_date = self.now()
         total_duration = (self.end_date - self.start_date).total_seconds()
         weighted_avg_liquidity = {}
 
@@ -50,17 +61,42 @@ class RewardsCalculator:
 
         return weighted_avg_liquidity
 
-    def calculate_rewards(self, weighted_avg_liquidity: Dict[str, float]) -> List[Dict[str, Any]]:
-        now_date = datetime.now(timezone.utc)
-        reward_date = min(now_date, self.end_date)
-        total_weighted_liquidity = sum(weighted_avg_liquidity.values())
+    def calculate_weighted_avg_liquidity_from_runs(self, runs: BalanceRuns) -> Dict[str, float]:
+        """
+        Same result as for the daily balances the runs stand for: every day
+        counts for a full day, except that the store's last day counts until
+        min(now, end_date), so each run is a difference of price prefix sums.
+        """
+        # Not imported at module level: this module is on the startup path
+        import numpy as np
+
+        if not len(runs):
+            return {}
+        now_date = self.now()
+        total_duration = (self.end_date - self.start_date).total_seconds()
+        day_weights = np.full(runs.last_day - runs.first_day + 1, float(DAY_SECONDS))
+        day_weights[-1] = (min(now_date, self.end_date) - day_to_date(runs.last_day)).total_seconds()
+
+        provider_ids, rows = np.unique(runs.provider, return_inverse=True)
+        weighted = np.bincount(rows, weights=runs.weighted_usd(day_weights), minlength=len(provider_ids)) / total_duration
+        return {runs.providers[provider_id]: value for provider_id, value in zip(provider_ids.tolist(), weighted.tolist())}
+
+    def calculate_rewards(self, weighted_avg_liquidity: Dict[str, float],
+                          total_weighted_liquidity: float = None) -> List[Dict[str, Any]]:
+        """
+        :param total_weighted_liquidity: Liquidity of all providers, when
+            `weighted_avg_liquidity` only holds some of them.
+        """
+        reward_date = min(self.now(), self.end_date)
+        if total_weighted_liquidity is None:
+            total_weighted_liquidity = sum(weighted_avg_liquidity.values())
         rewards = []
 
         if total_weighted_liquidity > 0:
             for provider, avg_liquidity in weighted_avg_liquidity.items():
                 provider_arb_reward_in_tokens = (avg_liquidity / total_weighted_liquidity) * self.total_rewards
                 provider_arb_reward_in_usd = provider_arb_reward_in_tokens * self.get_token_price("arbitrum", reward_date)
-                provider_reward_in_t_usd = provider_arb_reward_in_usd * 0.25
+                provider_reward_in_t_usd = provider_arb_reward_in_usd * T_REWARD_RATIO
                 provider_reward_in_t_tokens = provider_reward_in_t_usd / self.get_token_price("threshold-network-token", reward_date)
                 
                 rewards.append({
@@ -76,16 +112,20 @@ class RewardsCalculator:
 
         return rewards
 
+    def now(self) -> datetime:
+        return self.as_of or datetime.now(timezone.utc)
+
     def get_token_price(self, token: str, date: datetime) -> float:
         try:
-            return get_token_price(token, date)
+            return get_daily_price(token, date)
         except Exception as e:
             logger.error(f"Error getting token price for {token}: {str(e)}")
             return 0
 
-    def run(self) -> Dict[str, Any]:
+    def run(self, daily_balances=None) -> Dict[str, Any]:
+        """:param daily_balances: Daily balances (as in daily_balances.json) or BalanceRuns; loaded if not given."""
         try:
-            provider_liquidity = self.load_daily_balances()
+            provider_liquidity = daily_balances if daily_balances is not None else self.load_daily_balances()
             weighted_avg_liquidity = self.calculate_weighted_avg_liquidity(provider_liquidity)
             rewards = self.calculate_rewards(weighted_avg_liquidity)
 
@@ -99,11 +139,12 @@ class RewardsCalculator:
 
         return self.rewards_data
 
-def calculate_rewards() -> Dict[str, Any]:
+def calculate_rewards(daily_balances=None) -> Dict[str, Any]:
     calculator = RewardsCalculator(
-        daily_balances_file='./data/balances/daily_balances.json',
+        daily_balances_file=DAILY_BALANCES_FILE,
         start_date=START_DATE,
         end_date=END_DATE,
-        total_rewards=TOTAL_REWARDS
+        total_rewards=TOTAL_REWARDS,
+        balance_store=daily_balance_store
     )
-    return calculator.run()
\ No newline at end of file
+    return calculator.run(daily_balances)
\ No newline at end of file
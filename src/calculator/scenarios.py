@@ -0,0 +1,482 @@
+"""
+What-if reward scenarios.
+
+The daily balances (from the daily balance store, or a daily_balances.json
+style file) are loaded once into provider x segment matrices, where
+segment d is the period from one balance date to the next. A scenario's
+program window becomes the number of seconds each segment counts for, so
+the time-weighted liquidity of every provider under every scenario is a
+single matrix product; rewards follow with element-wise array math.
+
+    python -m src.calculator.scenarios scenarios.json --output data/scenarios/sweep.json
+    python -m src.calculator.scenarios --sweep total_rewards=40000,50000,60000 --sweep t_reward_ratio=0.2,0.25,0.3
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import itertools
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from src.config import START_DATE, END_DATE, TOTAL_REWARDS, T_REWARD_RATIO, DUST_THRESHOLD_USD, TOKENS, DAILY_BALANCES_FILE
+from src.data.balance_store import DAY_SECONDS, daily_balance_store
+from src.data.price_table import get_daily_price
+from src.utils.helpers import normalize_address
+
+logger = logging.getLogger(__name__)
+
+BASELINE = "baseline"
+DEFAULT_TOP_CHANGES = 10
+# Reward differences below this (in tokens) are not counted as changes
+CHANGE_TOLERANCE = 1e-8
+
+Scenario = namedtuple('Scenario', ['name', 'total_rewards', 'start_date', 'end_date', 't_reward_ratio', 'dust_threshold_usd'])
+
+def baseline_scenario():
+    """:return: The scenario of the configured program parameters."""
+    return Scenario(BASELINE, TOTAL_REWARDS, START_DATE, END_DATE, T_REWARD_RATIO, DUST_THRESHOLD_USD)
+
+def _parse_date(value):
+    date = datetime.fromisoformat(value)
+    # Same convention as START_DATE: dates without an offset are UTC
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+SCENARIO_PARAMETERS = {
+    "total_rewards": float,
+    "start_date": _parse_date,
+    "end_date": _parse_date,
+    "program_duration_weeks": int,
+    "t_reward_ratio": float,
+    "dust_threshold_usd": float,
+}
+
+def parse_scenario(spec, base, name=None):
+    """
+    Build a scenario from a dict of parameter overrides.
+
+    :param spec: Any of SCENARIO_PARAMETERS and an optional "name"; the rest
+        is taken from `base`. program_duration_weeks sets the end date
+        relative to the (possibly overridden) start date.
+    :raises ValueError: On unknown parameters or invalid values.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Expected a scenario object, got {spec!r}")
+    unknown = set(spec) - set(SCENARIO_PARAMETERS) - {"name"}
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters: {', '.join(sorted(unknown))}")
+    values = base._asdict()
+    values["name"] = spec.get("name", name or BASELINE)
+    if not isinstance(values["name"], str):
+        raise ValueError(f"Scenario name must be a string, got {values['name']!r}")
+    parsed = {}
+    for key, parse in SCENARIO_PARAMETERS.items():
+        if key in spec:
+            try:
+                parsed[key] = parse(spec[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {key} for scenario {values['name']}: {spec[key]!r}")
+
+    weeks = parsed.pop("program_duration_weeks", None)
+    values.update(parsed)
+    if weeks is not None:
+        if "end_date" in parsed:
+            raise ValueError(f"Scenario {values['name']} sets both end_date and program_duration_weeks")
+        values["end_date"] = values["start_date"] + timedelta(weeks=weeks)
+
+    scenario = Scenario(**values)
+    if scenario.end_date <= scenario.start_date:
+        raise ValueError(f"Scenario {scenario.name} ends before it starts")
+    if scenario.total_rewards < 0 or scenario.t_reward_ratio < 0 or scenario.dust_threshold_usd < 0:
+        raise ValueError(f"Scenario {scenario.name} has a negative parameter")
+    return scenario
+
+def expand_sweep(sweep):
+    """
+    :param sweep: {parameter: [values]}
+    :return: One scenario spec per combination of values, named after it.
+    :raises ValueError: If `sweep` is not a dict of lists.
+    """
+    if not isinstance(sweep, dict) or not all(isinstance(values, list) for values in sweep.values()):
+        raise ValueError(f"Expected sweep as {{parameter: [values]}}, got {sweep!r}")
+    keys = list(sweep)
+    specs = []
+    for combination in itertools.product(*(sweep[key] for key in keys)):
+        spec = dict(zip(keys, combination))
+        spec["name"] = ",".join(f"{key}={value}" for key, value in spec.items())
+        specs.append(spec)
+    return specs
+
+class BalanceMatrix:
+    """
+    Daily balances as dense arrays. `total_usd[p, d]` and `token_usd[token][p, d]`
+    hold provider p's balance during segment d, which runs from times[d] to
+    times[d + 1] (the last one is open-ended); before a provider's first
+    balance they are 0.
+
+    Token balances below `dust_threshold_usd` were already stored as 0 by
+    DailyBalanceCalculator, so only higher thresholds can be evaluated.
+    """
+
+    def __init__(self, providers, times, total_usd, token_usd, dust_threshold_usd=DUST_THRESHOLD_USD):
+        self.providers = providers
+        self.times = times
+        self.total_usd = total_usd
+        self.token_usd = token_usd
+        self.dust_threshold_usd = dust_threshold_usd
+
+    @classmethod
+    def from_daily_balances(cls, daily_balances, dust_threshold_usd=DUST_THRESHOLD_USD):
+        """:param daily_balances: The contents of daily_balances.json."""
+        providers = list(daily_balances)
+        date_seconds = {}
+        rows = []
+        times = []
+        totals = []
+        # token -> (flat balance indexes, values)
+        token_values = {}
+        for row, provider in enumerate(providers):
+            for balance in daily_balances[provider]['balances']:
+                date = balance['balance_date']
+                seconds = date_seconds.get(date)
+                if seconds is None:
+                    seconds = date_seconds[date] = datetime.fromisoformat(date).timestamp()
+                for token, value in balance.get('token_usd_balance', {}).items():
+                    indexes, values = token_values.setdefault(token, ([], []))
+                    indexes.append(len(rows))
+                    values.append(float(value))
+                rows.append(row)
+                times.append(seconds)
+                totals.append(float(balance['total_usd_balance']))
+
+        token_values = {
+            token: (np.array(indexes, dtype=np.int64), np.array(values))
+            for token, (indexes, values) in token_values.items()
+        }
+        return cls._from_rows(providers, np.array(rows, dtype=np.int64), np.array(times, dtype=np.float64),
+                              np.array(totals), token_values, dust_threshold_usd)
+
+    @classmethod
+    def from_columns(cls, providers, columns, dust_threshold_usd=DUST_THRESHOLD_USD):
+        """
+        :param providers: Provider addresses by store id (DailyBalanceStore.providers()).
+        :param columns: The arrays of DailyBalanceStore.read_columns().
+        """
+        # Only providers with balances get a row, in id (first-seen) order like the JSON file
+        ids, rows = np.unique(columns["provider"], return_inverse=True)
+        flat_times = columns["day"].astype(np.float64) * DAY_SECONDS
+        token_values = {}
+        for token, values in columns["tokens"].items():
+            present = np.flatnonzero(~np.isnan(values))
+            if len(present):
+                token_values[token] = (present, values[present])
+        return cls._from_rows([providers[i] for i in ids.tolist()], rows.astype(np.int64), flat_times,
+                              columns["total_usd"], token_values, dust_threshold_usd)
+
+    @classmethod
+    def _from_rows(cls, providers, rows, flat_times, totals, token_values, dust_threshold_usd):
+        segment_times = np.unique(flat_times)
+        columns = np.searchsorted(segment_times, flat_times)
+        shape = (len(providers), len(segment_times))
+
+        # Each balance lasts until the provider's next one: place the balances
+        # on the segment grid, then carry every row's last set column forward
+        is_set = np.zeros(shape, dtype=bool)
+        is_set[rows, columns] = True
+        carried = np.where(is_set, np.arange(shape[1]), 0)
+        np.maximum.accumulate(carried, axis=1, out=carried)
+
+        def fill(flat_indexes, values):
+            placed = np.zeros(shape)
+            placed[rows[flat_indexes], columns[flat_indexes]] = values
+            return np.take_along_axis(placed, carried, axis=1)
+
+        total_usd = fill(np.arange(len(rows)), totals)
+        token_usd = {token: fill(indexes, values) for token, (indexes, values) in token_values.items()}
+        return cls(providers, segment_times, total_usd, token_usd, dust_threshold_usd)
+
+    @classmethod
+    def load(cls, daily_balances_file=DAILY_BALANCES_FILE):
+        with open(daily_balances_file, 'r') as f:
+            return cls.from_daily_balances(json.load(f))
+
+    @classmethod
+    def from_store(cls, store):
+        return cls.from_columns(store.providers(), store.read_columns())
+
+    def usd(self, dust_threshold_usd):
+        """:return: total_usd with token balances below `dust_threshold_usd` counted as 0."""
+        if dust_threshold_usd <= self.dust_threshold_usd:
+            return self.total_usd
+        usd = np.zeros_like(self.total_usd)
+        for values in self.token_usd.values():
+            usd += np.where(values >= dust_threshold_usd, values, 0.0)
+        return usd
+
+    def windows(self, scenarios, as_of):
+        """
+        :return: (segments, scenarios) array of the seconds each segment's
+            balance counts for. Like RewardsCalculator, a scenario counts
+            balances until min(as_of, end_date), and from the start of its
+            first day, where DailyBalanceCalculator dates the first balance.
+        """
+        segment_starts = self.times[:, np.newaxis]
+        segment_ends = np.append(self.times[1:], np.inf)[:, np.newaxis]
+        window_starts = np.array([
+            scenario.start_date.replace(hour=0, minute=0, second=0, microsecond=0).timestamp() for scenario in scenarios
+        ])
+        window_ends = np.array([min(as_of, scenario.end_date).timestamp() for scenario in scenarios])
+        overlap = np.minimum(segment_ends, window_ends) - np.maximum(segment_starts, window_starts)
+        return np.clip(overlap, 0, None)
+
+_matrix_cache = {}
+
+def load_balance_matrix(daily_balances_file=None, store=None):
+    """
+    :return: The BalanceMatrix of a daily balances file, or of the daily
+        balance store when no file is given, cached until it changes.
+    """
+    if daily_balances_file is not None:
+        key = os.path.abspath(daily_balances_file)
+        stat = os.stat(key)
+        version = (stat.st_mtime_ns, stat.st_size)
+        load = lambda: BalanceMatrix.load(key)
+    else:
+        store = store if store is not None else daily_balance_store
+        key = os.path.abspath(store.base_dir)
+        version = store.version()
+        load = lambda: BalanceMatrix.from_store(store)
+    cached = _matrix_cache.get(key)
+    if cached is None or cached[0] != version:
+        _matrix_cache.clear()
+        cached = _matrix_cache[key] = (version, load())
+    return cached[1]
+
+class ScenarioResults:
+    """Per-provider reward arrays of shape (providers, scenarios); column 0 is the baseline."""
+
+    FIELDS = (
+        "weighted_avg_liquidity",
+        "estimated_reward_in_arb_tokens",
+        "estimated_reward_in_arb_usd",
+        "estimated_reward_in_t_usd",
+        "estimated_reward_in_t_tokens",
+    )
+
+    def __init__(self, providers, scenarios, as_of, arb_prices, t_prices, values):
+        self.providers = providers
+        self.scenarios = scenarios
+        self.as_of = as_of
+        self.arb_prices = arb_prices
+        self.t_prices = t_prices
+        self.values = values
+
+    def rewards(self, column):
+        """:return: The reward table of a scenario, in RewardsCalculator.calculate_rewards' format."""
+        columns = [self.values[field][:, column].tolist() for field in self.FIELDS]
+        return [
+            dict(provider=normalize_address(provider), **dict(zip(self.FIELDS, row)))
+            for provider, *row in zip(self.providers, *columns)
+        ]
+
+    def summary(self, column, top=DEFAULT_TOP_CHANGES, include_rewards=False):
+        """:return: Totals of a scenario and its differences from the baseline."""
+        scenario = self.scenarios[column]
+        arb_tokens = self.values["estimated_reward_in_arb_tokens"]
+        t_tokens = self.values["estimated_reward_in_t_tokens"]
+        result = {
+            "name": scenario.name,
+            "parameters": {
+                "total_rewards": scenario.total_rewards,
+                "start_date": scenario.start_date.isoformat(),
+                "end_date": scenario.end_date.isoformat(),
+                "t_reward_ratio": scenario.t_reward_ratio,
+                "dust_threshold_usd": scenario.dust_threshold_usd,
+            },
+            "reward_date": min(self.as_of, scenario.end_date).isoformat(),
+            "arb_price_usd": float(self.arb_prices[column]),
+            "t_price_usd": float(self.t_prices[column]),
+            "total_weighted_liquidity": float(self.values["weighted_avg_liquidity"][:, column].sum()),
+            "rewarded_providers": int(np.count_nonzero(arb_tokens[:, column] > 0)),
+            "totals": {field: float(self.values[field][:, column].sum()) for field in self.FIELDS[1:]},
+        }
+
+        if column > 0:
+            arb_delta = arb_tokens[:, column] - arb_tokens[:, 0]
+            t_delta = t_tokens[:, column] - t_tokens[:, 0]
+            result["diff"] = {
+                name: {
+                    "total": float(delta.sum()),
+                    "max_increase": float(max(delta.max(initial=0), 0)),
+                    "max_decrease": float(min(delta.min(initial=0), 0)),
+                    "changed_providers": int(np.count_nonzero(np.abs(delta) > CHANGE_TOLERANCE)),
+                }
+                for name, delta in (("arb_tokens", arb_delta), ("t_tokens", t_delta))
+            }
+            largest = np.argsort(-np.abs(arb_delta), kind='stable')[:top]
+            result["top_changes"] = [{
+                "provider": normalize_address(self.providers[row]),
+                "baseline_arb_tokens": float(arb_tokens[row, 0]),
+                "arb_tokens": float(arb_tokens[row, column]),
+                "arb_tokens_delta": float(arb_delta[row]),
+                "t_tokens_delta": float(t_delta[row]),
+            } for row in largest if abs(arb_delta[row]) > CHANGE_TOLERANCE]
+
+        if include_rewards:
+            result["rewards"] = self.rewards(column)
+        return result
+
+def _prices(coingecko_id, dates, price_lookup):
+    cache = {}
+    prices = []
+    for date in dates:
+        if date not in cache:
+            cache[date] = price_lookup(coingecko_id, date)
+        prices.append(cache[date])
+    return np.array(prices, dtype=np.float64)
+
+def evaluate_scenarios(matrix, scenarios, as_of=None, price_lookup=None):
+    """
+    Evaluate reward scenarios in one pass over the balance matrix.
+
+    :param scenarios: Scenarios to compare; the first one is the baseline.
+    :param as_of: Time the rewards are calculated at (defaults to now).
+    :param price_lookup: (coingecko_id, date) -> USD price; defaults to the daily price table.
+    :return: ScenarioResults
+    """
+    as_of = as_of or datetime.now(timezone.utc)
+    price_lookup = price_lookup or get_daily_price
+    for scenario in scenarios:
+        if scenario.dust_threshold_usd < matrix.dust_threshold_usd:
+            raise ValueError(
+                f"Scenario {scenario.name}: dust thresholds below the {matrix.dust_threshold_usd} USD "
+                "used for the daily balances cannot be evaluated"
+            )
+
+    windows = matrix.windows(scenarios, as_of)
+    liquidity_time = np.empty((len(matrix.providers), len(scenarios)))
+    thresholds = np.array([scenario.dust_threshold_usd for scenario in scenarios])
+    for threshold in np.unique(thresholds):
+        columns = np.flatnonzero(thresholds == threshold)
+        liquidity_time[:, columns] = matrix.usd(threshold) @ windows[:, columns]
+
+    durations = np.array([(scenario.end_date - scenario.start_date).total_seconds() for scenario in scenarios])
+    weighted_avg_liquidity = liquidity_time / durations
+    total_weighted_liquidity = weighted_avg_liquidity.sum(axis=0)
+    shares = np.divide(
+        weighted_avg_liquidity, total_weighted_liquidity,
+        out=np.zeros_like(weighted_avg_liquidity), where=total_weighted_liquidity > 0
+    )
+    for scenario, total in zip(scenarios, total_weighted_liquidity):
+        if total <= 0:
+            logger.warning(f"Total weighted liquidity is zero in scenario {scenario.name}, no rewards to distribute")
+
+    reward_dates = [min(as_of, scenario.end_date) for scenario in scenarios]
+    arb_prices = _prices(TOKENS["ARB"], reward_dates, price_lookup)
+    t_prices = _prices(TOKENS["T"], reward_dates, price_lookup)
+    if not t_prices.all():
+        raise ValueError(f"No T price for {reward_dates[int(np.argmin(t_prices))].date()}")
+
+    arb_tokens = shares * np.array([scenario.total_rewards for scenario in scenarios])
+    arb_usd = arb_tokens * arb_prices
+    t_usd = arb_usd * np.array([scenario.t_reward_ratio for scenario in scenarios])
+    t_tokens = t_usd / t_prices
+
+    values = dict(zip(ScenarioResults.FIELDS, (weighted_avg_liquidity, arb_tokens, arb_usd, t_usd, t_tokens)))
+    return ScenarioResults(matrix.providers, scenarios, as_of, arb_prices, t_prices, values)
+
+def run_scenarios(spec, daily_balances_file=None, price_lookup=None):
+    """
+    Evaluate a scenario request against the configured baseline.
+
+    :param spec: {"scenarios": [parameter overrides], "sweep": {parameter: [values]},
+        "as_of": ISO date, "top": int, "include_rewards": bool}; every key is optional.
+    :param daily_balances_file: Read this daily_balances.json style file instead of the store.
+    :raises ValueError: On an invalid request.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Expected a JSON object")
+    base = baseline_scenario()
+    scenario_specs = spec.get("scenarios") or []
+    if not isinstance(scenario_specs, list):
+        raise ValueError(f"Expected scenarios as a list of objects, got {scenario_specs!r}")
+    specs = scenario_specs + expand_sweep(spec.get("sweep") or {})
+    scenarios = [base] + [parse_scenario(item, base, f"scenario_{i + 1}") for i, item in enumerate(specs)]
+    names = [scenario.name for scenario in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("Scenario names must be unique (and differ from 'baseline')")
+    try:
+        as_of = _parse_date(spec["as_of"]) if spec.get("as_of") else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid as_of: {spec['as_of']!r}")
+    try:
+        top = int(spec.get("top", DEFAULT_TOP_CHANGES))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid top: {spec['top']!r}")
+    if top < 0:
+        raise ValueError(f"Invalid top: {top}")
+    include_rewards = bool(spec.get("include_rewards", False))
+
+    matrix = load_balance_matrix(daily_balances_file)
+    results = evaluate_scenarios(matrix, scenarios, as_of, price_lookup)
+    return {
+        "as_of": results.as_of.isoformat(),
+        "providers": len(matrix.providers),
+        "scenarios": [results.summary(column, top, include_rewards) for column in range(len(scenarios))],
+    }
+
+def _parse_sweep(items):
+    sweep = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        if not values:
+            raise ValueError(f"Expected --sweep parameter=value1,value2,...; got {item!r}")
+        sweep[key] = values.split(",")
+    return sweep
+
+def print_scenarios(result):
+    print(f"{len(result['scenarios'])} scenarios over {result['providers']} providers, as of {result['as_of']}")
+    print(f"{'scenario':<48} {'ARB':>14} {'T':>16} {'providers':>10} {'ARB changed':>12}")
+    for scenario in result["scenarios"]:
+        changed = scenario["diff"]["arb_tokens"]["changed_providers"] if "diff" in scenario else "-"
+        print(f"{scenario['name']:<48} {scenario['totals']['estimated_reward_in_arb_tokens']:>14.4f} "
+              f"{scenario['totals']['estimated_reward_in_t_tokens']:>16.4f} {scenario['rewarded_providers']:>10} {changed:>12}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Evaluate what-if reward scenarios against the configured program")
+    parser.add_argument("scenarios_file", nargs="?", help="JSON list of scenario parameter overrides, or a full request object")
+    parser.add_argument("--sweep", action="append", default=[], metavar="PARAMETER=V1,V2",
+                        help=f"Add every combination of these values (repeatable); parameters: {', '.join(SCENARIO_PARAMETERS)}")
+    parser.add_argument("--daily-balances", help="Read this daily_balances.json style file instead of the daily balance store")
+    parser.add_argument("--as-of", help="Calculate rewards as of this time (ISO format, defaults to now)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_CHANGES, help="Largest per-provider changes to list per scenario")
+    parser.add_argument("--rewards", action="store_true", help="Include every scenario's full reward table in the output")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+
+    args = parser.parse_args()
+
+    request = {}
+    if args.scenarios_file:
+        with open(args.scenarios_file) as f:
+            loaded = json.load(f)
+        request = loaded if isinstance(loaded, dict) else {"scenarios": loaded}
+    request.setdefault("sweep", {}).update(_parse_sweep(args.sweep))
+    if args.as_of:
+        request["as_of"] = args.as_of
+    request["top"] = args.top
+    request["include_rewards"] = args.rewards
+
+    try:
+        result = run_scenarios(request, args.daily_balances)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    print_scenarios(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,148 @@
+"""
+Point-in-time reward standings.
+
+Every provider's time-weighted USD liquidity is kept as prefix sums over
+the days of the daily balance store, so the standing as of any moment is
+the prefix up to that day plus the part of the day itself, without
+keeping a rewards snapshot per run.
+"""
+import os
+import logging
+import numpy as np
+from src.config import START_DATE, END_DATE, TOTAL_REWARDS, DAILY_BALANCES_FILE
+from src.calculator.rewards import RewardsCalculator
+from src.data.balance_store import DAY_SECONDS, daily_balance_store, day_to_date, to_day
+
+logger = logging.getLogger(__name__)
+
+class LiquidityHistory:
+    """
+    `daily_usd[p, k]` is provider p's USD balance on day first_day + k, and
+    `cumulative[p, k]` its balance x seconds over the days before it. As in
+    RewardsCalculator, the last stored day's balance lasts until the time
+    asked for.
+    """
+
+    def __init__(self, providers, first_day, daily_usd, first_columns):
+        """:param first_columns: Per provider, the column of its first balance."""
+        self.providers = providers
+        self.first_day = first_day
+        self.daily_usd = daily_usd
+        self.first_columns = first_columns
+        self.cumulative = np.zeros((len(providers), daily_usd.shape[1] + 1))
+        np.cumsum(daily_usd * DAY_SECONDS, axis=1, out=self.cumulative[:, 1:])
+        self.total_daily_usd = daily_usd.sum(axis=0)
+        self.total_cumulative = self.cumulative.sum(axis=0)
+        self._rows = {provider.lower(): row for row, provider in enumerate(providers)}
+
+    @classmethod
+    def from_runs(cls, runs):
+        """:param runs: BalanceRuns of the whole store."""
+        if not len(runs):
+            return cls([], None, np.zeros((0, 0)), np.zeros(0, dtype=np.int64))
+        columns = runs.daily_columns()
+        ids, rows = np.unique(columns["provider"], return_inverse=True)
+        days = columns["day"] - runs.first_day
+        daily_usd = np.zeros((len(ids), runs.last_day - runs.first_day + 1))
+        daily_usd[rows, days] = columns["total_usd"]
+        first_columns = np.full(len(ids), daily_usd.shape[1], dtype=np.int64)
+        np.minimum.at(first_columns, rows, days)
+        return cls([runs.providers[i] for i in ids.tolist()], runs.first_day, daily_usd, first_columns)
+
+    def row(self, provider):
+        """:return: The provider's row (addresses compare case-insensitively), or None."""
+        return self._rows.get(provider.lower())
+
+    def position(self, moment):
+        """:return: (day column, seconds of that day counted) up to `moment`; column is None before the first day."""
+        if self.first_day is None:
+            return None, 0.0
+        column = min(to_day(moment) - self.first_day, self.daily_usd.shape[1] - 1)
+        if column < 0:
+            return None, 0.0
+        return column, (moment - day_to_date(self.first_day + column)).total_seconds()
+
+    def weighted_liquidity(self, moment, rows=slice(None)):
+        """:return: USD x seconds of every provider (or those in `rows`) up to `moment`."""
+        column, seconds = self.position(moment)
+        if column is None:
+            return np.zeros(len(self.providers))[rows]
+        return self.cumulative[rows, column] + self.daily_usd[rows, column] * seconds
+
+    def total_weighted_liquidity(self, moment):
+        column, seconds = self.position(moment)
+        if column is None:
+            return 0.0
+        return float(self.total_cumulative[column] + self.total_daily_usd[column] * seconds)
+
+    def providers_as_of(self, moment):
+        """:return: Mask of the providers that had a balance by `moment`."""
+        column, _ = self.position(moment)
+        if column is None:
+            return np.zeros(len(self.providers), dtype=bool)
+        return self.first_columns <= column
+
+_history_cache = {}
+
+def load_liquidity_history(store=None):
+    """:return: The LiquidityHistory of the daily balance store, cached until the store changes."""
+    store = store if store is not None else daily_balance_store
+    key = os.path.abspath(store.base_dir)
+    version = store.version()
+    cached = _history_cache.get(key)
+    if cached is None or cached[0] != version:
+        _history_cache.clear()
+        cached = _history_cache[key] = (version, LiquidityHistory.from_runs(store.read_runs()))
+    return cached[1]
+
+def _calculator(as_of):
+    return RewardsCalculator(DAILY_BALANCES_FILE, START_DATE, END_DATE, TOTAL_REWARDS, as_of=as_of)
+
+def rewards_as_of(as_of, store=None):
+    """
+    Every provider's rewards as RewardsCalculator would have calculated them at `as_of`.
+
+    :return: {"total_weighted_liquidity", "rewards"}
+    """
+    history = load_liquidity_history(store)
+    moment = min(as_of, END_DATE)
+    total_duration = (END_DATE - START_DATE).total_seconds()
+    liquidity = (history.weighted_liquidity(moment) / total_duration).tolist()
+    weighted_avg_liquidity = {
+        provider: value
+        for provider, value, active in zip(history.providers, liquidity, history.providers_as_of(moment).tolist())
+        if active
+    }
+    return {
+        "total_weighted_liquidity": sum(weighted_avg_liquidity.values()),
+        "rewards": _calculator(as_of).calculate_rewards(weighted_avg_liquidity),
+    }
+
+def provider_standing(provider, as_of, store=None):
+    """
+    One provider's balance on the day of `as_of` and its rewards as of then.
+
+    :return: {"balance": daily balance or None, "share": share of the total
+        weighted liquidity, "reward": reward dict or None}, or None for an
+        unknown provider.
+    """
+    store = store if store is not None else daily_balance_store
+    history = load_liquidity_history(store)
+    row = history.row(provider)
+    if row is None:
+        return None
+    provider = history.providers[row]
+    moment = min(as_of, END_DATE)
+    total_duration = (END_DATE - START_DATE).total_seconds()
+    liquidity = float(history.weighted_liquidity(moment, row)) / total_duration
+    total = history.total_weighted_liquidity(moment) / total_duration
+
+    # After the last stored day its balance still holds
+    day = min(to_day(moment), store.last_day())
+    balances = store.provider_balances(provider, day, day)
+    rewards = _calculator(as_of).calculate_rewards({provider: liquidity}, total) if total > 0 else []
+    return {
+        "balance": balances["balances"][0] if balances else None,
+        "share": liquidity / total if total > 0 else 0.0,
+        "reward": rewards[0] if rewards else None,
+    }
@@ -1,7 +1,6 @@
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
-from eth_utils import to_checksum_address
 from src.utils.helpers import load_abi
 import logging
 
@@ -42,6 +41,10 @@ END_DATE = START_DATE + timedelta(weeks=PROGRAM_DURATION_WEEKS)
 START_TIMESTAMP = int(START_DATE.timestamp())
 END_TIMESTAMP = int(END_DATE.timestamp())
 
+# --- Reward parameters ---
+T_REWARD_RATIO = float(os.getenv("T_REWARD_RATIO", 0.25)) # T rewards as a share of each provider's ARB reward USD value
+DUST_THRESHOLD_USD = float(os.getenv("DUST_THRESHOLD_USD", 0.01)) # Daily token balances worth less are counted as 0
+
 # --- Web3 configuration ---
 # Determine RPC URL based on available keys, prioritizing Alchemy
 if ALCHEMY_URL:
@@ -56,21 +59,83 @@ else:
 
 MAX_RETRIES = 5
 RETRY_DELAY = 10
+
+# --- Reorg safety ---
+# "depth": blocks older than CONFIRMATION_DEPTH blocks behind the tip are final.
+# "finalized": use the node's "finalized" block tag.
+CONFIRMATION_MODE = os.getenv("CONFIRMATION_MODE", "depth").lower()
+if CONFIRMATION_MODE not in ("depth", "finalized"):
+    logger.warning(f"Invalid CONFIRMATION_MODE: '{CONFIRMATION_MODE}'. Must be 'depth' or 'finalized'. Using 'depth' as fallback.")
+    CONFIRMATION_MODE = "depth"
+CONFIRMATION_DEPTH = int(os.getenv("CONFIRMATION_DEPTH", 240))
+RUN_INTERVAL_SECONDS = int(os.getenv("RUN_INTERVAL_SECONDS", 86400)) # Pause between main loop iterations
+ERROR_RETRY_DELAY_SECONDS = 10800
 # PROCESS_BLOCK_RANGE_SIZE = 1_000_000 # Keep this commented out as user rejected it
 
+# --- CoinGecko price fetching ---
+# Target granularity of stored price points: "daily" or "hourly".
+# CoinGecko picks the granularity from the requested range length, so ranges
+# are split into windows whose length guarantees the target granularity.
+PRICE_GRANULARITY = os.getenv("PRICE_GRANULARITY", "daily").lower()
+if PRICE_GRANULARITY not in ("daily", "hourly"):
+    logger.warning(f"Invalid PRICE_GRANULARITY: '{PRICE_GRANULARITY}'. Must be 'daily' or 'hourly'. Using 'daily' as fallback.")
+    PRICE_GRANULARITY = "daily"
+PRICE_FETCH_CONCURRENCY = int(os.getenv("PRICE_FETCH_CONCURRENCY", 2))
+PRICE_FETCH_MAX_RETRIES = int(os.getenv("PRICE_FETCH_MAX_RETRIES", 6))
+PRICE_FETCH_RETRY_DELAY = 5 # Base delay in seconds when no Retry-After header is sent
+PRICE_FETCH_MAX_RETRY_DELAY = 120
+
+# --- Parallel backfill (python -m src.blockchain.backfill) ---
+BACKFILL_RANGE_SIZE = int(os.getenv("BACKFILL_RANGE_SIZE", 5_000_000)) # Blocks per queued task
+BACKFILL_LEASE_SECONDS = int(os.getenv("BACKFILL_LEASE_SECONDS", 900)) # A task is re-leased if its worker is silent this long
+BACKFILL_MAX_ATTEMPTS = 5
+
+# --- Profiling ---
+# Wrap each main() stage in cProfile + tracemalloc, on every PROFILE_EVERY-th run.
+PROFILE_ENABLED = os.getenv("TLP_PROFILE", "false").lower() in ("1", "true", "yes")
+PROFILE_EVERY = max(int(os.getenv("TLP_PROFILE_EVERY", 1)), 1)
+PROFILE_TOP_ALLOCATIONS = 25
+
 # --- ABIs ---
-CURVE_ABI = load_abi("curve_abi.json")
-UNIV3_ABI = load_abi("univ3_abi.json")
+# Pools reference their ABI file; it is parsed (once) on first use via helpers.get_pool_abi
+CURVE_ABI_FILE = "curve_abi.json"
+UNIV3_ABI_FILE = "univ3_abi.json"
+
+def __getattr__(name):
+    # CURVE_ABI / UNIV3_ABI stay importable without reading the files at import time
+    if name == "CURVE_ABI":
+        return load_abi(CURVE_ABI_FILE)
+    if name == "UNIV3_ABI":
+        return load_abi(UNIV3_ABI_FILE)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- File paths ---
 STATE_FILE = 'data/program_state.json'
 HISTORICAL_PRICES_FILE = 'data/token_historical_prices.json'
+PRICE_STORE_DIR = 'data/prices'
+PROFILE_DIR = 'logs/profiles'
+BACKFILL_DIR = 'data/backfill'
+BACKFILL_QUEUE_FILE = 'data/backfill/queue.sqlite'
+BACKFILL_SEGMENTS_DIR = 'data/backfill/segments'
+# Also write HISTORICAL_PRICES_FILE after each price update (full rewrite, for external consumers)
+PRICE_JSON_EXPORT = os.getenv("PRICE_JSON_EXPORT", "false").lower() in ("1", "true", "yes")
+DAILY_BALANCE_STORE_DIR = 'data/balances/daily'
+DAILY_BALANCES_FILE = 'data/balances/daily_balances.json'
+DAILY_BALANCE_SHARDS = int(os.getenv("DAILY_BALANCE_SHARDS", 16)) # Provider shards of a new daily balance store
+# Also write DAILY_BALANCES_FILE after each daily balance update (full rewrite, for external consumers)
+DAILY_BALANCES_JSON_EXPORT = os.getenv("DAILY_BALANCES_JSON_EXPORT", "false").lower() in ("1", "true", "yes")
+REWARDS_DIR = 'data/rewards'
+SNAPSHOT_DIR = 'data/rewards/snapshots'
+SNAPSHOT_BASE_EVERY = int(os.getenv("SNAPSHOT_BASE_EVERY", 7)) # Rewards snapshots per full base; the others are deltas
+SNAPSHOT_KEEP_ALL_DAYS = float(os.getenv("SNAPSHOT_KEEP_ALL_DAYS", 7)) # Every snapshot of this many days is kept, then one per day
+SNAPSHOT_KEEP_DAILY_DAYS = float(os.getenv("SNAPSHOT_KEEP_DAILY_DAYS", 0)) # After this many days one snapshot per week is kept (0: never)
 
 # --- Pool configurations ---
+# Addresses are written checksummed (EIP-55) so importing the config needs no keccak
 POOLS = [
     {
-        "address": to_checksum_address("0x186cf879186986a20aadfb7ead50e3c20cb26cec"),
-        "abi": CURVE_ABI,
+        "address": "0x186cF879186986A20aADFb7eAD50e3C20cb26CeC",
+        "abi_file": CURVE_ABI_FILE,
         "deploy_date": datetime.fromisoformat("2024-06-19"),
         #"deploy_block": 254700000, #test purposes comment this for PRODUCTION
         "deploy_block": 223607824, #set the block number -1
@@ -81,8 +146,8 @@ POOLS = [
         "events": ["AddLiquidity", "RemoveLiquidity", "RemoveLiquidityOne", "RemoveLiquidityImbalance"]
     },
     {
-        "address": to_checksum_address("0xe9e6b9aaafaf6816c3364345f6ef745ccfc8660a"),
-        "abi": UNIV3_ABI,
+        "address": "0xe9e6b9aAAfaf6816C3364345F6eF745CcFC8660a",
+        "abi_file": UNIV3_ABI_FILE,
         "deploy_date": datetime.fromisoformat("2023-05-16"),
         #"deploy_block": 254700000, #test purposes comment this for PRODUCTION
         "deploy_block": 91124443, #set the block number -1
@@ -93,8 +158,8 @@ POOLS = [
         "events": ["Burn", "Mint"]
     },
     {
-        "address": to_checksum_address("0xCb198a55e2a88841E855bE4EAcaad99422416b33"),
-        "abi": UNIV3_ABI,
+        "address": "0xCb198a55e2a88841E855bE4EAcaad99422416b33",
+        "abi_file": UNIV3_ABI_FILE,
         "deploy_date": datetime.fromisoformat("2023-05-16"),
         #"deploy_block": 254700000, #test purposes comment this for PRODUCTION
         "deploy_block": 91123769, #set the block number -1
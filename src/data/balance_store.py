@@ -0,0 +1,751 @@
+import os
+import re
+import json
+import math
+import shutil
+import logging
+import argparse
+from datetime import datetime, timezone
+from src.config import DAILY_BALANCE_STORE_DIR, DAILY_BALANCE_SHARDS, DAILY_BALANCES_FILE, DUST_THRESHOLD_USD, TOKENS
+from src.data.column_store import AppendOnlyColumn
+from src.data.price_table import get_daily_price
+from src.data.state_manager import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# numpy is imported in the functions that use it: importing the store must stay cheap,
+# as the daily balance and rewards modules on the startup path depend on it
+
+DAY_SECONDS = 24 * 60 * 60
+# Token amounts recovered from legacy USD balances that differ by less than this are the same run
+LEGACY_AMOUNT_RTOL = 1e-9
+
+def to_day(date):
+    """Days since the Unix epoch of a datetime or ISO balance_date (UTC unless it has an offset)."""
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp()) // DAY_SECONDS
+
+def day_to_date(day):
+    return datetime.fromtimestamp(day * DAY_SECONDS, timezone.utc)
+
+def day_to_balance_date(day):
+    """ISO balance_date of a day index, as DailyBalanceCalculator writes it."""
+    return day_to_date(day).isoformat()
+
+def daily_token_price(token, date):
+    """Daily TWAP of a configured token symbol (see TOKENS)."""
+    return get_daily_price(TOKENS.get(token), date)
+
+class BalanceRuns:
+    """
+    Runs of unchanged token balances, sorted by provider id and start day.
+
+    Run i means provider `provider[i]` held `tokens[token][i]` of every token
+    (NaN: no balance entry) on each day from `start_day[i]` through
+    `end_day[i]`. A run whose amounts are all zero marks the provider's exit
+    and lasts only for its start day; the provider has no balances after it
+    until its next run. USD values are not stored: a token is worth its
+    amount times the day's price, or 0 below `dust_threshold_usd`, as
+    DailyBalanceCalculator values it.
+    """
+
+    def __init__(self, providers, provider, start_day, end_day, tokens, last_day, price_lookup=None,
+                 dust_threshold_usd=DUST_THRESHOLD_USD):
+        """
+        :param providers: Provider addresses by id.
+        :param last_day: Last day the store has balances for.
+        :param price_lookup: (token symbol, date) -> USD price; defaults to daily_token_price.
+        """
+        self.providers = providers
+        self.provider = provider
+        self.start_day = start_day
+        self.end_day = end_day
+        self.tokens = tokens
+        self.last_day = last_day
+        self.price_lookup = price_lookup
+        self.dust_threshold_usd = dust_threshold_usd
+        self._prices = {}
+
+    def __len__(self):
+        return len(self.provider)
+
+    @property
+    def first_day(self):
+        return int(self.start_day.min()) if len(self) else None
+
+    def provider_addresses(self):
+        """:return: The providers with runs, in id order."""
+        import numpy as np
+        return [self.providers[i] for i in np.unique(self.provider).tolist()]
+
+    def token_prices(self, token):
+        """:return: The token's price on each day from first_day through last_day."""
+        import numpy as np
+        prices = self._prices.get(token)
+        if prices is None:
+            price_lookup = self.price_lookup or daily_token_price
+            prices = self._prices[token] = np.array([
+                price_lookup(token, day_to_date(day)) for day in range(self.first_day, self.last_day + 1)
+            ], dtype=np.float64)
+        return prices
+
+    def weighted_usd(self, day_weights):
+        """
+        :param day_weights: Weight of each day from first_day through last_day.
+        :return: Per run, the sum over its days of its USD balance times the day's weight.
+        """
+        import numpy as np
+        result = np.zeros(len(self))
+        if not len(self):
+            return result
+        starts = self.start_day - self.first_day
+        ends = self.end_day - self.first_day + 1
+        threshold = self.dust_threshold_usd
+        for token, amounts in self.tokens.items():
+            prices = self.token_prices(token)
+            cumulative = np.concatenate(([0.0], np.cumsum(prices * day_weights)))
+            held = amounts > 0
+            # Above the dust threshold on every day: a difference of prefix sums
+            whole = held & (amounts * prices.min() >= threshold)
+            result[whole] += amounts[whole] * (cumulative[ends[whole]] - cumulative[starts[whole]])
+            # Crosses the threshold on some day: value those (rare) runs day by day
+            for run in np.flatnonzero(held & ~whole & (amounts * prices.max() >= threshold)).tolist():
+                usd = amounts[run] * prices[starts[run]:ends[run]]
+                result[run] += np.dot(np.where(usd >= threshold, usd, 0.0), day_weights[starts[run]:ends[run]])
+        return result
+
+    def daily_columns(self):
+        """:return: One row per provider and day, in the format of DailyBalanceStore.read_columns()."""
+        import numpy as np
+        lengths = (self.end_day - self.start_day + 1).astype(np.int64)
+        runs = np.repeat(np.arange(len(self)), lengths)
+        offsets = np.arange(len(runs)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        day = (self.start_day[runs] + offsets).astype(np.int32)
+        total_usd = np.zeros(len(runs))
+        tokens = {}
+        for token, amounts in self.tokens.items():
+            row_amounts = amounts[runs]
+            usd = row_amounts * self.token_prices(token)[day - self.first_day] if len(runs) else np.empty(0)
+            usd = np.where(usd >= self.dust_threshold_usd, usd, 0.0)
+            total_usd += usd
+            usd[np.isnan(row_amounts)] = np.nan
+            tokens[token] = usd
+        return {"provider": self.provider[runs], "day": day, "total_usd": total_usd, "tokens": tokens}
+
+    def to_dict(self):
+        """:return: `{provider: {"runs": [{"start_date", "end_date", "token_balance"}]}}` in provider id order."""
+        result = {}
+        token_rows = [(token, values.tolist()) for token, values in self.tokens.items()]
+        for run, (provider_id, start, end) in enumerate(zip(self.provider.tolist(), self.start_day.tolist(), self.end_day.tolist())):
+            runs = result.setdefault(self.providers[provider_id], {"runs": []})["runs"]
+            runs.append({
+                "start_date": day_to_balance_date(start),
+                "end_date": day_to_balance_date(end),
+                "token_balance": {token: values[run] for token, values in token_rows if values[run] == values[run]},
+            })
+        return result
+
+class _Shard:
+    """The typed columns of one shard directory; the start_day column header is the commit point."""
+
+    def __init__(self, path):
+        self.path = path
+        self.start_day = AppendOnlyColumn(os.path.join(path, 'start_day.i'), 'i')
+        self.provider = AppendOnlyColumn(os.path.join(path, 'provider.i'), 'i')
+        self._tokens = {}
+
+    def token_column(self, token):
+        column = self._tokens.get(token)
+        if column is None:
+            column = self._tokens[token] = AppendOnlyColumn(os.path.join(self.path, f"{token}.amt"), 'd')
+        return column
+
+    def tokens(self):
+        if not os.path.isdir(self.path):
+            return []
+        return [name[:-4] for name in os.listdir(self.path) if name.endswith('.amt')]
+
+    def committed(self, last_day):
+        """:return: Number of runs starting on or before the store's last day; later ones were never committed."""
+        import numpy as np
+        count = self.start_day.count
+        if last_day is None or count == 0:
+            return 0
+        if self.start_day.tail <= last_day:
+            return count
+        starts = np.frombuffer(self.start_day.view(), dtype=np.int32, count=count)
+        return int(np.searchsorted(starts, last_day, 'right'))
+
+    def append(self, rows, tokens, last_day):
+        """
+        Append (start day, provider id, {token: amount}) runs after the
+        committed ones, dropping anything an interrupted append left behind.
+
+        :return: Number of runs appended.
+        """
+        committed = self.committed(last_day)
+        for column in [self.start_day, self.provider] + [self.token_column(token) for token in self.tokens()]:
+            column.truncate(committed)
+        if not rows:
+            return 0
+
+        rows.sort(key=lambda row: (row[0], row[1]))
+        for token in tokens:
+            column = self.token_column(token)
+            if column.count < committed:
+                # Token first seen in this shard: earlier runs had no balance entry for it
+                column.append([math.nan] * (committed - column.count))
+            column.append([float(amounts.get(token, math.nan)) for _, _, amounts in rows])
+        self.provider.append([provider_id for _, provider_id, _ in rows])
+        self.start_day.append([day for day, _, _ in rows])
+        return len(rows)
+
+    def write(self, columns):
+        """Write the runs of read()'s format into this (new, empty) shard directory."""
+        if os.path.isdir(self.path):
+            # Left behind by a rewrite that was never committed
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        for token, values in columns["tokens"].items():
+            self.token_column(token).append(values.tolist())
+        self.provider.append(columns["provider"].tolist())
+        self.start_day.append(columns["start_day"].tolist())
+
+    def read(self, last_day):
+        """:return: Copies of the committed runs, as numpy arrays."""
+        import numpy as np
+        count = self.committed(last_day)
+        columns = {
+            "start_day": np.frombuffer(self.start_day.view(), dtype=np.int32, count=count).copy(),
+            "provider": np.frombuffer(self.provider.view(), dtype=np.int32, count=count).copy(),
+            "tokens": {},
+        }
+        for token in self.tokens():
+            column = self.token_column(token)
+            values = np.full(count, np.nan)
+            stored = min(column.count, count)
+            values[:stored] = np.frombuffer(column.view(), dtype=np.float64, count=stored)
+            columns["tokens"][token] = values
+        return columns
+
+class DailyBalanceStore:
+    """
+    Daily token balances of every provider, stored as runs of unchanged
+    balances (see BalanceRuns) in typed append-only columns.
+
+    Providers get a stable id in first-seen order (`providers.txt`, one per
+    line) and their runs live in shard `id % shards`. Each `shard_NN`
+    directory holds one row per run: `start_day.i` (int32 days since the Unix
+    epoch), `provider.i` (int32 id) and one float64 `<token>.amt` column of
+    token amounts per token, NaN where the provider had no balance entry for
+    that token. `meta.json` records the last day covered; it is rewritten
+    after the shards, so it commits an append. A provider whose balances did
+    not change costs nothing for a new day, and an exited one is not stored
+    after its exit day.
+
+    Rewriting days already stored (replace_days) copies the affected shards
+    into a new generation directory (`shard_NN.G`) that the same meta.json
+    write switches to, so readers see either the old or the new runs.
+    `version` in meta.json counts commits, for caches of the store's contents.
+    """
+
+    def __init__(self, base_dir, shards=DAILY_BALANCE_SHARDS, legacy_json_file=None, price_lookup=None):
+        """:param price_lookup: (token symbol, date) -> USD price; defaults to daily_token_price."""
+        self.base_dir = base_dir
+        self.shards = shards
+        self.legacy_json_file = legacy_json_file
+        self.price_lookup = price_lookup
+        self._meta = None
+        self._providers = []
+        self._provider_ids = {}
+        self._providers_size = 0
+        self._shard_cache = {}
+        self._initialized = False
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        if not os.path.isdir(self.base_dir) and self.legacy_json_file and os.path.exists(self.legacy_json_file):
+            logger.info(f"Migrating daily balances from {self.legacy_json_file} to {self.base_dir}")
+            self.import_json(self.legacy_json_file)
+
+    @property
+    def _meta_file(self):
+        return os.path.join(self.base_dir, 'meta.json')
+
+    @property
+    def _providers_file(self):
+        return os.path.join(self.base_dir, 'providers.txt')
+
+    def _load_meta(self):
+        if self._meta is None:
+            try:
+                with open(self._meta_file) as f:
+                    self._meta = json.load(f)
+            except FileNotFoundError:
+                # The shard count is fixed when the store is created
+                self._meta = {"shards": self.shards, "tokens": [], "last_day": None}
+        return self._meta
+
+    def _shard_path(self, index, generation):
+        name = f"shard_{index:02d}" if generation == 0 else f"shard_{index:02d}.{generation}"
+        return os.path.join(self.base_dir, name)
+
+    def _generation(self, index):
+        return self._load_meta().get("generations", {}).get(str(index), 0)
+
+    def _shard(self, index):
+        generation = self._generation(index)
+        shard = self._shard_cache.get((index, generation))
+        if shard is None:
+            shard = self._shard_cache[(index, generation)] = _Shard(self._shard_path(index, generation))
+        return shard
+
+    def _all_shards(self):
+        return [self._shard(index) for index in range(self._load_meta()["shards"])]
+
+    def _load_providers(self):
+        try:
+            size = os.path.getsize(self._providers_file)
+        except FileNotFoundError:
+            return self._providers
+        if size == self._providers_size:
+            return self._providers
+        with open(self._providers_file, 'r+') as f:
+            content = f.read()
+            # Drop a line left incomplete by an interrupted append
+            complete = content.rfind('\n') + 1
+            if complete < len(content):
+                f.truncate(complete)
+        self._providers = content[:complete].splitlines()
+        self._provider_ids = {provider: index for index, provider in enumerate(self._providers)}
+        self._providers_size = complete
+        return self._providers
+
+    def _add_providers(self, providers):
+        os.makedirs(self.base_dir, exist_ok=True)
+        with open(self._providers_file, 'a') as f:
+            f.write(''.join(f"{provider}\n" for provider in providers))
+            f.flush()
+            os.fsync(f.fileno())
+        self._load_providers()
+
+    def providers(self):
+        """:return: All providers, in id order."""
+        self._ensure_initialized()
+        return list(self._load_providers())
+
+    def tokens(self):
+        self._ensure_initialized()
+        return list(self._load_meta()["tokens"])
+
+    def last_day(self):
+        """:return: The last day index with balances, or None for an empty store."""
+        self._ensure_initialized()
+        return self._load_meta()["last_day"]
+
+    def version(self):
+        """:return: Number of commits to the store; changes whenever its contents do."""
+        self._ensure_initialized()
+        return self._load_meta().get("version", 0)
+
+    def run_count(self):
+        last_day = self.last_day()
+        return sum(shard.committed(last_day) for shard in self._all_shards())
+
+    def read_runs(self, provider=None, start_day=None, end_day=None):
+        """
+        :param provider: Only this provider's runs (reads a single shard).
+        :param start_day: First day index to include; runs are clipped to it.
+        :param end_day: Last day index to include; runs are clipped to it.
+        :return: BalanceRuns
+        """
+        import numpy as np
+        self._ensure_initialized()
+        self._load_providers()
+        meta = self._load_meta()
+        last_day = meta["last_day"]
+        if provider is not None:
+            provider_id = self._provider_ids.get(provider)
+            shards = [] if provider_id is None else [self._shard(provider_id % meta["shards"])]
+        else:
+            shards = self._all_shards()
+
+        parts = [shard.read(last_day) for shard in shards]
+        providers = np.concatenate([part["provider"] for part in parts] or [np.empty(0, np.int32)])
+        starts = np.concatenate([part["start_day"] for part in parts] or [np.empty(0, np.int32)])
+        tokens = {
+            token: np.concatenate([
+                part["tokens"].get(token, np.full(len(part["provider"]), np.nan)) for part in parts
+            ] or [np.empty(0)])
+            for token in meta["tokens"]
+        }
+        order = np.lexsort((starts, providers))
+        if provider is not None:
+            order = order[providers[order] == provider_id]
+        providers = providers[order]
+        starts = starts[order]
+        tokens = {token: values[order] for token, values in tokens.items()}
+
+        # A run lasts until the provider's next one starts; an exit only for its own day
+        ends = np.full(len(starts), last_day if last_day is not None else 0, dtype=np.int32)
+        continued = providers[1:] == providers[:-1]
+        ends[:-1][continued] = starts[1:][continued] - 1
+        exits = np.ones(len(starts), dtype=bool)
+        for values in tokens.values():
+            exits &= ~(values > 0)
+        ends[exits] = starts[exits]
+
+        if end_day is not None:
+            last_day = min(last_day, end_day) if last_day is not None else None
+            ends = np.minimum(ends, end_day)
+        if start_day is not None:
+            starts = np.maximum(starts, start_day)
+        selected = starts <= ends
+        return BalanceRuns(
+            self._providers, providers[selected], starts[selected], ends[selected],
+            {token: values[selected] for token, values in tokens.items()}, last_day, self.price_lookup
+        )
+
+    def _open_runs(self):
+        """:return: {provider: {token: amount}} of every provider's last run, unless it exited."""
+        import numpy as np
+        runs = self.read_runs()
+        if not len(runs):
+            return {}
+        last = np.flatnonzero(np.append(runs.provider[1:] != runs.provider[:-1], True))
+        token_rows = [(token, values[last].tolist()) for token, values in runs.tokens.items()]
+        open_runs = {}
+        for row, provider_id in enumerate(runs.provider[last].tolist()):
+            amounts = {token: values[row] for token, values in token_rows if values[row] == values[row]}
+            if any(amount > 0 for amount in amounts.values()):
+                open_runs[runs.providers[provider_id]] = amounts
+        return open_runs
+
+    def _rows_by_shard(self, runs, tokens):
+        """
+        Give new providers an id and group (start day, provider, {token: amount})
+        runs by shard, adding their new tokens to `tokens`.
+
+        :return: {shard index: [(start day, provider id, {token: amount})]}
+        """
+        meta = self._load_meta()
+        self._load_providers()
+        new_providers = list(dict.fromkeys(provider for _, provider, _ in runs if provider not in self._provider_ids))
+        if new_providers:
+            self._add_providers(new_providers)
+
+        rows_by_shard = {}
+        for day, provider, amounts in runs:
+            for token in amounts:
+                if token not in tokens:
+                    if not re.fullmatch(r'[A-Za-z0-9_-]+', token):
+                        raise ValueError(f"Invalid token symbol: {token}")
+                    tokens.append(token)
+            provider_id = self._provider_ids[provider]
+            rows_by_shard.setdefault(provider_id % meta["shards"], []).append((day, provider_id, amounts))
+        return rows_by_shard
+
+    def _commit(self, meta, tokens, last_day):
+        meta["tokens"] = tokens
+        meta["last_day"] = last_day
+        meta["version"] = meta.get("version", 0) + 1
+        write_json_atomic(self._meta_file, meta, indent=2)
+
+    def _append(self, runs, last_day):
+        """Append (start day, provider, {token: amount}) runs and commit the days through last_day."""
+        meta = self._load_meta()
+        tokens = list(meta["tokens"])
+        rows_by_shard = self._rows_by_shard(runs, tokens)
+
+        appended = 0
+        for index, rows in rows_by_shard.items():
+            shard = self._shard(index)
+            appended += shard.append(rows, sorted(set(tokens) | set(shard.tokens())), meta["last_day"])
+        self._commit(meta, tokens, last_day)
+        return appended
+
+    def append_days(self, start_day, end_day, balances):
+        """
+        Record each provider's token balances for the days start_day through
+        end_day. A provider whose balances equal its open run only extends it,
+        one whose balances are all zero gets an exit run if it had an open
+        one, and providers missing from `balances` keep their open run.
+
+        :param balances: {provider: {token: amount}}
+        :return: Number of runs appended.
+        """
+        self._ensure_initialized()
+        last_day = self.last_day()
+        if last_day is not None and end_day <= last_day:
+            logger.warning(f"Skipping daily balances through day {end_day}: the store already has day {last_day}")
+            return 0
+        if last_day is not None and start_day <= last_day:
+            logger.warning(f"Daily balances from day {start_day} overlap the store; appending from day {last_day + 1}")
+            start_day = last_day + 1
+
+        open_runs = self._open_runs()
+        runs = []
+        for provider, amounts in balances.items():
+            _balance_runs(runs, provider, [(start_day, amounts)], open_runs.get(provider))
+        appended = self._append(runs, end_day)
+        logger.info(f"Appended {appended} balance runs for days {start_day}-{end_day} of {len(balances)} providers to {self.base_dir}")
+        return appended
+
+    def replace_days(self, balances, end_day):
+        """
+        Replace providers' balances from a given day on and commit the days
+        through end_day. The runs of each provider in `balances` that start on
+        or after its first listed day are dropped and rebuilt from the listed
+        balances, as append_days would have stored them day by day; every
+        other provider keeps its runs. Only the shards of providers whose runs
+        actually change are rewritten, and when no stored day is touched this
+        is a plain append.
+
+        :param balances: {provider: [(day, {token: amount}), ...]} in day
+            order; each balance holds from its day until the next listed one.
+        :param end_day: Last day to commit, at least the store's last day.
+        :return: Number of runs written for the listed providers.
+        """
+        import numpy as np
+        self._ensure_initialized()
+        meta = self._load_meta()
+        last_day = meta["last_day"]
+        if last_day is not None and end_day < last_day:
+            raise ValueError(f"Cannot commit day {end_day} before the store's last day {last_day}")
+
+        stored = self.read_runs()
+        token_rows = [(token, values.tolist()) for token, values in stored.tokens.items()]
+        replaced_from = {}
+        runs = []
+        for provider, days in balances.items():
+            days = [(day, amounts) for day, amounts in days if day <= end_day]
+            if not days:
+                continue
+            from_day = days[0][0]
+            current = None
+            previous = []
+            provider_id = self._provider_ids.get(provider)
+            if provider_id is not None:
+                first, last = np.searchsorted(stored.provider, [provider_id, provider_id + 1]).tolist()
+                for run in range(first, last):
+                    amounts = {token: values[run] for token, values in token_rows if values[run] == values[run]}
+                    start = int(stored.start_day[run])
+                    if start < from_day:
+                        # The last run before from_day stays open unless it is an exit
+                        current = amounts if any(amount > 0 for amount in amounts.values()) else None
+                    else:
+                        previous.append((start, provider, amounts))
+            new_runs = []
+            _balance_runs(new_runs, provider, days, current)
+            if new_runs == previous:
+                continue
+            if previous or (last_day is not None and new_runs[0][0] <= last_day):
+                # Runs between stored ones keep each shard sorted by start day only if it is rewritten
+                replaced_from[provider] = from_day
+            runs.extend(new_runs)
+
+        tokens = list(meta["tokens"])
+        rows_by_shard = self._rows_by_shard(runs, tokens)
+        replaced = {self._provider_ids[provider]: from_day for provider, from_day in replaced_from.items()}
+        if not replaced:
+            written = 0
+            for index, rows in rows_by_shard.items():
+                shard = self._shard(index)
+                written += shard.append(rows, sorted(set(tokens) | set(shard.tokens())), last_day)
+            self._commit(meta, tokens, end_day)
+            logger.info(f"Appended {written} balance runs of {len(balances)} providers through day {end_day} to {self.base_dir}")
+            return written
+
+        shards = meta["shards"]
+        rewritten = {index for index in (provider_id % shards for provider_id in replaced)}
+        old_paths = []
+        generations = dict(meta.get("generations", {}))
+        written = 0
+        for index, rows in rows_by_shard.items():
+            if index not in rewritten:
+                shard = self._shard(index)
+                written += shard.append(rows, sorted(set(tokens) | set(shard.tokens())), last_day)
+        for index in sorted(rewritten):
+            shard = self._shard(index)
+            columns = shard.read(last_day)
+            # Drop the replaced providers' runs from their first rebuilt day on
+            from_days = np.array([replaced.get(provider_id, end_day + 1) for provider_id in columns["provider"].tolist()], dtype=np.int64)
+            keep = columns["start_day"] < from_days
+            rows = rows_by_shard.get(index, [])
+            start_day = np.concatenate([columns["start_day"][keep], np.array([day for day, _, _ in rows], dtype=np.int32)])
+            provider = np.concatenate([columns["provider"][keep], np.array([provider_id for _, provider_id, _ in rows], dtype=np.int32)])
+            order = np.lexsort((provider, start_day))
+            shard_tokens = sorted(set(tokens) | set(columns["tokens"]))
+            token_columns = {}
+            for token in shard_tokens:
+                kept = columns["tokens"].get(token, np.full(len(keep), np.nan))[keep]
+                added = np.array([float(amounts.get(token, math.nan)) for _, _, amounts in rows])
+                token_columns[token] = np.concatenate([kept, added])[order]
+
+            generation = generations.get(str(index), 0) + 1
+            _Shard(self._shard_path(index, generation)).write({
+                "start_day": start_day[order], "provider": provider[order], "tokens": token_columns,
+            })
+            generations[str(index)] = generation
+            old_paths.append(shard.path)
+            self._shard_cache.pop((index, generation - 1), None)
+            written += len(rows)
+
+        meta["generations"] = generations
+        self._commit(meta, tokens, end_day)
+        for path in old_paths:
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Rewrote {len(replaced)} providers' balances in {len(rewritten)} shards and wrote {written} balance runs "
+                    f"through day {end_day} to {self.base_dir}")
+        return written
+
+    def import_daily_balances(self, daily_balances):
+        """
+        Import balances in the per-day `{provider: {"balances": [...]}}`
+        format of daily_balances.json. Token amounts are recovered by dividing
+        each USD balance by the day's price (a balance valued below the dust
+        threshold becomes 0), and consecutive days with the same amounts are
+        merged into one run. Days at or before the store's last day are skipped.
+
+        :return: Number of runs appended.
+        """
+        self._ensure_initialized()
+        last_day = self.last_day()
+        price_lookup = self.price_lookup or daily_token_price
+        prices = {}
+        open_runs = self._open_runs()
+        runs = []
+        end_day = last_day
+        skipped = 0
+        for provider, data in daily_balances.items():
+            current = open_runs.get(provider)
+            for balance in data['balances']:
+                day = to_day(balance['balance_date'])
+                if last_day is not None and day <= last_day:
+                    skipped += 1
+                    continue
+                end_day = day if end_day is None else max(end_day, day)
+                amounts = {}
+                for token, usd in balance.get('token_usd_balance', {}).items():
+                    price = prices.get((token, day))
+                    if price is None:
+                        price = prices[(token, day)] = price_lookup(token, day_to_date(day))
+                    amounts[token] = float(usd) / price if price else 0.0
+                if any(amount > 0 for amount in amounts.values()):
+                    if not _same_amounts(amounts, current):
+                        runs.append((day, provider, amounts))
+                        current = amounts
+                elif current is not None:
+                    runs.append((day, provider, amounts))
+                    current = None
+        if skipped:
+            logger.warning(f"Skipped {skipped} daily balance(s) at or before the last stored day of {self.base_dir}")
+        if end_day == last_day:
+            return 0
+        return self._append(runs, end_day)
+
+    def read_columns(self, provider=None, start_day=None, end_day=None):
+        """
+        Read balances as one row per provider and day, sorted by provider id
+        and day, with USD values from the daily price table. An exited
+        provider has a single zero row on its exit day.
+
+        :param provider: Only this provider's rows (reads a single shard).
+        :param start_day: First day index to include.
+        :param end_day: Last day index to include.
+        :return: {"provider": int32 ids, "day": int32 day indexes, "total_usd": float64,
+            "tokens": {token: float64 USD, NaN where absent}}
+        """
+        return self.read_runs(provider, start_day, end_day).daily_columns()
+
+    def to_dict(self, provider=None, start_day=None, end_day=None):
+        """:return: Balances in the `{provider: {"balances": [...]}}` format of daily_balances.json."""
+        import numpy as np
+        columns = self.read_columns(provider, start_day, end_day)
+        providers = self._providers
+        tokens = list(columns["tokens"].items())
+        dates = {day: day_to_balance_date(day) for day in np.unique(columns["day"]).tolist()}
+        token_rows = [values.tolist() for _, values in tokens]
+        token_names = [token for token, _ in tokens]
+
+        result = {}
+        provider_ids = columns["provider"].tolist()
+        for row, (provider_id, day, total) in enumerate(zip(provider_ids, columns["day"].tolist(), columns["total_usd"].tolist())):
+            balances = result.get(providers[provider_id])
+            if balances is None:
+                balances = result[providers[provider_id]] = {"balances": []}
+            token_usd_balance = {}
+            for token, values in zip(token_names, token_rows):
+                value = values[row]
+                if value == value:  # NaN: no entry for the token
+                    token_usd_balance[token] = value
+            balances["balances"].append({
+                "balance_date": dates[day],
+                "token_usd_balance": token_usd_balance,
+                "total_usd_balance": total,
+            })
+        return result
+
+    def provider_balances(self, provider, start_day=None, end_day=None):
+        """:return: One provider's `{"balances": [...]}`, or None if it has none."""
+        return self.to_dict(provider, start_day, end_day).get(provider)
+
+    def import_json(self, path):
+        """Import the balances of a daily_balances.json style file."""
+        with open(path, 'r') as f:
+            daily_balances = json.load(f)
+        added = self.import_daily_balances(daily_balances)
+        logger.info(f"Imported {added} balance runs from {path}")
+
+    def export_json(self, path, start_day=None, end_day=None):
+        """Write the store as a daily_balances.json style file."""
+        daily_balances = self.to_dict(start_day=start_day, end_day=end_day)
+        write_json_atomic(path, daily_balances, indent=2)
+        logger.info(f"Exported daily balances of {len(daily_balances)} providers to {path}")
+
+def _balance_runs(runs, provider, days, current):
+    """
+    Append to `runs` the (start day, provider, {token: amount}) runs that
+    store `days` ([(day, {token: amount})]) after a provider's open run
+    `current` (None if it has none): a run starts whenever the amounts change
+    and an all-zero day after an open run is an exit.
+    """
+    for day, amounts in days:
+        amounts = {token: float(amount) for token, amount in amounts.items()}
+        if any(amount > 0 for amount in amounts.values()):
+            if amounts != current:
+                runs.append((day, provider, amounts))
+                current = amounts
+        elif current is not None:
+            runs.append((day, provider, amounts))
+            current = None
+
+def _same_amounts(amounts, current):
+    if current is None or amounts.keys() != current.keys():
+        return False
+    return all(math.isclose(amount, current[token], rel_tol=LEGACY_AMOUNT_RTOL) for token, amount in amounts.items())
+
+daily_balance_store = DailyBalanceStore(DAILY_BALANCE_STORE_DIR, legacy_json_file=DAILY_BALANCES_FILE)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Import or export the daily balance store")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", default=DAILY_BALANCES_FILE, help="daily_balances.json style file")
+    parser.add_argument("--start-date", help="export: first balance date (ISO format)")
+    parser.add_argument("--end-date", help="export: last balance date (ISO format)")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start_day = to_day(args.start_date) if args.start_date else None
+        end_day = to_day(args.end_date) if args.end_date else None
+        daily_balance_store.export_json(args.path, start_day, end_day)
+    else:
+        daily_balance_store.import_json(args.path)
@@ -0,0 +1,151 @@
+import os
+import mmap
+import struct
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+COLUMN_MAGIC = b'TLPCOL01'
+# magic, typecode, padding, row count, tail value (last appended value, raw 8 bytes)
+HEADER_FORMAT = '<8sc7xq8s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+SUPPORTED_TYPECODES = ('q', 'd', 'i')
+
+class AppendOnlyColumn:
+    """
+    A single typed numeric column stored as a flat little-endian array after a
+    fixed-size header.
+
+    The header holds the committed row count and the last appended value, so
+    both are available in O(1) without reading the data. Appends write the new
+    values after the committed rows and only then rewrite the header; rows
+    past the committed count (e.g. from an interrupted append) are ignored.
+    """
+
+    def __init__(self, path, typecode):
+        if typecode not in SUPPORTED_TYPECODES:
+            raise ValueError(f"Unsupported column typecode: {typecode}")
+        self.path = path
+        self.typecode = typecode
+        self.itemsize = array(typecode).itemsize
+        self._mmap = None
+        self._base_view = None
+        self._view = None
+        self._view_count = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _read_header(self):
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read(HEADER_SIZE)
+        except FileNotFoundError:
+            return 0, None
+        if len(raw) < HEADER_SIZE:
+            return 0, None
+        magic, typecode, count, tail = struct.unpack(HEADER_FORMAT, raw)
+        if magic != COLUMN_MAGIC or typecode.decode() != self.typecode:
+            raise ValueError(f"Invalid column file header: {self.path}")
+        if count == 0:
+            return 0, None
+        return count, struct.unpack('<' + self.typecode, tail[:self.itemsize])[0]
+
+    def _write_header(self, f, count, tail):
+        packed_tail = struct.pack('<' + self.typecode, tail).ljust(8, b'\0') if tail is not None else b'\0' * 8
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, COLUMN_MAGIC, self.typecode.encode(), count, packed_tail))
+
+    @property
+    def count(self):
+        return self._read_header()[0]
+
+    @property
+    def tail(self):
+        """Last committed value, or None for an empty column."""
+        return self._read_header()[1]
+
+    def append(self, values):
+        """
+        Append values and commit them by updating the header.
+
+        :param values: Iterable of numbers matching the column type.
+        :return: New committed row count.
+        """
+        values = values if isinstance(values, array) and values.typecode == self.typecode else array(self.typecode, values)
+        count, tail = self._read_header()
+        if not values:
+            return count
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        mode = 'r+b' if self.exists() else 'w+b'
+        with open(self.path, mode) as f:
+            if mode == 'w+b':
+                self._write_header(f, 0, None)
+            f.seek(HEADER_SIZE + count * self.itemsize)
+            f.write(values.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            self._write_header(f, count + len(values), values[-1])
+            f.flush()
+            os.fsync(f.fileno())
+        self._release()
+        return count + len(values)
+
+    def truncate(self, count):
+        """Drop committed rows past `count` (used to rewrite a mutable tail)."""
+        current_count, _ = self._read_header()
+        if count >= current_count:
+            return
+        tail = None
+        if count > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(HEADER_SIZE + (count - 1) * self.itemsize)
+                tail = struct.unpack('<' + self.typecode, f.read(self.itemsize))[0]
+        with open(self.path, 'r+b') as f:
+            self._write_header(f, count, tail)
+            f.flush()
+            os.fsync(f.fileno())
+        self._release()
+
+    def view(self):
+        """
+        Memory-mapped read-only view over the committed rows.
+        The view stays valid until the next append/truncate on this object.
+        """
+        count, _ = self._read_header()
+        if self._view is not None and self._view_count == count:
+            return self._view
+        self._release()
+        if count == 0:
+            self._view = memoryview(array(self.typecode))
+        else:
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), HEADER_SIZE + count * self.itemsize, access=mmap.ACCESS_READ)
+            self._base_view = memoryview(self._mmap)
+            self._view = self._base_view[HEADER_SIZE:].cast(self.typecode)
+        self._view_count = count
+        return self._view
+
+    def read(self):
+        """Copy the committed rows into an in-memory array."""
+        return array(self.typecode, self.view())
+
+    def _release(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._base_view is not None:
+            self._base_view.release()
+            self._base_view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a slice of the old view; let GC close it
+                pass
+            self._mmap = None
+        self._view_count = None
@@ -1,5 +1,6 @@
 import logging
 from src.utils.helpers import normalize_address, format_decimal
+from src.data.balance_store import BalanceRuns
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,9 @@ def format_provider_liquidity(provider_liquidity):
     for provider, events in provider_liquidity.items():
         formatted_events = []
         for event in events:
+            # BalanceCalculator keeps entries as compact BalanceEntry records
+            if hasattr(event, 'to_dict'):
+                event = event.to_dict()
             formatted_event = {
                 "event": event.get('event', ''),
                 "action": event.get('action', ''),
@@ -56,6 +60,8 @@ def format_provider_liquidity(provider_liquidity):
     return formatted_provider_liquidity
 
 def format_daily_balances(daily_balances):
+    if isinstance(daily_balances, BalanceRuns):
+        return format_balance_runs(daily_balances)
     formatted_daily_balances = {}
     for provider, balances in daily_balances.items():
         formatted_balances = []
@@ -69,6 +75,17 @@ def format_daily_balances(daily_balances):
         formatted_daily_balances[provider] = formatted_balances
     return formatted_daily_balances
 
+def format_balance_runs(runs):
+    """Runs of unchanged token amounts; their daily USD values follow from the daily price table."""
+    formatted_runs = {}
+    for provider, data in runs.to_dict().items():
+        formatted_runs[provider] = [{
+            "start_date": run['start_date'],
+            "end_date": run['end_date'],
+            "token_balance": {k: format_decimal(v) for k, v in run['token_balance'].items()}
+        } for run in data['runs']]
+    return formatted_runs
+
 def format_rewards(rewards):
     formatted_rewards = []
     for reward in rewards:
@@ -81,4 +98,20 @@ def format_rewards(rewards):
             "estimated_reward_in_t_tokens": format_decimal(reward['estimated_reward_in_t_tokens'])
         }
         formatted_rewards.append(formatted_reward)
-    return formatted_rewards
\ No newline at end of file
+    return formatted_rewards
+
+def format_provider_standing(provider, as_of, standing):
+    """Format provider_standing() like the rewards snapshot formats rewards and balances."""
+    balance = standing['balance']
+    reward = standing['reward']
+    return {
+        "provider": normalize_address(provider),
+        "as_of": as_of.isoformat(),
+        "balance": {
+            "balance_date": balance['balance_date'],
+            "token_usd_balance": {k: format_decimal(v) for k, v in balance['token_usd_balance'].items()},
+            "total_usd_balance": format_decimal(balance['total_usd_balance'])
+        } if balance else None,
+        "share": format_decimal(standing['share']),
+        "reward": format_rewards([reward])[0] if reward else None
+    }
@@ -1,21 +1,44 @@
 import os
-import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+from src.config import REWARDS_DIR
 from src.data.json_formatter import format_rewards_data
+from src.data.snapshot_store import snapshot_store, snapshot_name
+from src.data.state_manager import write_json_atomic
 
 logger = logging.getLogger(__name__)
 
-def save_json_data(data):
+def save_json_data(data, store=None):
+    """
+    Record a rewards snapshot in the snapshot history and write it as the
+    latest full rewards_<YYYYmmdd_HHMMSS>.json file. The previous one is
+    removed by remove_previous_rewards_file() once the state points at the
+    new file (older snapshots are reconstructed by snapshot_store).
+
+    :return: The path of the rewards file, relative to the working directory.
+    """
+    store = store if store is not None else snapshot_store
     formatted_rewards = format_rewards_data(data)
-    rewards_dir = os.path.join(os.getcwd(), 'data', 'rewards')
-    os.makedirs(rewards_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    rewards_file = os.path.join('data', 'rewards', f'rewards_{timestamp}.json')
+    # UTC, so names don't repeat or go back when local time falls back from DST
+    name = snapshot_name(datetime.now(timezone.utc))
+    store.save(name, formatted_rewards)
+
+    rewards_file = os.path.join(REWARDS_DIR, f'{name}.json')
     full_path = os.path.join(os.getcwd(), rewards_file)
-    
-    with open(full_path, 'w') as f:
-        json.dump(formatted_rewards, f, indent=2)
-    
+    write_json_atomic(full_path, formatted_rewards)
+
     logger.info(f"Data saved to {full_path}")
-    return rewards_file
\ No newline at end of file
+    return rewards_file
+
+def remove_previous_rewards_file(previous_file, rewards_file, store=None):
+    """
+    Delete the rewards file the state pointed at before `rewards_file`, if
+    its snapshot is in the snapshot history. Call only after the state has
+    been saved with the new file, so the API never serves a deleted one.
+    """
+    store = store if store is not None else snapshot_store
+    if not previous_file or previous_file == rewards_file or not os.path.exists(previous_file):
+        return
+    if os.path.basename(previous_file)[:-len('.json')] in store.names():
+        os.remove(previous_file)
+        logger.info(f"Removed {previous_file}; its snapshot is in {store.base_dir}")
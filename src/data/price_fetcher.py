@@ -1,106 +1,214 @@
-import aiohttp
 import logging
 import asyncio
+import random
 from datetime import datetime, timedelta, timezone
-from src.config import COINGECKO_API_KEY, TOKENS, HISTORICAL_PRICES_FILE, START_TIMESTAMP
-from src.utils.helpers import load_price_data, save_price_data
+from email.utils import parsedate_to_datetime
+from src.config import (
+    COINGECKO_API_KEY, TOKENS, HISTORICAL_PRICES_FILE, START_TIMESTAMP,
+    PRICE_GRANULARITY, PRICE_FETCH_CONCURRENCY, PRICE_FETCH_MAX_RETRIES,
+    PRICE_FETCH_RETRY_DELAY, PRICE_FETCH_MAX_RETRY_DELAY, PRICE_JSON_EXPORT
+)
+from src.data.price_store import price_store
+from src.data.price_table import daily_price_table
+from src.data.state_manager import load_state, update_state
 
 logger = logging.getLogger(__name__)
 
-async def coingecko_fetch(token_id, start_timestamp, end_timestamp):
-    # Use only the Public API, but include demo key if available
-    endpoint_public = f"https://api.coingecko.com/api/v3/coins/{token_id}/market_chart/range"
+COINGECKO_RANGE_ENDPOINT = "https://api.coingecko.com/api/v3/coins/{token_id}/market_chart/range"
+
+DAY_SECONDS = 24 * 60 * 60
+
+# CoinGecko derives the granularity of market_chart/range from the length of the
+# requested range: up to 1 day -> 5 minutely, 2-90 days -> hourly, above 90 days -> daily.
+# (window length, minimum requested span) in seconds for each target granularity.
+GRANULARITY_WINDOWS = {
+    "hourly": (89 * DAY_SECONDS, 2 * DAY_SECONDS),
+    "daily": (180 * DAY_SECONDS, 91 * DAY_SECONDS),
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def build_fetch_windows(start_timestamp, end_timestamp, granularity=PRICE_GRANULARITY):
+    """
+    Split a time range into request windows that force CoinGecko to return the
+    target granularity.
+
+    Windows shorter than the minimum span for the granularity are widened
+    backwards; the extra points are dropped after the fetch.
+
+    :param start_timestamp: Inclusive range start in seconds.
+    :param end_timestamp: Inclusive range end in seconds.
+    :param granularity: "daily" or "hourly".
+    :return: List of (window_start, window_end, request_start) tuples in seconds.
+    """
+    window_length, min_span = GRANULARITY_WINDOWS[granularity]
+    windows = []
+    window_start = start_timestamp
+    while window_start <= end_timestamp:
+        window_end = min(window_start + window_length - 1, end_timestamp)
+        request_start = min(window_start, window_end - min_span)
+        windows.append((window_start, window_end, request_start))
+        window_start = window_end + 1
+    return windows
+
+def get_retry_delay(headers, attempt):
+    """
+    Compute how long to wait before retrying a request.
+
+    Honours the Retry-After header (delta seconds or HTTP date) and otherwise
+    falls back to exponential backoff with jitter.
+
+    :param headers: Response headers, or None if the request raised.
+    :param attempt: Zero-based attempt number.
+    :return: Delay in seconds.
+    """
+    retry_after = headers.get("Retry-After") if headers else None
+    if retry_after:
+        try:
+            return min(float(retry_after), PRICE_FETCH_MAX_RETRY_DELAY)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                return min(max(delay, 0), PRICE_FETCH_MAX_RETRY_DELAY)
+            except (TypeError, ValueError):
+                logger.debug(f"Unparseable Retry-After header: {retry_after}")
+    delay = min(PRICE_FETCH_RETRY_DELAY * 2 ** attempt, PRICE_FETCH_MAX_RETRY_DELAY)
+    return delay + random.uniform(0, delay / 4)
+
+async def coingecko_fetch(token_id, start_timestamp, end_timestamp, session=None, semaphore=None):
+    """
+    Fetch raw [timestamp_ms, price] points for a single request window.
+    Retries 429 and 5xx responses as well as connection errors.
+
+    :return: List of price points, or None if every attempt failed.
+    """
+    import aiohttp
+
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await coingecko_fetch(token_id, start_timestamp, end_timestamp, own_session, semaphore)
+
+    endpoint_public = COINGECKO_RANGE_ENDPOINT.format(token_id=token_id)
     params_public = {
-            "vs_currency": "usd",
-            "from": start_timestamp,
-            "to": end_timestamp,
-        # Remove interval, let CoinGecko decide based on range
-        # "interval": "daily", 
+        "vs_currency": "usd",
+        "from": start_timestamp,
+        "to": end_timestamp,
     }
-    
+
     # Add the demo API key to parameters if it's set
     if COINGECKO_API_KEY:
         params_public["x_cg_demo_api_key"] = COINGECKO_API_KEY
-        logger.debug("Using CoinGecko Demo API Key")
-    else:
-        logger.debug("No CoinGecko API Key found, using anonymous public access")
-
-    try:
-        async with aiohttp.ClientSession() as session:
-            logger.debug(f"Attempting Public API fetch for {token_id}")
-            async with session.get(endpoint_public, params=params_public) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Successfully fetched data for {token_id} from Public API")
-                    return data.get("prices") # Use .get for safety
-                elif response.status == 429: # Handle rate limiting specifically
-                    logger.warning(f"Rate limited fetching data for {token_id} from Public API: {response.status}. Retrying may be necessary.")
-                    # Consider adding retry logic here if needed
-                else:
-                    logger.warning(f"Error fetching data for {token_id} from Public API: {response.status}")
-                    logger.warning(f"Response: {await response.text()}")
-    except Exception as e:
-        logger.warning(f"Exception occurred while fetching data for {token_id} from Public API: {str(e)}")
-    
-    logger.error(f"Failed to fetch data for {token_id} after all attempts")
+
+    semaphore = semaphore or asyncio.Semaphore(1)
+    for attempt in range(PRICE_FETCH_MAX_RETRIES):
+        headers = None
+        try:
+            async with semaphore:
+                async with session.get(endpoint_public, params=params_public) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        return data.get("prices") or []
+                    headers = response.headers
+                    if response.status not in RETRYABLE_STATUSES:
+                        logger.warning(f"Error fetching data for {token_id} from Public API: {response.status}")
+                        logger.warning(f"Response: {await response.text()}")
+                        return None
+                    logger.warning(f"Retryable status {response.status} fetching {token_id} ({start_timestamp}-{end_timestamp}). Attempt {attempt + 1}/{PRICE_FETCH_MAX_RETRIES}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Exception occurred while fetching data for {token_id} from Public API: {str(e)}. Attempt {attempt + 1}/{PRICE_FETCH_MAX_RETRIES}")
+
+        if attempt < PRICE_FETCH_MAX_RETRIES - 1:
+            delay = get_retry_delay(headers, attempt)
+            logger.info(f"Retrying {token_id} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    logger.error(f"Failed to fetch data for {token_id} after {PRICE_FETCH_MAX_RETRIES} attempts")
     return None
 
+async def fetch_token_history(session, semaphore, token_id, start_timestamp, end_timestamp):
+    """
+    Fetch a token's price history window by window.
+
+    :return: Tuple (prices, completed_until) where prices are the points of the
+             contiguous prefix of windows that succeeded, and completed_until is
+             the end of that prefix in seconds (None if the first window failed).
+    """
+    windows = build_fetch_windows(start_timestamp, end_timestamp)
+    logger.info(f"Fetching {token_id} in {len(windows)} {PRICE_GRANULARITY} window(s)")
+    results = await asyncio.gather(*[
+        coingecko_fetch(token_id, request_start, window_end, session, semaphore)
+        for _, window_end, request_start in windows
+    ])
+
+    prices = []
+    completed_until = None
+    for (window_start, window_end, _), result in zip(windows, results):
+        if result is None:
+            logger.warning(f"Window {window_start}-{window_end} for {token_id} failed. Later windows will be refetched on the next run.")
+            break
+        prices.extend(p for p in result if window_start * 1000 <= p[0] < (window_end + 1) * 1000)
+        completed_until = window_end
+    return prices, completed_until
+
 async def update_price_data():
-    historical_data = load_price_data(HISTORICAL_PRICES_FILE)
+    fetch_cursors = load_state().get('price_fetch_cursors') or {}
     end_timestamp = int(datetime.now(timezone.utc).timestamp())
 
-    tasks = []
-    token_start_times = {}
-
+    token_ranges = {}
     for token_name, token_id in TOKENS.items():
-        if token_id in historical_data and historical_data[token_id]:
-            # Token data exists, find the last timestamp and start from the next second
-            last_timestamp = max(int(data[0]/1000) for data in historical_data[token_id])
-            start_timestamp = last_timestamp + 1
-            logger.info(f"Found existing data for {token_name}. Fetching from {datetime.fromtimestamp(start_timestamp, tz=timezone.utc)}")
+        last_timestamp_ms = price_store.last_timestamp(token_id)
+        if last_timestamp_ms is not None:
+            # Token data exists, start from the second after the stored tail
+            start_timestamp = last_timestamp_ms // 1000 + 1
         else:
-            # No data for this token, start from the program's START_DATE
             start_timestamp = START_TIMESTAMP
-            logger.info(f"No existing data for {token_name}. Fetching from program START_DATE: {datetime.fromtimestamp(start_timestamp, tz=timezone.utc)}")
+
+        # Resume after windows that completed (possibly without data) on a previous run
+        if token_id in fetch_cursors:
+            start_timestamp = max(start_timestamp, fetch_cursors[token_id] + 1)
 
         # Ensure start_timestamp doesn't exceed end_timestamp (e.g., if START_DATE is in the future)
         start_timestamp = min(start_timestamp, end_timestamp)
 
         if start_timestamp < end_timestamp:
-            logger.info(f"Preparing price fetch task for {token_name} ({token_id}) from {datetime.fromtimestamp(start_timestamp, tz=timezone.utc)} to {datetime.fromtimestamp(end_timestamp, tz=timezone.utc)}")
-            tasks.append(coingecko_fetch(token_id, start_timestamp, end_timestamp))
-            token_start_times[token_id] = start_timestamp
+            logger.info(f"Preparing price fetch for {token_name} ({token_id}) from {datetime.fromtimestamp(start_timestamp, tz=timezone.utc)} to {datetime.fromtimestamp(end_timestamp, tz=timezone.utc)}")
+            token_ranges[token_id] = (start_timestamp, end_timestamp)
         else:
             logger.info(f"Price data for {token_name} ({token_id}) is already up to date (start_timestamp >= end_timestamp).")
 
-    if not tasks:
+    if not token_ranges:
         logger.info("No price updates needed for any tokens.")
         return
 
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    for token_id, result in zip(token_start_times.keys(), results):
-        token_name = next((name for name, tid in TOKENS.items() if tid == token_id), "Unknown")
-        if isinstance(result, Exception):
-            logger.error(f"An error occurred while fetching prices for {token_name} ({token_id}): {str(result)}")
-        elif result:
-            if token_id not in historical_data:
-                historical_data[token_id] = []
-            
-            # Add new prices and remove duplicates based on timestamp
-            existing_timestamps = {data[0] for data in historical_data[token_id]}
-            new_prices_added = 0
-            for price_entry in result:
-                if price_entry[0] not in existing_timestamps:
-                    historical_data[token_id].append(price_entry)
-                    existing_timestamps.add(price_entry[0])
-                    new_prices_added += 1
-            
-            # Sort by timestamp after adding new entries
-            historical_data[token_id].sort(key=lambda x: x[0])
-            
-            logger.info(f"Added {new_prices_added} new price entries for {token_name} ({token_id}). Total entries: {len(historical_data[token_id])}")
-        else:
-            logger.info(f"No new price data returned for {token_name} ({token_id}) from fetch operation.")
+    import aiohttp
+
+    semaphore = asyncio.Semaphore(PRICE_FETCH_CONCURRENCY)
+    async with aiohttp.ClientSession() as session:
+        async def fetch(token_id):
+            try:
+                return token_id, await fetch_token_history(session, semaphore, token_id, *token_ranges[token_id])
+            except Exception as e:
+                return token_id, e
+
+        # Persist each token as soon as it completes so an interrupted backfill resumes from there
+        for next_completed in asyncio.as_completed([fetch(token_id) for token_id in token_ranges]):
+            token_id, result = await next_completed
+            token_name = next((name for name, tid in TOKENS.items() if tid == token_id), "Unknown")
+            if isinstance(result, Exception):
+                logger.error(f"An error occurred while fetching prices for {token_name} ({token_id}): {str(result)}")
+                continue
+
+            prices, completed_until = result
+            if completed_until is None:
+                logger.info(f"No new price data returned for {token_name} ({token_id}) from fetch operation.")
+                continue
+
+            new_prices_added = price_store.append(token_id, prices)
+            daily_price_table.update(token_id)
+            fetch_cursors[token_id] = completed_until
+            update_state(price_fetch_cursors=fetch_cursors)
+            logger.info(f"Added {new_prices_added} new price entries for {token_name} ({token_id}). Total entries: {price_store.count(token_id)}")
 
-    save_price_data(historical_data, HISTORICAL_PRICES_FILE)
\ No newline at end of file
+    if PRICE_JSON_EXPORT:
+        price_store.export_json(HISTORICAL_PRICES_FILE)
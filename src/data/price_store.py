@@ -0,0 +1,151 @@
+import os
+import re
+import bisect
+import logging
+import argparse
+from src.config import PRICE_STORE_DIR, HISTORICAL_PRICES_FILE
+from src.data.column_store import AppendOnlyColumn
+from src.utils.helpers import load_price_data, save_price_data
+
+logger = logging.getLogger(__name__)
+
+class PriceStore:
+    """
+    Per-token historical price store.
+
+    Each token is kept as two append-only columns under `base_dir`:
+    `<coingecko_id>.ts` (sorted int64 millisecond timestamps) and
+    `<coingecko_id>.px` (float64 USD prices). The timestamp column header
+    holds the last stored timestamp, so resuming a fetch never reads the data.
+    """
+
+    def __init__(self, base_dir, legacy_json_file=None):
+        self.base_dir = base_dir
+        self.legacy_json_file = legacy_json_file
+        self._columns = {}
+        self._initialized = False
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        if not os.path.isdir(self.base_dir) and self.legacy_json_file and os.path.exists(self.legacy_json_file):
+            logger.info(f"Migrating price history from {self.legacy_json_file} to {self.base_dir}")
+            self.import_json(self.legacy_json_file)
+
+    def _get_columns(self, coingecko_id):
+        columns = self._columns.get(coingecko_id)
+        if columns is None:
+            if not re.fullmatch(r'[a-z0-9-]+', coingecko_id):
+                raise ValueError(f"Invalid coingecko id: {coingecko_id}")
+            columns = (
+                AppendOnlyColumn(os.path.join(self.base_dir, f"{coingecko_id}.ts"), 'q'),
+                AppendOnlyColumn(os.path.join(self.base_dir, f"{coingecko_id}.px"), 'd'),
+            )
+            self._columns[coingecko_id] = columns
+        return columns
+
+    def tokens(self):
+        self._ensure_initialized()
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.base_dir) if name.endswith('.ts'))
+
+    def has_token(self, coingecko_id):
+        self._ensure_initialized()
+        return self.count(coingecko_id) > 0
+
+    def count(self, coingecko_id):
+        self._ensure_initialized()
+        timestamps, prices = self._get_columns(coingecko_id)
+        return min(timestamps.count, prices.count)
+
+    def last_timestamp(self, coingecko_id):
+        """Last stored timestamp in milliseconds (read from the header), or None."""
+        self._ensure_initialized()
+        return self._get_columns(coingecko_id)[0].tail
+
+    def append(self, coingecko_id, price_points):
+        """
+        Append [timestamp_ms, price] points newer than the stored tail.
+        Points are sorted and de-duplicated by timestamp first.
+
+        :return: Number of points appended.
+        """
+        self._ensure_initialized()
+        timestamps, prices = self._get_columns(coingecko_id)
+        # Repair a prices column left longer than the timestamps by an interrupted append
+        committed = min(timestamps.count, prices.count)
+        prices.truncate(committed)
+        timestamps.truncate(committed)
+
+        last_timestamp = timestamps.tail
+        new_timestamps, new_prices = [], []
+        for timestamp, price in sorted(price_points, key=lambda p: p[0]):
+            timestamp = int(timestamp)
+            if last_timestamp is not None and timestamp <= last_timestamp:
+                continue
+            new_timestamps.append(timestamp)
+            new_prices.append(float(price))
+            last_timestamp = timestamp
+
+        if new_timestamps:
+            # Prices first: the timestamp header is the commit point
+            prices.append(new_prices)
+            timestamps.append(new_timestamps)
+        return len(new_timestamps)
+
+    def get_series(self, coingecko_id):
+        """
+        Memory-mapped (timestamps, prices) views of a token's history.
+        Views are invalidated by the next append to the same token.
+        """
+        self._ensure_initialized()
+        timestamps, prices = self._get_columns(coingecko_id)
+        count = min(timestamps.count, prices.count)
+        return timestamps.view()[:count], prices.view()[:count]
+
+    def get_closest_price(self, coingecko_id, timestamp_ms):
+        """
+        Price of the point closest to the given timestamp, or None if the token has no data.
+        """
+        timestamps, prices = self.get_series(coingecko_id)
+        if not len(timestamps):
+            return None
+        index = bisect.bisect_left(timestamps, timestamp_ms)
+        if index == 0:
+            return prices[0]
+        if index == len(timestamps):
+            return prices[-1]
+        if timestamp_ms - timestamps[index - 1] < timestamps[index] - timestamp_ms:
+            return prices[index - 1]
+        return prices[index]
+
+    def import_json(self, path):
+        """Append price history from a token_historical_prices.json style file."""
+        for coingecko_id, price_points in load_price_data(path).items():
+            added = self.append(coingecko_id, price_points)
+            logger.info(f"Imported {added} price points for {coingecko_id}")
+
+    def export_json(self, path):
+        """Write the store as a token_historical_prices.json style file."""
+        data = {}
+        for coingecko_id in self.tokens():
+            timestamps, prices = self.get_series(coingecko_id)
+            data[coingecko_id] = [[timestamp, price] for timestamp, price in zip(timestamps, prices)]
+        save_price_data(data, path)
+        logger.info(f"Exported price history for {len(data)} tokens to {path}")
+
+price_store = PriceStore(PRICE_STORE_DIR, legacy_json_file=HISTORICAL_PRICES_FILE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export the binary price store")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", default=HISTORICAL_PRICES_FILE, help="JSON price file")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        price_store.export_json(args.path)
+    else:
+        price_store.import_json(args.path)
@@ -0,0 +1,134 @@
+import os
+import bisect
+import logging
+from array import array
+from src.config import PRICE_STORE_DIR
+from src.data.column_store import AppendOnlyColumn
+from src.data.price_store import price_store
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+def to_day_index(date):
+    """Days since the Unix epoch (UTC) for a datetime."""
+    return int(date.timestamp()) // 86400
+
+class DailyPriceTable:
+    """
+    Materialized token x UTC-day table of time-weighted average prices.
+
+    Raw CoinGecko points are treated as a step function (each price holds
+    until the next point; the first/last price is extended to cover the
+    edges). A day's TWAP is the integral of that function over the day,
+    obtained from prefix sums of price * interval, divided by the day length.
+
+    Each token's table is stored as a float64 column `<coingecko_id>.twap`
+    whose row i is the day `first_point_day + i`. Only the last stored day can
+    change when new points arrive, so updates recompute from that day on.
+    """
+
+    def __init__(self, base_dir, store):
+        self.base_dir = base_dir
+        self.store = store
+        self._columns = {}
+        self._cache = {}
+
+    def _get_column(self, coingecko_id):
+        if coingecko_id not in self._columns:
+            self._columns[coingecko_id] = AppendOnlyColumn(os.path.join(self.base_dir, f"{coingecko_id}.twap"), 'd')
+        return self._columns[coingecko_id]
+
+    def update(self, coingecko_id):
+        """
+        Bring the token's table up to date with the price store.
+
+        :return: Number of days (re)computed.
+        """
+        self._cache.pop(coingecko_id, None)
+        timestamps, prices = self.store.get_series(coingecko_id)
+        if not len(timestamps):
+            return 0
+
+        column = self._get_column(coingecko_id)
+        base_day = timestamps[0] // DAY_MS
+        last_day = timestamps[-1] // DAY_MS
+        first_dirty = max(column.count - 1, 0)
+        column.truncate(first_dirty)
+
+        # Local prefix sums starting at the last point before the first dirty day
+        day_start = (base_day + first_dirty) * DAY_MS
+        start = max(bisect.bisect_right(timestamps, day_start) - 1, 0)
+        local_timestamps = timestamps[start:]
+        local_prices = prices[start:]
+        cumulative = array('d', [0.0])
+        for i in range(1, len(local_timestamps)):
+            cumulative.append(cumulative[-1] + local_prices[i - 1] * (local_timestamps[i] - local_timestamps[i - 1]))
+
+        def integral(t):
+            i = min(max(bisect.bisect_right(local_timestamps, t) - 1, 0), len(local_timestamps) - 1)
+            return cumulative[i] + local_prices[i] * (t - local_timestamps[i])
+
+        twaps = array('d')
+        previous = integral(day_start)
+        for day in range(base_day + first_dirty, last_day + 1):
+            current = integral((day + 1) * DAY_MS)
+            twaps.append((current - previous) / DAY_MS)
+            previous = current
+
+        column.append(twaps)
+        logger.info(f"Updated daily TWAP table for {coingecko_id}: {len(twaps)} day(s) recomputed, {column.count} total")
+        return len(twaps)
+
+    def get_daily_prices(self, coingecko_id):
+        """
+        :return: Tuple (base_day, prices) where prices[i] is the TWAP of day
+                 base_day + i, or (None, empty array) if there is no data.
+        """
+        cached = self._cache.get(coingecko_id)
+        if cached is not None:
+            return cached
+
+        column = self._get_column(coingecko_id)
+        timestamps, _ = self.store.get_series(coingecko_id)
+        if not len(timestamps):
+            return None, array('d')
+        expected_days = timestamps[-1] // DAY_MS - timestamps[0] // DAY_MS + 1
+        if column.count != expected_days:
+            # Price store was extended outside update_price_data (e.g. first run after migration)
+            self.update(coingecko_id)
+
+        cached = (timestamps[0] // DAY_MS, column.read())
+        self._cache[coingecko_id] = cached
+        return cached
+
+    def get_price(self, coingecko_id, date):
+        """
+        TWAP of the UTC day containing `date`. Days outside the table are
+        clamped to the first/last available day.
+        """
+        base_day, prices = self.get_daily_prices(coingecko_id)
+        if not prices:
+            return None
+        index = min(max(to_day_index(date) - base_day, 0), len(prices) - 1)
+        return prices[index]
+
+    def refresh(self):
+        """Drop cached tables so the next lookup re-reads the files (for other processes' updates)."""
+        self._cache.clear()
+
+daily_price_table = DailyPriceTable(PRICE_STORE_DIR, price_store)
+
+def get_daily_price(coingecko_id, date):
+    """
+    Daily time-weighted average USD price of a token for the day containing `date`.
+
+    :param coingecko_id: CoinGecko id of the token.
+    :param date: Timezone-aware datetime.
+    :return: The price, or 0 if there is no data for the token.
+    """
+    price = daily_price_table.get_price(coingecko_id, date) if coingecko_id else None
+    if price is None:
+        logger.error(f"Unknown token or no price data: {coingecko_id}")
+        return 0
+    return price
@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+from src.config import (
+    SNAPSHOT_DIR, SNAPSHOT_BASE_EVERY, SNAPSHOT_KEEP_ALL_DAYS, SNAPSHOT_KEEP_DAILY_DAYS
+)
+from src.data.state_manager import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# UTC, as in the rewards_YYYYmmdd_HHMMSS file names (files from before the snapshot history used local time)
+SNAPSHOT_TIME_FORMAT = "%Y%m%d_%H%M%S"
+_SNAPSHOT_NAME = re.compile(r'rewards_\d{8}_\d{6}')
+# Members of a rewards snapshot that map each provider to a list which mostly grows at the end
+SECTIONS = ('events', 'balances')
+
+def snapshot_name(moment):
+    return f"rewards_{moment.strftime(SNAPSHOT_TIME_FORMAT)}"
+
+def snapshot_moment(name):
+    """:return: The (naive, UTC) time in a rewards_YYYYmmdd_HHMMSS name."""
+    return datetime.strptime(name[len('rewards_'):], SNAPSHOT_TIME_FORMAT)
+
+def _common_prefix(previous, items):
+    if items[:len(previous)] == previous:
+        return len(previous)
+    for index, (old, new) in enumerate(zip(previous, items)):
+        if old != new:
+            return index
+    return min(len(previous), len(items))
+
+def diff_section(old, new):
+    """
+    :return: {"changed": {provider: [kept, tail]}, "removed": [provider]}:
+        each changed provider's list is its first `kept` old items followed by `tail`.
+    """
+    changed = {}
+    for provider, items in new.items():
+        previous = old.get(provider)
+        if previous is None:
+            changed[provider] = [0, items]
+        elif previous != items:
+            kept = _common_prefix(previous, items)
+            changed[provider] = [kept, items[kept:]]
+    return {"changed": changed, "removed": [provider for provider in old if provider not in new]}
+
+def apply_section(section, delta):
+    """Apply a diff_section() delta to `section` in place."""
+    for provider in delta["removed"]:
+        section.pop(provider, None)
+    for provider, (kept, tail) in delta["changed"].items():
+        section[provider] = section.get(provider, [])[:kept] + tail
+
+def compose_section(first, second):
+    """:return: The delta of applying `first` and then `second`."""
+    changed = {provider: list(change) for provider, change in first["changed"].items()}
+    removed = set(first["removed"])
+    for provider, (kept, tail) in second["changed"].items():
+        first_kept, first_tail = changed.get(provider, (None, []))
+        if provider in removed or first_kept == 0:
+            # The provider's list after `first` is first_tail alone
+            changed[provider] = [0, first_tail[:kept] + tail]
+        elif first_kept is None or kept <= first_kept:
+            changed[provider] = [kept, tail]
+        else:
+            changed[provider] = [first_kept, first_tail[:kept - first_kept] + tail]
+        removed.discard(provider)
+    for provider in second["removed"]:
+        changed.pop(provider, None)
+        removed.add(provider)
+    return {"changed": changed, "removed": sorted(removed)}
+
+def diff_snapshot(old, new):
+    """:return: A delta holding `new`'s other members whole and its SECTIONS as diff_section() deltas."""
+    return {
+        key: diff_section(old.get(key, {}), value) if key in SECTIONS else value
+        for key, value in new.items()
+    }
+
+def apply_snapshot(snapshot, delta):
+    """:return: `snapshot` with a diff_snapshot() delta applied; its section lists are not modified."""
+    result = {}
+    for key, value in delta.items():
+        if key in SECTIONS:
+            section = dict(snapshot.get(key, {}))
+            apply_section(section, value)
+            result[key] = section
+        else:
+            result[key] = value
+    return result
+
+def compose_snapshot(first, second):
+    return {
+        key: compose_section(first.get(key, {"changed": {}, "removed": []}), value) if key in SECTIONS else value
+        for key, value in second.items()
+    }
+
+class SnapshotStore:
+    """
+    History of rewards snapshots (the format_rewards_data output that
+    json_logger.save_json_data writes) as full bases plus per-run deltas.
+
+    Every `base_every`-th snapshot is stored whole; the ones in between only
+    hold what changed since the previous snapshot: the rewards and totals,
+    which change for every provider on every run, and for the events and
+    balances sections just the providers whose lists changed, as the number
+    of items kept and the new tail (new events, and balance runs from the
+    last changed day). `index.json` lists the snapshots in order with their
+    file and base, and is rewritten after a snapshot file, so it commits it.
+
+    Older snapshots are thinned by compact(): those up to `keep_all_days`
+    older than the newest are all kept, then the last one of each day, and
+    after `keep_daily_days` (0: never) the last one of each week. Dropped deltas
+    are merged into the next kept one, and a chain whose base is dropped
+    gets its first kept snapshot as a new base.
+    """
+
+    def __init__(self, base_dir, base_every=SNAPSHOT_BASE_EVERY, keep_all_days=SNAPSHOT_KEEP_ALL_DAYS,
+                 keep_daily_days=SNAPSHOT_KEEP_DAILY_DAYS):
+        self.base_dir = base_dir
+        self.base_every = max(base_every, 1)
+        self.keep_all_days = keep_all_days
+        self.keep_daily_days = keep_daily_days
+        # (name, snapshot) of the last snapshot saved, so the next delta needs no reconstruction
+        self._latest = None
+
+    @property
+    def _index_file(self):
+        return os.path.join(self.base_dir, 'index.json')
+
+    def _load_index(self):
+        try:
+            with open(self._index_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"snapshots": [], "next_file": 0}
+
+    def _read(self, entry):
+        with open(os.path.join(self.base_dir, entry["file"])) as f:
+            return json.load(f)
+
+    def _write(self, index, name, kind, document):
+        """:return: The name of a new file holding `document`."""
+        file = f"{name}.{kind}.{index['next_file']}.json"
+        index["next_file"] += 1
+        write_json_atomic(os.path.join(self.base_dir, file), document)
+        return file
+
+    def names(self):
+        """:return: The stored snapshot names in the order they were saved."""
+        return [entry["name"] for entry in self._load_index()["snapshots"]]
+
+    def entries(self):
+        """:return: [{"name", "file", "base"}] of the stored snapshots; a base is its own base."""
+        return self._load_index()["snapshots"]
+
+    def load(self, name):
+        """
+        Reconstruct a snapshot from its base and the deltas after it.
+
+        :return: The snapshot, or None if there is none with this name.
+        """
+        if self._latest is not None and self._latest[0] == name:
+            return self._latest[1]
+        snapshots = self._load_index()["snapshots"]
+        position = next((i for i, entry in enumerate(snapshots) if entry["name"] == name), None)
+        if position is None:
+            return None
+        base = snapshots[position]["base"]
+        chain = [entry for entry in snapshots[:position + 1] if entry["base"] == base]
+        snapshot = self._read(chain[0])
+        for entry in chain[1:]:
+            snapshot = apply_snapshot(snapshot, self._read(entry))
+        return snapshot
+
+    def save(self, name, snapshot):
+        """
+        Store a snapshot after the existing ones, as a delta against the
+        previous snapshot or, every `base_every` snapshots, as a new base.
+        The history is kept in save order, so a name that sorts before the
+        latest one (e.g. after a clock adjustment) is still stored last. A
+        snapshot with the latest one's name (saved within the same second)
+        replaces it. Writing a base also applies the retention policy (see
+        compact()).
+        """
+        index = self._load_index()
+        snapshots = index["snapshots"]
+        replaced = snapshots.pop() if snapshots and snapshots[-1]["name"] == name else None
+        if any(entry["name"] == name for entry in snapshots):
+            raise ValueError(f"An earlier snapshot is already named {name}")
+        if replaced and self._latest is not None and self._latest[0] == name:
+            self._latest = None
+        chain_length = sum(1 for entry in snapshots if entry["base"] == snapshots[-1]["base"]) if snapshots else 0
+
+        if not snapshots or chain_length >= self.base_every:
+            file = self._write(index, name, 'base', snapshot)
+            snapshots.append({"name": name, "file": file, "base": name})
+            write_json_atomic(self._index_file, index, indent=2)
+            logger.info(f"Saved base snapshot {name} to {self.base_dir}")
+            self._latest = (name, snapshot)
+            # Also deletes the replaced snapshot's file
+            self.compact()
+            return
+
+        previous = self.load(snapshots[-1]["name"])
+        file = self._write(index, name, 'delta', diff_snapshot(previous, snapshot))
+        snapshots.append({"name": name, "file": file, "base": snapshots[-1]["base"]})
+        write_json_atomic(self._index_file, index, indent=2)
+        self._latest = (name, snapshot)
+        if replaced:
+            os.remove(os.path.join(self.base_dir, replaced["file"]))
+        logger.info(f"Saved snapshot {name} to {self.base_dir} as a delta against {snapshots[-2]['name']}")
+
+    def retained(self, names, now=None):
+        """
+        :param now: Time the ages are measured from; defaults to the last saved snapshot's.
+        :return: The names among `names` (in save order) that the retention policy keeps.
+        """
+        if not names:
+            return set()
+        now = now or snapshot_moment(names[-1])
+        keep = set(names[-1:])
+        buckets = {}
+        for name in names:
+            moment = snapshot_moment(name)
+            age = now - moment
+            if age <= timedelta(days=self.keep_all_days):
+                keep.add(name)
+            elif not self.keep_daily_days or age <= timedelta(days=self.keep_daily_days):
+                buckets[("day", moment.date())] = name
+            else:
+                buckets[("week", moment.isocalendar()[:2])] = name
+        keep.update(buckets.values())
+        return keep
+
+    def compact(self, now=None):
+        """
+        Drop the snapshots the retention policy doesn't keep, merging their
+        deltas into the next kept snapshot, and delete unreferenced files.
+
+        :return: Number of snapshots dropped.
+        """
+        index = self._load_index()
+        snapshots = index["snapshots"]
+        keep = self.retained([entry["name"] for entry in snapshots], now)
+        dropped = len(snapshots) - len(keep)
+
+        if dropped:
+            kept_entries = []
+            snapshot = None
+            pending = None
+            base = None
+            for entry in snapshots:
+                if entry["base"] == entry["name"]:
+                    # A new chain
+                    snapshot, pending, base = self._read(entry), None, None
+                else:
+                    delta = self._read(entry)
+                    snapshot = apply_snapshot(snapshot, delta)
+                    # A kept delta that directly follows a kept snapshot keeps its file
+                    pending = (delta, entry["file"]) if pending is None else (compose_snapshot(pending[0], delta), None)
+                if entry["name"] not in keep:
+                    continue
+                if base is None:
+                    file = entry["file"] if entry["base"] == entry["name"] else self._write(index, entry["name"], 'base', snapshot)
+                    base = entry["name"]
+                else:
+                    file = pending[1] or self._write(index, entry["name"], 'delta', pending[0])
+                kept_entries.append({"name": entry["name"], "file": file, "base": base})
+                pending = None
+            index["snapshots"] = kept_entries
+            write_json_atomic(self._index_file, index, indent=2)
+            logger.info(f"Compacted {dropped} snapshots of {self.base_dir}; {len(kept_entries)} remain")
+
+        # Files of dropped snapshots, and any left by a write the index never committed
+        referenced = {entry["file"] for entry in index["snapshots"]}
+        for file in os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []:
+            if file.startswith('rewards_') and file.endswith('.json') and file not in referenced:
+                os.remove(os.path.join(self.base_dir, file))
+        return dropped
+
+    def export(self, name, path):
+        """Write a snapshot as a full rewards file."""
+        snapshot = self.load(name)
+        if snapshot is None:
+            raise KeyError(f"No snapshot named {name}")
+        write_json_atomic(path, snapshot)
+        logger.info(f"Exported snapshot {name} to {path}")
+
+    def import_files(self, paths):
+        """Store full rewards_YYYYmmdd_HHMMSS.json files as snapshots, oldest first."""
+        for path in sorted(paths, key=os.path.basename):
+            match = _SNAPSHOT_NAME.search(os.path.basename(path))
+            if not match:
+                raise ValueError(f"Not a rewards_YYYYmmdd_HHMMSS.json file: {path}")
+            with open(path) as f:
+                self.save(match.group(0), json.load(f))
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="List, export, import or compact the rewards snapshot history")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the stored snapshots")
+    export_parser = subparsers.add_parser("export", help="Reconstruct a snapshot as a full rewards file")
+    export_parser.add_argument("name", help="Snapshot name, e.g. rewards_20241001_120000")
+    export_parser.add_argument("path", nargs="?", help="Output file (defaults to data/rewards/<name>.json)")
+    import_parser = subparsers.add_parser("import", help="Store existing full rewards files as snapshots")
+    import_parser.add_argument("paths", nargs="+")
+    import_parser.add_argument("--delete", action="store_true", help="Delete the files once imported")
+    subparsers.add_parser("compact", help="Apply the retention policy now")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for entry in snapshot_store.entries():
+            print(f"{entry['name']}  {'base' if entry['base'] == entry['name'] else 'delta of ' + entry['base']}")
+    elif args.command == "export":
+        snapshot_store.export(args.name, args.path or os.path.join('data', 'rewards', f"{args.name}.json"))
+    elif args.command == "import":
+        snapshot_store.import_files(args.paths)
+        if args.delete:
+            for path in args.paths:
+                os.remove(path)
+    else:
+        snapshot_store.compact()
@@ -1,18 +1,73 @@
+import os
 import json
 import logging
+import tempfile
 from src.config import STATE_FILE
 
 logger = logging.getLogger(__name__)
 
+def write_json_atomic(path, data, **dump_kwargs):
+    """
+    Write JSON to a temporary file in the same directory, fsync it and rename
+    it over `path`, so readers never see a partially written file.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            # json.dumps, unlike json.dump, encodes with the C encoder (when not indenting)
+            f.write(json.dumps(data, **dump_kwargs))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 def save_state(last_block, latest_rewards_file, last_balance_timestamp, last_daily_balance_date):
-    state = {
+    # Keep any additional keys (e.g. price fetch cursors) written by other components
+    state = load_state()
+    state.update({
         'last_processed_block': last_block,
         'latest_rewards_file': latest_rewards_file,
         'last_balance_timestamp': last_balance_timestamp,
         'last_daily_balance_date': last_daily_balance_date,
-    }
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=2)
+    })
+    write_json_atomic(STATE_FILE, state, indent=2)
+
+def update_state(**fields):
+    """
+    Merge the given fields into the persisted state without touching other keys.
+
+    :param fields: State keys and their new values.
+    :return: The updated state dictionary.
+    """
+    state = load_state()
+    state.update(fields)
+    write_json_atomic(STATE_FILE, state, indent=2)
+    return state
+
+def get_event_cursor(state, pool_address, event_name):
+    """Last block whose `event_name` logs for the pool are durably stored, or None."""
+    return (state.get('event_cursors') or {}).get(pool_address, {}).get(event_name)
+
+def lowest_event_cursor(state, pools, default):
+    """
+    Last block up to which every event of `pools` is durably stored: the
+    lowest committed cursor, with pairs that have none counting as `default`.
+    """
+    cursors = [get_event_cursor(state, pool["address"], event_name) for pool in pools for event_name in pool.get("events", [])]
+    return min((default if cursor is None else cursor for cursor in cursors), default=default)
+
+def save_event_cursor(pool_address, event_name, block_number):
+    """Commit the per-pool, per-event fetch cursor after a chunk has been stored."""
+    state = load_state()
+    cursors = state.get('event_cursors') or {}
+    cursors.setdefault(pool_address, {})[event_name] = block_number
+    state['event_cursors'] = cursors
+    write_json_atomic(STATE_FILE, state, indent=2)
 
 def load_state():
     try:
@@ -21,4 +76,4 @@ def load_state():
         return state
     except FileNotFoundError:
         logger.info(f"No state file found.")
-        return {'last_processed_block': None, 'latest_rewards_file': None, 'last_daily_balance_date': None}
\ No newline at end of file
+        return {'last_processed_block': None, 'latest_rewards_file': None, 'last_daily_balance_date': None}
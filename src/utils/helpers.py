@@ -1,30 +1,62 @@
-from eth_utils import to_checksum_address
 import json
 from decimal import Decimal
 import logging
-from eth_abi import decode_abi
-import bisect
 import os
+import sys
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Distinct addresses seen in a program are in the thousands; the bound only guards against unbounded input
+ADDRESS_CACHE_SIZE = 65536
+
 def normalize_address(address):
     """
     Normalize an Ethereum address to its checksummed version.
     This function handles both string and bytes input formats.
 
+    Results are memoized and interned, so every occurrence of a provider
+    shares one string object and repeated calls skip the keccak hash.
+
     :param address: Ethereum address to normalize.
     :return: Checksummed Ethereum address.
     """    
+    if not isinstance(address, (str, bytes)):
+        raise ValueError(f"Unsupported address format: {type(address)} for address {address}")
+    return _normalize_address_cached(address)
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def _normalize_address_cached(address):
+    from eth_utils import to_checksum_address
+
     if isinstance(address, bytes):
         address = address.hex()
-    elif not isinstance(address, str):
-        raise ValueError(f"Unsupported address format: {type(address)} for address {address}")
 
     address = address.lower().removeprefix('0x').lstrip('0').zfill(40)
     address = '0x' + address
     
-    return to_checksum_address(address)
+    return sys.intern(to_checksum_address(address))
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def address_key(address):
+    """
+    Compact 20-byte key for an address, for internal dict/set indexing where
+    the key's size matters, e.g. large sets of addresses held for long. The
+    calculators key their dicts by the interned strings of normalize_address.
+
+    :param address: Ethereum address (any format accepted by normalize_address).
+    :return: The address as 20 raw bytes.
+    """
+    return bytes.fromhex(normalize_address(address)[2:])
+
+def address_from_key(key):
+    """
+    Inverse of address_key.
+
+    :param key: 20-byte address key.
+    :return: Checksummed Ethereum address.
+    """
+    return normalize_address(key)
 
 def get_event_abi(contract, event_name):
     """
@@ -59,6 +91,8 @@ def decode_log(abi, log):
     :param log: The log entry to decode.
     :return: A dictionary containing the decoded event data.
     """    
+    from eth_abi import decode_abi
+
     topics = log['topics']
     if len(topics) > 0:
         topics = topics[1:]  # remove event signature
@@ -111,10 +145,12 @@ def format_decimal(value, decimal_places=8):
     else:
         return parts[0]
 
+@lru_cache(maxsize=None)
 def load_abi(filename):
     """
     Load the ABI (Application Binary Interface) file from the given filename.
     This function reads the ABI file from the './abi' directory and parses it as JSON.
+    Each file is read once; callers share (and must not modify) the result.
 
     :param filename: Name of the ABI file to load.
     :return: Parsed ABI JSON.
@@ -127,8 +163,15 @@ def load_abi(filename):
         logger.error(f"ABI file not found: {filename}")
         raise
 
+def get_pool_abi(pool):
+    """
+    :param pool: Pool configuration from config.POOLS.
+    :return: The pool contract's parsed ABI.
+    """
+    return load_abi(pool["abi_file"])
+
 def get_tokens_from_contract(w3, pool):
-    contract = w3.eth.contract(address=pool["address"], abi=pool["abi"])
+    contract = w3.eth.contract(address=pool["address"], abi=get_pool_abi(pool))
     try:
         if hasattr(contract.functions, 'token0') and hasattr(contract.functions, 'token1'):
             token0_address = contract.functions.token0().call()
@@ -160,29 +203,15 @@ def get_token_attr_by_address(address, pool):
     return None
 
 def get_token_price(coingecko_id, date):
-    historical_data = load_price_data('data/token_historical_prices.json')
-    if not coingecko_id or coingecko_id not in historical_data:
+    # Imported here: price_store depends on src.config, which imports this module
+    from src.data.price_store import price_store
+
+    if not coingecko_id or not price_store.has_token(coingecko_id):
         logger.error(f"Unknown token or no price data: {coingecko_id}")
         return 0
 
     target_timestamp = int(date.timestamp() * 1000)
-    price_data = historical_data[coingecko_id]
-    
-    timestamps = [entry[0] for entry in price_data]
-    index = bisect.bisect_left(timestamps, target_timestamp)
-    
-    if index == 0:
-        closest_price = price_data[0][1]
-    elif index == len(price_data):
-        closest_price = price_data[-1][1]
-    else:
-        before = price_data[index - 1]
-        after = price_data[index]
-        if target_timestamp - before[0] < after[0] - target_timestamp:
-            closest_price = before[1]
-        else:
-            closest_price = after[1]
-    return closest_price
+    return price_store.get_closest_price(coingecko_id, target_timestamp)
 
 def load_price_data(path):
     try:
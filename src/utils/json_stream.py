@@ -0,0 +1,223 @@
+import re
+import json
+from decimal import Decimal
+
+# Floats are parsed as Decimal so amounts keep every digit written to the file
+_decoder = json.JSONDecoder(parse_float=Decimal)
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_NUMBER_CONTINUATION = frozenset('0123456789.eE+-')
+_NEXT_CHAR = re.compile(r'[ \t\n\r]*([^ \t\n\r])')
+_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_WHITESPACE_CHARS = frozenset(' \t\n\r')
+
+class ObjectStream:
+    """
+    Pull reader for a JSON document whose top level is an object.
+
+    Iterating `members()` yields the top-level keys in file order. After
+    each key the caller reads its value with `read_value()`, walks it item
+    by item with `iter_array()` or drops it with `skip_value()`; a value
+    left untouched is skipped. Only the current item is ever held in
+    memory, so large arrays and objects can be read or passed over in
+    constant space.
+    """
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._pending = False
+
+    def _fill(self):
+        """Read another chunk, dropping the consumed part of the buffer. :return: False at EOF."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def _expect(self, chars):
+        match = _NEXT_CHAR.match(self._buf, self._pos)
+        if match is None:
+            self._peek()
+            match = _NEXT_CHAR.match(self._buf, self._pos)
+        char = match.group(1)
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {match.start(1)}, found {char!r}")
+        self._pos = match.end()
+        return char
+
+    def _decode(self):
+        if self._pos >= len(self._buf) or self._buf[self._pos] in _WHITESPACE_CHARS:
+            self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut off by the end of the buffer may continue in the next chunk
+            if (end == len(self._buf) or self._buf[end] in _NUMBER_CONTINUATION) \
+                    and type(value) in (int, Decimal) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _key(self):
+        """:return: The next object key, consuming it and the colon after it."""
+        while True:
+            match = _KEY.match(self._buf, self._pos)
+            # The key, or the whitespace after its colon, may continue in the next chunk
+            if match is None or match.end() == len(self._buf):
+                if self._fill():
+                    continue
+                if match is None:
+                    raise ValueError(f"Expected an object key at offset {self._pos}")
+            self._pos = match.end()
+            key = match.group(1)
+            return json.loads(f'"{key}"') if '\\' in key else key
+
+    def members(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._key()
+            self._pending = True
+            yield key
+            if self._pending:
+                self.skip_value()
+            if self._expect(',}') == '}':
+                return
+
+    def read_value(self):
+        """:return: The current value, fully decoded."""
+        self._pending = False
+        return self._decode()
+
+    def iter_array(self):
+        """Yield the items of the current value, which must be an array."""
+        self._pending = False
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            item = self._fast_item(self._pos)
+            if item is None:
+                # Item or separator crosses the end of the buffer
+                yield self._decode()
+                separator = self._expect(',]')
+            else:
+                value, separator = item
+                yield value
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected one of ',]' at offset {self._pos - 1}, found {separator!r}")
+
+    def iter_object(self):
+        """Yield the (key, value) pairs of the current value, which must be an object."""
+        self._pending = False
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        key_match = _KEY.match
+        next_char = _NEXT_CHAR.match
+        raw_decode = _decoder.raw_decode
+        while True:
+            # Fast path for a member and its separator that lie within the buffer
+            buf = self._buf
+            match = key_match(buf, self._pos)
+            separator = None
+            if match is not None and match.end() < len(buf):
+                try:
+                    value, end = raw_decode(buf, match.end())
+                except json.JSONDecodeError:
+                    end = len(buf)
+                if end < len(buf) and buf[end] not in _NUMBER_CONTINUATION:
+                    separator = next_char(buf, end)
+            if separator is None:
+                yield self._key(), self._decode()
+                separator = self._expect(',}')
+            else:
+                self._pos = separator.end()
+                separator = separator.group(1)
+                key = match.group(1)
+                yield json.loads(f'"{key}"') if '\\' in key else key, value
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected one of ',}}' at offset {self._pos - 1}, found {separator!r}")
+
+    def _fast_item(self, pos):
+        """
+        Decode the value at `pos` and the separator after it, if both lie
+        within the buffer, and move past them.
+
+        :return: (value, separator), or None to fall back to the general path.
+        """
+        buf = self._buf
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos >= len(buf):
+            return None
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            return None
+        if end >= len(buf) or buf[end] in _NUMBER_CONTINUATION:
+            return None
+        separator = _NEXT_CHAR.match(buf, end)
+        if separator is None:
+            return None
+        self._pos = separator.end()
+        return value, separator.group(1)
+
+    def skip_value(self):
+        """Advance past the current value without building it."""
+        self._pending = False
+        if self._peek() not in '[{':
+            self._decode()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON input")
+                continue
+            char = match.group()
+            if char == '"':
+                string = _STRING.match(self._buf, match.start())
+                if string is None:
+                    # String continues in the next chunk
+                    self._pos = match.start()
+                    if not self._fill():
+                        raise ValueError("Unterminated string in JSON input")
+                    continue
+                self._pos = string.end()
+                continue
+            self._pos = match.end()
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
@@ -0,0 +1,38 @@
+import threading
+
+class LazyProxy:
+    """
+    Stand-in for a module-level singleton that builds it on first use.
+
+    Attribute reads and writes are forwarded to the instance, which is
+    created by `factory()` the first time it is needed, so importing a
+    module no longer constructs clients or reads state.
+    """
+
+    __slots__ = ('_factory', '_instance', '_lock')
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _get_instance(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._get_instance(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get_instance(), name, value)
+
+    def __repr__(self):
+        if self._instance is None:
+            return f"<LazyProxy for {getattr(self._factory, '__qualname__', self._factory)!r} (not created)>"
+        return repr(self._instance)
@@ -1,7 +1,149 @@
 import json
 import os
+import sys
 import argparse
-from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the parent directory to sys.path to enable relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.rewards_validator import RewardTotals, read_rewards
+
+# ARB token address on Ethereum Mainnet
+ARB_TOKEN_ADDRESS = "0x912ce59144191c1204e64559fe8253a0e49e6548"  # Replace with your new ARB token address
+# T token address on Ethereum Mainnet
+T_TOKEN_ADDRESS = "0xcdf7028ceab81fa0c6971208e83fa7872994bee5"
+
+ARB_REWARD_LABEL = "TLP reward in ARB tokens"
+T_REWARD_LABEL = "TLP reward in T tokens"
+
+
+class MerklWriter:
+    """
+    Writes a MERKL distribution file one recipient at a time. The output is
+    byte-for-byte what json.dump(..., indent=2) produces for the complete
+    {"rewardToken", "rewards"} mapping, without holding the mapping in memory.
+    """
+
+    def __init__(self, path, reward_token, label):
+        self.path = path
+        self.recipients = 0
+        self.total_wei = 0
+        self._label = json.dumps(label)
+        self._file = open(path, 'w', buffering=1 << 20)
+        self._file.write(f'{{\n  "rewardToken": {json.dumps(reward_token)},\n  "rewards": {{')
+
+    def add(self, recipient, amount_wei):
+        separator = ',' if self.recipients else ''
+        self._file.write(f'{separator}\n    {json.dumps(recipient)}: {{\n      {self._label}: "{amount_wei}"\n    }}')
+        self.recipients += 1
+        self.total_wei += amount_wei
+
+    def close(self):
+        self._file.write('\n  }\n}' if self.recipients else '}\n}')
+        self._file.close()
+
+
+def merkl_output_files(input_file, output_dir):
+    """:return: (ARB file, T file) paths for the rewards file `input_file`."""
+    filename_without_ext = os.path.splitext(os.path.basename(input_file))[0]
+    return (
+        os.path.join(output_dir, f"{filename_without_ext}_merkl_arb.json"),
+        os.path.join(output_dir, f"{filename_without_ext}_merkl_t.json")
+    )
+
+
+def convert_rewards_file(input_file, output_dir):
+    """
+    Validate and convert a rewards file in a single streaming pass.
+
+    Reward entries are read one at a time, summed for validation and written
+    to `.tmp` copies of both MERKL files, so memory does not grow with the
+    number of recipients. Call finalize_conversion to publish or discard the
+    temporary files once the validation results have been reviewed.
+
+    :return: Dictionary with the input file, validation results, recipient
+        counts and (temporary file, output file) pairs.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [(f"{path}.tmp", path) for path in merkl_output_files(input_file, output_dir)]
+    arb_writer = MerklWriter(outputs[0][0], ARB_TOKEN_ADDRESS, ARB_REWARD_LABEL)
+    t_writer = MerklWriter(outputs[1][0], T_TOKEN_ADDRESS, T_REWARD_LABEL)
+    totals = RewardTotals()
+    skipped = []
+
+    def convert(reward_data):
+        arb_wei, t_wei = totals.add(reward_data)
+        provider = reward_data.get("provider")
+        if not provider:
+            skipped.append("Provider address not found")
+            return
+        if arb_wei is None or t_wei is None:
+            skipped.append(f"Token amounts missing for {provider}")
+            return
+        if arb_wei > 0:
+            arb_writer.add(provider, arb_wei)
+        if t_wei > 0:
+            t_writer.add(provider, t_wei)
+
+    try:
+        header = read_rewards(input_file, convert)
+    except Exception:
+        arb_writer.close()
+        t_writer.close()
+        for temp_file, _ in outputs:
+            os.remove(temp_file)
+        raise
+    arb_writer.close()
+    t_writer.close()
+
+    return {
+        "input_file": input_file,
+        "validations": totals.validations(header.get("total_weighted_liquidity", 0)),
+        "recipients": totals.recipients,
+        "arb_recipients": arb_writer.recipients,
+        "t_recipients": t_writer.recipients,
+        "skipped": skipped,
+        "outputs": outputs
+    }
+
+
+def finalize_conversion(conversion, keep=True):
+    """Move the temporary MERKL files into place, or delete them if `keep` is False."""
+    for temp_file, output_file in conversion["outputs"]:
+        if keep:
+            os.replace(temp_file, output_file)
+        else:
+            os.remove(temp_file)
+
+
+def _convert_or_error(input_file, output_dir):
+    try:
+        return convert_rewards_file(input_file, output_dir)
+    except Exception as e:
+        return {"input_file": input_file, "error": str(e)}
+
+
+def convert_rewards_files(input_files, output_dir, workers=None):
+    """
+    Run convert_rewards_file for several rewards files, in parallel processes
+    when there is more than one file.
+
+    :return: One result per input file, in input order; failed files get an
+        {"input_file", "error"} result instead.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(input_files))
+    if workers <= 1:
+        return [_convert_or_error(input_file, output_dir) for input_file in input_files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_convert_or_error, input_files, [output_dir] * len(input_files)))
+
+
+def print_conversion(conversion):
+    for message in conversion["skipped"]:
+        print(f"Warning: {message}, skipping")
+    arb_file, t_file = (output_file for _, output_file in conversion["outputs"])
+    print(f"ARB token MERKL format saved to: {arb_file} ({conversion['arb_recipients']} recipients)")
+    print(f"T token MERKL format saved to: {t_file} ({conversion['t_recipients']} recipients)")
 
 
 def convert_to_merkl_format(input_file, output_dir):
@@ -11,84 +153,11 @@ def convert_to_merkl_format(input_file, output_dir):
     """
     try:
         print(f"Reading rewards file: {input_file}")
-        with open(input_file, 'r') as f:
-            rewards_data = json.load(f)
-        
-        if 'rewards' not in rewards_data:
-            raise ValueError("Invalid rewards file format: 'rewards' key not found")
-        
-        # ARB token address on Ethereum Mainnet
-        arb_token_address = "0x912ce59144191c1204e64559fe8253a0e49e6548"  # Replace with your new ARB token address
-        # T token address on Ethereum Mainnet
-        t_token_address = "0xcdf7028ceab81fa0c6971208e83fa7872994bee5"
-        
-        # Initialize MERKL format dictionaries
-        arb_merkl = {
-            "rewardToken": arb_token_address,
-            "rewards": {}
-        }
-        
-        t_merkl = {
-            "rewardToken": t_token_address,
-            "rewards": {}
-        }
-        
-        # Process each reward entry in the list
-        for reward_data in rewards_data["rewards"]:
-            # Get provider address (recipient)
-            provider = reward_data.get("provider")
-            if not provider:
-                print(f"Warning: Provider address not found, skipping")
-                continue
-            
-            # Get ARB and T token amounts
-            arb_amount = reward_data.get("estimated_reward_in_arb_tokens")
-            t_amount = reward_data.get("estimated_reward_in_t_tokens")
-            
-            # Skip if amounts are missing
-            if arb_amount is None or t_amount is None:
-                print(f"Warning: Token amounts missing for {provider}, skipping")
-                continue
-            
-            # Convert to string with full precision (MERKL format requires string amounts)
-            # Convert to integer string with all decimals (assuming 18 decimals)
-            arb_amount_str = str(int(Decimal(str(arb_amount)) * Decimal('1000000000000000000')))
-            t_amount_str = str(int(Decimal(str(t_amount)) * Decimal('1000000000000000000')))
-            
-            # Add to ARB MERKL format if amount > 0
-            if Decimal(arb_amount) > 0:
-                if provider not in arb_merkl["rewards"]:
-                    arb_merkl["rewards"][provider] = {}
-                arb_merkl["rewards"][provider]["TLP reward in ARB tokens"] = arb_amount_str
-            
-            # Add to T MERKL format if amount > 0
-            if Decimal(t_amount) > 0:
-                if provider not in t_merkl["rewards"]:
-                    t_merkl["rewards"][provider] = {}
-                t_merkl["rewards"][provider]["TLP reward in T tokens"] = t_amount_str
-        
-        # Generate output filenames based on input filename
-        base_filename = os.path.basename(input_file)
-        filename_without_ext = os.path.splitext(base_filename)[0]
-        
-        arb_output_file = os.path.join(output_dir, f"{filename_without_ext}_merkl_arb.json")
-        t_output_file = os.path.join(output_dir, f"{filename_without_ext}_merkl_t.json")
-        
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Save ARB MERKL file
-        with open(arb_output_file, 'w') as f:
-            json.dump(arb_merkl, f, indent=2)
-        print(f"ARB token MERKL format saved to: {arb_output_file}")
-        
-        # Save T MERKL file
-        with open(t_output_file, 'w') as f:
-            json.dump(t_merkl, f, indent=2)
-        print(f"T token MERKL format saved to: {t_output_file}")
-        
+        conversion = convert_rewards_file(input_file, output_dir)
+        finalize_conversion(conversion)
+        print_conversion(conversion)
         return True
-    
+
     except Exception as e:
         print(f"Error converting to MERKL format: {str(e)}")
         return False
@@ -96,9 +165,16 @@ def convert_to_merkl_format(input_file, output_dir):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert rewards JSON to MERKL format")
-    parser.add_argument("input_file", help="Path to the rewards JSON file")
+    parser.add_argument("input_files", nargs="+", help="Paths to the rewards JSON files")
     parser.add_argument("--output-dir", default="data/merkl", help="Directory to save MERKL format files")
-    
+    parser.add_argument("--workers", type=int, default=None, help="Parallel processes when converting several files (default: CPU count)")
+
     args = parser.parse_args()
-    
-    convert_to_merkl_format(args.input_file, args.output_dir) 
\ No newline at end of file
+
+    for conversion in convert_rewards_files(args.input_files, args.output_dir, args.workers):
+        print(f"\n{conversion['input_file']}:")
+        if "error" in conversion:
+            print(f"Error converting to MERKL format: {conversion['error']}")
+            continue
+        finalize_conversion(conversion)
+        print_conversion(conversion)
@@ -5,71 +5,103 @@ import os.path
 
 # Add the parent directory to sys.path to enable relative imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.rewards_validator import validate_rewards_file
-from utils.merkl_converter import convert_to_merkl_format
+from utils.rewards_validator import print_validations
+from utils.merkl_converter import convert_rewards_files, finalize_conversion, print_conversion
+from utils.merkl_tree import build_tree_for_merkl_file, tree_file_for
 
 
-def process_rewards_for_merkl(input_file, output_dir):
+def build_trees(conversion):
+    """Build the Merkle tree and proof file of both MERKL files of a conversion."""
+    for _, merkl_file in conversion["outputs"]:
+        tree = build_tree_for_merkl_file(merkl_file)
+        print(f"Merkle root of {merkl_file}: 0x{tree.root.hex()}")
+        print(f"  Proof file saved to: {tree_file_for(merkl_file)}")
+
+
+def review_conversion(conversion, assume_yes=False, trees=False):
     """
-    Process rewards file for MERKL:
-    1. Validate the rewards file
-    2. Convert to MERKL format if validation passes
+    Print the validation results of a converted rewards file and publish its
+    MERKL files if validation passes (or the user chooses to proceed).
     """
     print("=" * 50)
-    print(f"Processing rewards file: {input_file}")
+    print(f"Processing rewards file: {conversion['input_file']}")
     print("=" * 50)
-    
-    # Step 1: Validate the rewards file
-    print("\nStep 1: Validating rewards file...")
-    validation_results = validate_rewards_file(input_file)
-    
-    if not validation_results:
+
+    if "error" in conversion:
+        print(f"\nError processing rewards file: {conversion['error']}")
         print("\nValidation failed. Cannot proceed with conversion.")
         return False
-    
-    # Check if critical validations passed
-    critical_validations = [
-        validation_results["weighted_liquidity_match"]["result"],
-        validation_results["arb_tokens_sum"]["result"],
-        validation_results["t_usd_percentage"]["result"]
-    ]
-    
-    if not all(critical_validations):
+
+    print(f"\nStep 1: Validation ({conversion['recipients']} recipients)...")
+    if not print_validations(conversion["validations"]):
         print("\nCritical validation checks failed. Please review the validation results above.")
-        proceed = input("\nDo you want to proceed with conversion anyway? (y/n): ").strip().lower()
-        
-        if proceed != 'y':
-            print("Conversion cancelled.")
-            return False
-    
-    # Step 2: Convert to MERKL format
-    print("\nStep 2: Converting to MERKL format...")
-    conversion_success = convert_to_merkl_format(input_file, output_dir)
-    
-    if conversion_success:
-        print("\nConversion successful!")
-        print(f"MERKL format files saved to: {output_dir}")
-        
+        if assume_yes:
+            print("\nProceeding with conversion anyway (--yes).")
+        else:
+            proceed = input("\nDo you want to proceed with conversion anyway? (y/n): ").strip().lower()
+
+            if proceed != 'y':
+                finalize_conversion(conversion, keep=False)
+                print("Conversion cancelled.")
+                return False
+
+    print("\nStep 2: Saving MERKL format files...")
+    finalize_conversion(conversion)
+    print_conversion(conversion)
+    if trees:
+        print("\nStep 3: Building Merkle trees...")
+        build_trees(conversion)
+    print("\nConversion successful!")
+    return True
+
+
+def process_rewards_files(input_files, output_dir, workers=None, assume_yes=False, trees=False):
+    """
+    Process rewards files for MERKL:
+    1. Validate and convert every file in one streaming pass, in parallel
+       processes when there are several files
+    2. Review each file's validation results and keep its MERKL files if
+       validation passes (or the user chooses to proceed)
+    3. Optionally build the Merkle tree and proof file of each kept MERKL file
+
+    :return: List of input files whose MERKL files were saved.
+    """
+    conversions = convert_rewards_files(input_files, output_dir, workers)
+    saved = [conversion["input_file"] for conversion in conversions if review_conversion(conversion, assume_yes, trees)]
+
+    if saved:
+        print(f"\nMERKL format files saved to: {output_dir}")
+
         # Remind about MERKL fee
         print("\nIMPORTANT NOTE ABOUT MERKL FEE:")
         print("Merkl applies a 0.5% fee to airdrop campaigns.")
         print("This fee is added on top of the total airdropped amount.")
         print("The frontend will automatically calculate this for you when uploading to MERKL.")
-        
-        return True
-    else:
-        print("\nConversion failed.")
-        return False
+
+    return saved
+
+
+def process_rewards_for_merkl(input_file, output_dir, assume_yes=False, trees=False):
+    """
+    Process a single rewards file for MERKL.
+
+    :return: True if the MERKL files were saved.
+    """
+    return bool(process_rewards_files([input_file], output_dir, workers=1, assume_yes=assume_yes, trees=trees))
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process rewards file for MERKL")
-    parser.add_argument("input_file", help="Path to the rewards JSON file")
+    parser = argparse.ArgumentParser(description="Process rewards files for MERKL")
+    parser.add_argument("input_files", nargs="+", help="Paths to the rewards JSON files")
     parser.add_argument("--output-dir", default="data/merkl", help="Directory to save MERKL format files")
-    
+    parser.add_argument("--workers", type=int, default=None, help="Parallel processes when processing several files (default: CPU count)")
+    parser.add_argument("--yes", action="store_true", help="Save MERKL files even if critical validation checks fail, without prompting")
+    parser.add_argument("--tree", action="store_true", help="Also build the Merkle tree and proof file of each MERKL file")
+
     args = parser.parse_args()
-    
+
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
-    
-    process_rewards_for_merkl(args.input_file, args.output_dir) 
\ No newline at end of file
+
+    saved = process_rewards_files(args.input_files, args.output_dir, args.workers, args.yes, args.tree)
+    sys.exit(0 if len(saved) == len(args.input_files) else 1)
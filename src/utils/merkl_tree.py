@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+from array import array
+from eth_hash.auto import keccak
+
+# Add the parent directory to sys.path to enable relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.json_stream import ObjectStream
+
+# Proof file layout (little-endian):
+#   header  magic, leaf count, hash table slots, reward token, root
+#   table   u32 per slot: leaf index + 1, 0 for an empty slot (open addressing, linear probing)
+#   leaves  per leaf, sorted by address: address (20 bytes) and amount (uint256, big-endian)
+#   nodes   every tree level from the leaf hashes up to the root, 32 bytes per node
+MAGIC = b"TLPMRKL\x01"
+HEADER = struct.Struct("<8sII20s32s")
+LEAF_SIZE = 20 + 32
+NODE_SIZE = 32
+
+ZERO_PADDING = bytes(12)
+
+
+def address_bytes(address):
+    if isinstance(address, (bytes, bytearray)):
+        if len(address) != 20:
+            raise ValueError(f"Invalid address length: {len(address)} bytes")
+        return bytes(address)
+    if not isinstance(address, str) or len(address) != 42 or not address.startswith("0x"):
+        raise ValueError(f"Invalid address: {address!r}")
+    return bytes.fromhex(address[2:])
+
+
+def leaf_hash(account, token, amount):
+    """
+    keccak256(keccak256(abi.encode(address account, address token, uint256 amount))),
+    the leaf encoding of OpenZeppelin's StandardMerkleTree. Hashing twice keeps
+    a leaf from ever being mistaken for an inner node.
+    """
+    return keccak(keccak(ZERO_PADDING + account + ZERO_PADDING + token + amount.to_bytes(32, "big")))
+
+
+def hash_pair(a, b):
+    """Hash two nodes in sorted order, so proofs need no left/right flags (OpenZeppelin MerkleProof)."""
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+def level_sizes(leaf_count):
+    sizes = [leaf_count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def build_levels(leaves):
+    """
+    Build the tree one level at a time, hashing every pair of the level in a
+    single batch. An unpaired last node is carried up to the next level unchanged.
+
+    :return: List of levels, from the leaves up to [root].
+    """
+    levels = [leaves]
+    level = leaves
+    while len(level) > 1:
+        pairs = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            pairs.append(level[-1])
+        levels.append(pairs)
+        level = pairs
+    return levels
+
+
+def verify_proof(leaf, proof, root):
+    computed = leaf
+    for sibling in proof:
+        computed = hash_pair(computed, sibling)
+    return computed == root
+
+
+def _table_size(leaf_count):
+    # Power of two at least twice the leaf count keeps probe chains short
+    size = 1
+    while size < 2 * leaf_count:
+        size *= 2
+    return size
+
+
+def _slot(account, mask):
+    # Addresses are uniformly distributed, so their leading bytes are a good hash
+    return int.from_bytes(account[:8], "little") & mask
+
+
+class MerkleTree:
+    """
+    Merkle tree over the claims of one reward token.
+
+    Leaves are sorted by recipient address, so the same distribution always
+    produces the same root.
+    """
+
+    def __init__(self, token, claims):
+        """
+        :param token: Reward token address.
+        :param claims: Iterable of (recipient address, amount in wei).
+        """
+        self.token = address_bytes(token)
+        entries = sorted((address_bytes(account), int(amount)) for account, amount in claims)
+        if not entries:
+            raise ValueError("Cannot build a Merkle tree without claims")
+        for (previous, _), (account, _) in zip(entries, entries[1:]):
+            if previous == account:
+                raise ValueError(f"Duplicate recipient 0x{account.hex()}")
+        self.accounts = [account for account, _ in entries]
+        self.amounts = [amount for _, amount in entries]
+        token = self.token
+        self.levels = build_levels([leaf_hash(account, token, amount) for account, amount in entries])
+
+    def __len__(self):
+        return len(self.accounts)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling])
+            index //= 2
+        return proof
+
+    def proofs(self):
+        """Yield (address bytes, amount, proof) for every recipient, in leaf order."""
+        for index, (account, amount) in enumerate(zip(self.accounts, self.amounts)):
+            yield account, amount, self.proof(index)
+
+    def write(self, path):
+        """Write the proof file, replacing `path` atomically."""
+        table_size = _table_size(len(self.accounts))
+        mask = table_size - 1
+        table = array("I", bytes(4 * table_size))
+        for index, account in enumerate(self.accounts):
+            slot = _slot(account, mask)
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = index + 1
+        if sys.byteorder != "little":
+            table.byteswap()
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self.accounts), table_size, self.token, self.root))
+            f.write(table.tobytes())
+            f.write(b"".join(account + amount.to_bytes(32, "big") for account, amount in zip(self.accounts, self.amounts)))
+            for level in self.levels:
+                f.write(b"".join(level))
+        os.replace(temp_path, path)
+
+    def write_proofs_json(self, path):
+        """Write every recipient's amount and proof as JSON, one recipient at a time."""
+        with open(path, "w", buffering=1 << 20) as f:
+            f.write(f'{{\n  "rewardToken": "0x{self.token.hex()}",\n  "root": "0x{self.root.hex()}",\n  "claims": {{')
+            for index, (account, amount, proof) in enumerate(self.proofs()):
+                separator = "," if index else ""
+                proof_json = json.dumps([f"0x{node.hex()}" for node in proof])
+                f.write(f'{separator}\n    "0x{account.hex()}": {{"amount": "{amount}", "proof": {proof_json}}}')
+            f.write("\n  }\n}")
+
+
+class MerkleProofFile:
+    """
+    Read-only view of a proof file written by MerkleTree.write.
+
+    The file is memory-mapped: a lookup is one hash table probe sequence plus
+    one sibling read per tree level, and nothing is loaded up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.leaf_count, self.table_size, token, root = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a Merkle proof file")
+        self.token = f"0x{token.hex()}"
+        self.root = f"0x{root.hex()}"
+        self._mask = self.table_size - 1
+        self._table_offset = HEADER.size
+        self._leaves_offset = self._table_offset + 4 * self.table_size
+        self._level_offsets = []
+        offset = self._leaves_offset + LEAF_SIZE * self.leaf_count
+        for size in level_sizes(self.leaf_count):
+            self._level_offsets.append((offset, size))
+            offset += NODE_SIZE * size
+
+    def __len__(self):
+        return self.leaf_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _read_u32(self, slot):
+        return int.from_bytes(self._mmap[self._table_offset + 4 * slot:self._table_offset + 4 * slot + 4], "little")
+
+    def index_of(self, address):
+        """:return: Leaf index of `address`, or None if it has no claim."""
+        account = address_bytes(address)
+        slot = _slot(account, self._mask)
+        while True:
+            entry = self._read_u32(slot)
+            if not entry:
+                return None
+            offset = self._leaves_offset + LEAF_SIZE * (entry - 1)
+            if self._mmap[offset:offset + 20] == account:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+
+    def proof(self, index):
+        proof = []
+        for offset, size in self._level_offsets[:-1]:
+            sibling = index ^ 1
+            if sibling < size:
+                proof.append(self._mmap[offset + NODE_SIZE * sibling:offset + NODE_SIZE * (sibling + 1)])
+            index //= 2
+        return proof
+
+    def lookup(self, address):
+        """
+        :return: {"amount", "proof", "leaf"} for `address` (hex strings, amount
+            in wei as a decimal string), or None if it has no claim.
+        """
+        index = self.index_of(address)
+        if index is None:
+            return None
+        offset = self._leaves_offset + LEAF_SIZE * index
+        leaf_offset, _ = self._level_offsets[0]
+        return {
+            "amount": str(int.from_bytes(self._mmap[offset + 20:offset + LEAF_SIZE], "big")),
+            "proof": [f"0x{node.hex()}" for node in self.proof(index)],
+            "leaf": f"0x{self._mmap[leaf_offset + NODE_SIZE * index:leaf_offset + NODE_SIZE * (index + 1)].hex()}"
+        }
+
+
+def read_merkl_claims(merkl_file):
+    """
+    Stream the recipients of a MERKL format file.
+
+    :return: (reward token, list of (recipient, amount in wei)); a recipient's
+        amount is the sum of all its reward reasons.
+    """
+    token = None
+    claims = []
+    with open(merkl_file, "r", encoding="utf-8") as f:
+        stream = ObjectStream(f)
+        for key in stream.members():
+            if key == "rewardToken":
+                token = stream.read_value()
+            elif key == "rewards":
+                for recipient, reasons in stream.iter_object():
+                    claims.append((recipient, sum(int(amount) for amount in reasons.values())))
+    if token is None:
+        raise ValueError(f"Invalid MERKL file {merkl_file}: 'rewardToken' not found")
+    return token, claims
+
+
+def tree_file_for(merkl_file):
+    return f"{os.path.splitext(merkl_file)[0]}.tree"
+
+
+def build_tree_for_merkl_file(merkl_file, output_file=None):
+    """
+    Build the Merkle tree for a MERKL format file and write its proof file
+    (by default next to it, with a .tree extension).
+
+    :return: The MerkleTree.
+    """
+    token, claims = read_merkl_claims(merkl_file)
+    tree = MerkleTree(token, claims)
+    tree.write(output_file or tree_file_for(merkl_file))
+    return tree
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build MERKL distribution Merkle trees and look up proofs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build proof files for MERKL format files")
+    build_parser.add_argument("merkl_files", nargs="+", help="MERKL format JSON files")
+    build_parser.add_argument("--proofs-json", action="store_true", help="Also write every proof to {file}_proofs.json")
+
+    proof_parser = subparsers.add_parser("proof", help="Print the claim and proof of an address")
+    proof_parser.add_argument("tree_file", help="Proof file written by 'build'")
+    proof_parser.add_argument("address", help="Recipient address")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for merkl_file in args.merkl_files:
+            started = time.perf_counter()
+            tree = build_tree_for_merkl_file(merkl_file)
+            print(f"{merkl_file}: {len(tree)} recipients, root 0x{tree.root.hex()} ({time.perf_counter() - started:.2f}s)")
+            print(f"  Proof file saved to: {tree_file_for(merkl_file)}")
+            if args.proofs_json:
+                proofs_file = f"{os.path.splitext(merkl_file)[0]}_proofs.json"
+                tree.write_proofs_json(proofs_file)
+                print(f"  Proofs saved to: {proofs_file}")
+    else:
+        with MerkleProofFile(args.tree_file) as proof_file:
+            claim = proof_file.lookup(args.address)
+            if claim is None:
+                print(f"No claim for {args.address} in {args.tree_file}")
+                sys.exit(1)
+            print(json.dumps({"rewardToken": proof_file.token, "root": proof_file.root, "address": args.address, **claim}, indent=2))
@@ -1,264 +1,543 @@
 import json
 import os
-import re
+import sys
+import heapq
 import argparse
+import tempfile
 from decimal import Decimal
 
+# Add the parent directory to sys.path to enable relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.json_stream import ObjectStream
+from utils.merkl_converter import ARB_TOKEN_ADDRESS, T_TOKEN_ADDRESS, ARB_REWARD_LABEL, T_REWARD_LABEL
+from utils.rewards_validator import RewardTotals, read_rewards, from_wei
+
+TOKEN_TYPES = {
+    ARB_TOKEN_ADDRESS: ("ARB", ARB_REWARD_LABEL),
+    T_TOKEN_ADDRESS: ("T", T_REWARD_LABEL),
+}
+
+# Share of a provider's ARB reward USD value paid out in T (RewardsCalculator.calculate_rewards)
+T_USD_SHARE = Decimal('0.25')
+# Rewards files keep 8 decimals, so every amount may be truncated by up to 1e-8 tokens
+TRUNCATION_WEI = 10 ** 10
+# Relative deviation from the expected T amount allowed on top of truncation
+RATIO_TOLERANCE = Decimal('0.000001')
+RATIO_SCALE = 10 ** 18
+
+# Findings kept per check in the results; all of them go to the findings file
+REPORT_EXAMPLES = 100
+PRINTED_ERRORS = 10
+
+# Memory budget for sorting recipients; files with more recipients are sorted on disk
+DEFAULT_MEMORY_MB = 256
+# Sort record: 20-byte address and 32-byte big-endian amount
+RECORD_SIZE = 20 + 32
+# Approximate in-memory size of one record (bytes object plus list slot)
+RECORD_MEMORY = 100
+
+
+def parse_address(address):
+    """:return: The 20 bytes of a "0x" + 40 hex digit address, None if it is malformed."""
+    if len(address) != 42 or not address.startswith('0x'):
+        return None
+    try:
+        address_bytes = bytes.fromhex(address[2:])
+    except ValueError:
+        return None
+    # fromhex skips whitespace between bytes, which leaves fewer than 20
+    return address_bytes if len(address_bytes) == 20 else None
+
 
 def validate_ethereum_address(address):
     """Validate Ethereum address format."""
-    pattern = re.compile(r'^0x[a-fA-F0-9]{40}$')
-    return bool(pattern.match(address))
+    return parse_address(address) is not None
+
+
+class Findings:
+    """
+    Validation findings of one file or pair: counted per check, with the first
+    REPORT_EXAMPLES of each check kept and every finding optionally streamed
+    to a JSON Lines file, so memory stays bounded however many there are.
+    """
+
+    def __init__(self, source, details_file=None):
+        self.source = source
+        self.counts = {}
+        self.examples = {}
+        self._details_file = details_file
+
+    def add(self, check, message, **fields):
+        count = self.counts.get(check, 0)
+        self.counts[check] = count + 1
+        if count < REPORT_EXAMPLES:
+            self.examples.setdefault(check, []).append({"message": message, **fields})
+        if self._details_file is not None:
+            self._details_file.write(json.dumps({"source": self.source, "check": check, "message": message, **fields}) + "\n")
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def messages(self):
+        return [example["message"] for examples in self.examples.values() for example in examples]
+
+    def to_dict(self):
+        return {"counts": dict(self.counts), "examples": self.examples}
+
+
+class ExternalSorter:
+    """
+    Sorts fixed-size byte records within a memory budget. Records are sorted
+    in runs of at most `max_records`; full runs are written to `tmp_dir` and
+    merged back when iterating.
+    """
+
+    def __init__(self, record_size, max_records, tmp_dir):
+        self.record_size = record_size
+        self.max_records = max(max_records, 1)
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, record):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.max_records:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort()
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.run')
+        with os.fdopen(fd, 'wb', buffering=1 << 20) as f:
+            f.write(b''.join(self._buffer))
+        self._runs.append(path)
+        self._buffer = []
+
+    def _read_run(self, path):
+        record_size = self.record_size
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(record_size * 16384)
+                if not block:
+                    return
+                for offset in range(0, len(block), record_size):
+                    yield block[offset:offset + record_size]
+
+    def __iter__(self):
+        if not self._runs:
+            self._buffer.sort()
+            return iter(self._buffer)
+        if self._buffer:
+            self._spill()
+        return heapq.merge(*(self._read_run(path) for path in self._runs))
+
+
+def sorted_recipients(sorter, findings):
+    """
+    Yield (address bytes, amount in wei) in address order, reporting
+    recipients that appear more than once (only the first is kept).
+    """
+    previous = None
+    for record in sorter:
+        address = record[:20]
+        if address == previous:
+            findings.add("duplicate_recipient", f"Duplicate recipient: 0x{address.hex()}", recipient=f"0x{address.hex()}")
+            continue
+        previous = address
+        yield address, int.from_bytes(record[20:], 'big')
+
 
+def scan_merkl_file(merkl_file, token_type, findings, sorter):
+    """
+    Stream a MERKL file once, checking its structure, addresses and amounts.
+    Every well-formed recipient is added to `sorter`.
 
-def validate_merkl_file(merkl_file, token_type=None):
+    :return: Statistics dictionary; amounts are integers in wei.
     """
-    Validate a MERKL format JSON file.
-    
+    stats = {
+        "total_recipients": 0,
+        "total_amount": 0,
+        "min_amount": None,
+        "max_amount": 0,
+        "token_type": None,
+    }
+    expected_reason = None
+    found_token = False
+    found_rewards = False
+
+    with open(merkl_file, 'r', encoding='utf-8') as f:
+        stream = ObjectStream(f)
+        for key in stream.members():
+            if key == "rewardToken":
+                found_token = True
+                token_address = stream.read_value()
+                if token_address not in TOKEN_TYPES:
+                    findings.add("invalid_token", f"Invalid token address: {token_address}")
+                    return stats
+                stats["token_type"], expected_reason = TOKEN_TYPES[token_address]
+                # If token_type is specified, ensure it matches
+                if token_type and token_type.upper() != stats["token_type"]:
+                    findings.add("token_mismatch", f"Expected token type {token_type}, but found {stats['token_type']}")
+                    return stats
+            elif key == "rewards":
+                found_rewards = True
+                if expected_reason is None:
+                    findings.add("token_order", "'rewardToken' must be present before 'rewards'")
+                    return stats
+                total_amount, min_amount, max_amount = 0, None, 0
+                add_record = sorter.add
+                for recipient, reward_data in stream.iter_object():
+                    stats["total_recipients"] += 1
+                    # Validate recipient address
+                    address = parse_address(recipient)
+                    if address is None:
+                        findings.add("invalid_address", f"Invalid recipient address: {recipient}", recipient=recipient)
+                        continue
+
+                    # Validate reward data structure
+                    if type(reward_data) is not dict or len(reward_data) != 1:
+                        findings.add("invalid_reward_data", f"Invalid reward data for {recipient}: {reward_data}", recipient=recipient)
+                        continue
+
+                    # Validate reward reason
+                    reward_amount_str = reward_data.get(expected_reason)
+                    if reward_amount_str is None:
+                        findings.add("missing_reason", f"Missing expected reason '{expected_reason}' for {recipient}", recipient=recipient)
+                        continue
+
+                    # Validate reward amount
+                    if type(reward_amount_str) is not str or not reward_amount_str.isascii() or not reward_amount_str.isdigit():
+                        findings.add("invalid_amount", f"Invalid reward amount for {recipient}: {reward_amount_str}", recipient=recipient)
+                        continue
+
+                    reward_amount = int(reward_amount_str)
+                    total_amount += reward_amount
+                    if min_amount is None or reward_amount < min_amount:
+                        min_amount = reward_amount
+                    if reward_amount > max_amount:
+                        max_amount = reward_amount
+                    add_record(address + reward_amount.to_bytes(32, 'big'))
+                stats.update(total_amount=total_amount, min_amount=min_amount, max_amount=max_amount)
+            else:
+                stream.skip_value()
+
+    # Check file structure
+    if not found_token:
+        findings.add("missing_field", "Missing 'rewardToken' field")
+    if not found_rewards:
+        findings.add("missing_field", "Missing 'rewards' field")
+    elif stats["total_recipients"] == 0 and expected_reason is not None:
+        findings.add("no_rewards", "No rewards found")
+    return stats
+
+
+def _readable_stats(stats):
+    readable = {
+        "token_type": stats["token_type"],
+        "total_recipients": stats["total_recipients"],
+        "total_amount": str(stats["total_amount"]),
+        "min_amount": None if stats["min_amount"] is None else str(stats["min_amount"]),
+        "max_amount": str(stats["max_amount"]),
+        # Human-readable amounts (18 decimals)
+        "total_amount_readable": float(from_wei(stats["total_amount"])),
+        "min_amount_readable": None if stats["min_amount"] is None else float(from_wei(stats["min_amount"])),
+        "max_amount_readable": float(from_wei(stats["max_amount"])),
+    }
+    return readable
+
+
+def _file_results(merkl_file, stats, findings):
+    return {
+        "file": merkl_file,
+        "valid": len(findings) == 0,
+        "errors": findings.messages(),
+        "findings": findings.to_dict(),
+        "stats": _readable_stats(stats),
+    }
+
+
+def print_file_results(results):
+    stats = results["stats"]
+    error_count = sum(results["findings"]["counts"].values())
+    if results["valid"]:
+        print(f"✓ File is valid MERKL format for {stats['token_type']} token")
+    else:
+        print(f"✗ File validation failed with {error_count} errors")
+
+    print(f"\nStatistics:")
+    print(f"  - Token type: {stats['token_type']}")
+    print(f"  - Total recipients: {stats['total_recipients']}")
+    print(f"  - Total amount: {stats['total_amount_readable']} {stats['token_type']}")
+    print(f"  - Min amount: {stats['min_amount_readable']} {stats['token_type']}")
+    print(f"  - Max amount: {stats['max_amount_readable']} {stats['token_type']}")
+
+    if results["errors"]:
+        print("\nErrors:")
+        for i, error in enumerate(results["errors"][:PRINTED_ERRORS], 1):
+            print(f"  {i}. {error}")
+
+        if error_count > PRINTED_ERRORS:
+            print(f"  ... and {error_count - PRINTED_ERRORS} more errors")
+
+
+def write_report(report_file, results):
+    with open(report_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nReport saved to: {report_file}")
+
+
+def findings_file_for(report_file):
+    return f"{os.path.splitext(report_file)[0]}.findings.jsonl"
+
+
+def _open_findings_file(report_file):
+    if not report_file:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+    return open(findings_file_for(report_file), 'w', buffering=1 << 20)
+
+
+def validate_merkl_file(merkl_file, token_type=None, memory_mb=DEFAULT_MEMORY_MB, report_file=None):
+    """
+    Validate a MERKL format JSON file in one streaming pass.
+
     Parameters:
     - merkl_file: Path to the MERKL format JSON file
     - token_type: "ARB" or "T" to validate specific token, None for any token
-    
+    - memory_mb: Memory budget for the duplicate check; larger files are sorted on disk
+    - report_file: Optional path of a JSON report; every finding is also written
+      to the matching .findings.jsonl file
+
     Returns:
     - Dictionary with validation results
     """
+    details_file = _open_findings_file(report_file)
     try:
         print(f"Validating MERKL file: {merkl_file}")
-        
-        with open(merkl_file, 'r') as f:
-            data = json.load(f)
-        
-        # Define expected token addresses
-        arb_token_address = "0x912ce59144191c1204e64559fe8253a0e49e6548"  # Replace with your new ARB token address
-        t_token_address = "0xcdf7028ceab81fa0c6971208e83fa7872994bee5"  # Replace with your new T token address
-        
-        # Initialize validation results
-        results = {
-            "valid": True,
-            "errors": [],
-            "warnings": [],
-            "stats": {
-                "total_recipients": 0,
-                "total_amount": Decimal('0'),
-                "min_amount": None,
-                "max_amount": Decimal('0'),
-                "token_type": None,
-            },
-            "rewards": None  # Will store the rewards data for pair validation
-        }
-        
-        # 1. Check file structure
-        if "rewardToken" not in data:
-            results["valid"] = False
-            results["errors"].append("Missing 'rewardToken' field")
-        
-        if "rewards" not in data:
-            results["valid"] = False
-            results["errors"].append("Missing 'rewards' field")
-            return results  # Can't continue validation without rewards field
-        
-        # Store rewards data for pair validation
-        results["rewards"] = data.get("rewards", {})
-        
-        # 2. Validate token address
-        token_address = data.get("rewardToken", "")
-        if token_address == arb_token_address:
-            results["stats"]["token_type"] = "ARB"
-            expected_reason = "TLP reward in ARB tokens"
-        elif token_address == t_token_address:
-            results["stats"]["token_type"] = "T"
-            expected_reason = "TLP reward in T tokens"
-        else:
-            results["valid"] = False
-            results["errors"].append(f"Invalid token address: {token_address}")
-            return results
-        
-        # If token_type is specified, ensure it matches
-        if token_type and token_type.upper() != results["stats"]["token_type"]:
-            results["valid"] = False
-            results["errors"].append(f"Expected token type {token_type}, but found {results['stats']['token_type']}")
-            return results
-        
-        # 3. Validate rewards
-        rewards = data.get("rewards", {})
-        if not rewards:
-            results["valid"] = False
-            results["errors"].append("No rewards found")
-            return results
-        
-        results["stats"]["total_recipients"] = len(rewards)
-        
-        for recipient, reward_data in rewards.items():
-            # Validate recipient address
-            if not validate_ethereum_address(recipient):
-                results["valid"] = False
-                results["errors"].append(f"Invalid recipient address: {recipient}")
-            
-            # Validate reward data structure
-            if not isinstance(reward_data, dict) or len(reward_data) != 1:
-                results["valid"] = False
-                results["errors"].append(f"Invalid reward data for {recipient}: {reward_data}")
-                continue
-            
-            # Validate reward reason
-            if expected_reason not in reward_data:
-                results["valid"] = False
-                results["errors"].append(f"Missing expected reason '{expected_reason}' for {recipient}")
-                continue
-            
-            # Validate reward amount
-            reward_amount_str = reward_data.get(expected_reason, "")
-            if not reward_amount_str or not reward_amount_str.isdigit():
-                results["valid"] = False
-                results["errors"].append(f"Invalid reward amount for {recipient}: {reward_amount_str}")
-                continue
-            
-            # Convert and track statistics
-            reward_amount = Decimal(reward_amount_str)
-            results["stats"]["total_amount"] += reward_amount
-            
-            if results["stats"]["min_amount"] is None or reward_amount < results["stats"]["min_amount"]:
-                results["stats"]["min_amount"] = reward_amount
-                
-            if reward_amount > results["stats"]["max_amount"]:
-                results["stats"]["max_amount"] = reward_amount
-        
-        # Convert to human-readable format (assuming 18 decimals)
-        decimals = Decimal('1000000000000000000')
-        results["stats"]["total_amount_readable"] = float(results["stats"]["total_amount"] / decimals)
-        
-        if results["stats"]["min_amount"] is not None:
-            results["stats"]["min_amount_readable"] = float(results["stats"]["min_amount"] / decimals)
-        
-        if results["stats"]["max_amount"] is not None:
-            results["stats"]["max_amount_readable"] = float(results["stats"]["max_amount"] / decimals)
-        
-        # Print validation results
-        if results["valid"]:
-            print(f"✓ File is valid MERKL format for {results['stats']['token_type']} token")
-        else:
-            print(f"✗ File validation failed with {len(results['errors'])} errors")
-        
-        print(f"\nStatistics:")
-        print(f"  - Token type: {results['stats']['token_type']}")
-        print(f"  - Total recipients: {results['stats']['total_recipients']}")
-        print(f"  - Total amount: {results['stats']['total_amount_readable']} {results['stats']['token_type']}")
-        print(f"  - Min amount: {results['stats']['min_amount_readable']} {results['stats']['token_type']}")
-        print(f"  - Max amount: {results['stats']['max_amount_readable']} {results['stats']['token_type']}")
-        
-        if results["errors"]:
-            print("\nErrors:")
-            for i, error in enumerate(results["errors"][:10], 1):
-                print(f"  {i}. {error}")
-            
-            if len(results["errors"]) > 10:
-                print(f"  ... and {len(results['errors']) - 10} more errors")
-        
+        findings = Findings(merkl_file, details_file)
+        with tempfile.TemporaryDirectory(prefix='merkl_sort_') as tmp_dir:
+            sorter = ExternalSorter(RECORD_SIZE, memory_mb * 2 ** 20 // RECORD_MEMORY, tmp_dir)
+            stats = scan_merkl_file(merkl_file, token_type, findings, sorter)
+            for _ in sorted_recipients(sorter, findings):
+                pass
+
+        results = _file_results(merkl_file, stats, findings)
+        print_file_results(results)
+        if report_file:
+            write_report(report_file, results)
         return results
-    
+
     except Exception as e:
         print(f"Error validating MERKL file: {str(e)}")
-        return {"valid": False, "errors": [str(e)]}
+        return {"file": merkl_file, "valid": False, "errors": [str(e)]}
+    finally:
+        if details_file is not None:
+            details_file.close()
+
+
+def expected_t_ratio(rewards_file):
+    """
+    :return: Expected T tokens per ARB token from the snapshot prices in a
+        rewards file: T_USD_SHARE * ARB price / T price.
+    """
+    totals = RewardTotals()
+    read_rewards(rewards_file, totals.add)
+    if not totals.arb_tokens or not totals.t_tokens or not totals.t_usd:
+        raise ValueError(f"Cannot derive token prices from {rewards_file}")
+    arb_price = Decimal(totals.arb_usd) / Decimal(totals.arb_tokens)
+    t_price = Decimal(totals.t_usd) / Decimal(totals.t_tokens)
+    return T_USD_SHARE * arb_price / t_price
+
+
+def matched_ratio(arb_sorter, t_sorter):
+    """
+    :return: Total T over total ARB amount of the recipients present in both
+        files, from a sorted-merge pass over the two sorters.
+    """
+    arb_total = t_total = 0
+    arb_records = iter(arb_sorter)
+    t_records = iter(t_sorter)
+    arb = next(arb_records, None)
+    t = next(t_records, None)
+    while arb is not None and t is not None:
+        if arb[:20] < t[:20]:
+            arb = next(arb_records, None)
+        elif t[:20] < arb[:20]:
+            t = next(t_records, None)
+        else:
+            arb_total += int.from_bytes(arb[20:], 'big')
+            t_total += int.from_bytes(t[20:], 'big')
+            arb = next(arb_records, None)
+            t = next(t_records, None)
+    return Decimal(t_total) / Decimal(arb_total) if arb_total else Decimal(0)
+
+
+def compare_recipients(arb_recipients, t_recipients, ratio, findings):
+    """
+    Sorted-merge join of the ARB and T recipients. Reports recipients present
+    in only one file and T amounts that deviate from ARB amount * `ratio` by
+    more than rounding allows.
+
+    :return: Pair statistics.
+    """
+    ratio_scaled = int(ratio * RATIO_SCALE)
+    tolerance_scaled = int(RATIO_TOLERANCE * RATIO_SCALE)
+    # Truncation of the ARB amount carries over scaled by the ratio, plus the T amount's own
+    truncation_allowance = TRUNCATION_WEI + TRUNCATION_WEI * ratio_scaled // RATIO_SCALE
+    stats = {"matched": 0, "missing_in_arb": 0, "missing_in_t": 0, "ratio_mismatches": 0, "max_ratio_deviation": 0}
+
+    arb = next(arb_recipients, None)
+    t = next(t_recipients, None)
+    while arb is not None or t is not None:
+        if t is None or (arb is not None and arb[0] < t[0]):
+            recipient = f"0x{arb[0].hex()}"
+            stats["missing_in_t"] += 1
+            findings.add("missing_in_t", f"Recipient missing in T file: {recipient}", recipient=recipient)
+            arb = next(arb_recipients, None)
+            continue
+        if arb is None or t[0] < arb[0]:
+            recipient = f"0x{t[0].hex()}"
+            stats["missing_in_arb"] += 1
+            findings.add("missing_in_arb", f"Recipient missing in ARB file: {recipient}", recipient=recipient)
+            t = next(t_recipients, None)
+            continue
+
+        stats["matched"] += 1
+        arb_amount, t_amount = arb[1], t[1]
+        expected_t = arb_amount * ratio_scaled // RATIO_SCALE
+        deviation = abs(t_amount - expected_t)
+        if deviation > truncation_allowance + t_amount * tolerance_scaled // RATIO_SCALE:
+            recipient = f"0x{arb[0].hex()}"
+            relative = deviation / expected_t if expected_t else None
+            stats["ratio_mismatches"] += 1
+            stats["max_ratio_deviation"] = max(stats["max_ratio_deviation"], relative or 0)
+            findings.add(
+                "ratio_mismatch",
+                f"T amount for {recipient} is {t_amount}, expected {expected_t} from ARB amount {arb_amount}",
+                recipient=recipient, arb_amount=str(arb_amount), t_amount=str(t_amount),
+                expected_t_amount=str(expected_t), relative_deviation=relative
+            )
+        arb = next(arb_recipients, None)
+        t = next(t_recipients, None)
+    return stats
 
 
-def validate_merkl_pair(arb_file, t_file):
+def validate_merkl_pair(arb_file, t_file, rewards_file=None, memory_mb=DEFAULT_MEMORY_MB, report_file=None):
     """
     Validate both ARB and T MERKL files as a pair.
-    
+
+    Each file is streamed once; recipients are sorted (on disk beyond
+    `memory_mb`) and compared by a sorted merge.
+
     Parameters:
     - arb_file: Path to the ARB MERKL format JSON file
     - t_file: Path to the T MERKL format JSON file
-    
+    - rewards_file: Rewards file the pair was converted from. Its snapshot prices
+      give the expected T:ARB ratio; without it, the ratio of the T and ARB totals
+      of the recipients present in both files is used
+    - memory_mb: Memory budget for sorting recipients
+    - report_file: Optional path of a JSON report; every finding is also written
+      to the matching .findings.jsonl file
+
     Returns:
     - Dictionary with paired validation results
     """
     print("\n" + "="*50)
     print("Validating MERKL file pair")
     print("="*50)
-    
-    # Validate individual files
-    arb_results = validate_merkl_file(arb_file, "ARB")
-    print("\n" + "-"*50)
-    t_results = validate_merkl_file(t_file, "T")
-    
-    # Check if both files are individually valid
-    if not arb_results["valid"] or not t_results["valid"]:
-        print("\n✗ Paired validation failed: One or both files are invalid")
-        return {
-            "valid": False,
-            "arb_results": arb_results,
-            "t_results": t_results
-        }
-    
-    # Compare recipient lists
-    arb_recipients = set(arb_results["rewards"].keys())
-    t_recipients = set(t_results["rewards"].keys())
-    
-    # If we couldn't get the recipients, return early
-    if not arb_recipients or not t_recipients:
-        print("\n✗ Paired validation failed: Could not extract recipient lists")
-        return {
-            "valid": False,
-            "arb_results": arb_results,
-            "t_results": t_results
-        }
-    
-    # Conduct further validations 
-    # Check if recipient lists match
-    if arb_recipients != t_recipients:
-        missing_in_arb = t_recipients - arb_recipients
-        missing_in_t = arb_recipients - t_recipients
-        
-        print("\n✗ Recipient lists do not match between files")
-        
-        if missing_in_arb:
-            print(f"  - {len(missing_in_arb)} recipients missing in ARB file")
-            for addr in list(missing_in_arb)[:5]:
-                print(f"    - {addr}")
-            if len(missing_in_arb) > 5:
-                print(f"    - ... and {len(missing_in_arb) - 5} more")
-        
-        if missing_in_t:
-            print(f"  - {len(missing_in_t)} recipients missing in T file")
-            for addr in list(missing_in_t)[:5]:
-                print(f"    - {addr}")
-            if len(missing_in_t) > 5:
-                print(f"    - ... and {len(missing_in_t) - 5} more")
-                
-        return {
-            "valid": False,
+
+    details_file = _open_findings_file(report_file)
+    try:
+        arb_findings = Findings(arb_file, details_file)
+        t_findings = Findings(t_file, details_file)
+        pair_findings = Findings("pair", details_file)
+        max_records = memory_mb * 2 ** 20 // RECORD_MEMORY // 2
+
+        with tempfile.TemporaryDirectory(prefix='merkl_sort_') as tmp_dir:
+            # Validate individual files
+            print(f"Validating MERKL file: {arb_file}")
+            arb_sorter = ExternalSorter(RECORD_SIZE, max_records, tmp_dir)
+            arb_stats = scan_merkl_file(arb_file, "ARB", arb_findings, arb_sorter)
+            print(f"Validating MERKL file: {t_file}")
+            t_sorter = ExternalSorter(RECORD_SIZE, max_records, tmp_dir)
+            t_stats = scan_merkl_file(t_file, "T", t_findings, t_sorter)
+
+            if rewards_file:
+                ratio = expected_t_ratio(rewards_file)
+                ratio_source = "rewards_snapshot_prices"
+            else:
+                ratio = matched_ratio(arb_sorter, t_sorter)
+                ratio_source = "matched_recipient_totals"
+
+            pair_stats = compare_recipients(
+                sorted_recipients(arb_sorter, arb_findings),
+                sorted_recipients(t_sorter, t_findings),
+                ratio, pair_findings
+            )
+
+        arb_results = _file_results(arb_file, arb_stats, arb_findings)
+        t_results = _file_results(t_file, t_stats, t_findings)
+        pair_stats.update({"expected_t_per_arb": str(ratio), "ratio_source": ratio_source})
+        results = {
+            "valid": arb_results["valid"] and t_results["valid"] and len(pair_findings) == 0,
             "arb_results": arb_results,
             "t_results": t_results,
-            "missing_in_arb": missing_in_arb,
-            "missing_in_t": missing_in_t
+            "pair": {"stats": pair_stats, "findings": pair_findings.to_dict()}
         }
-    
-    # All validations passed
-    print("\n✓ Paired validation passed!")
-    print(f"  - ARB file recipients: {arb_results['stats']['total_recipients']}")
-    print(f"  - T file recipients: {t_results['stats']['total_recipients']}")
-    print(f"  - Total ARB amount: {arb_results['stats']['total_amount_readable']} ARB")
-    print(f"  - Total T amount: {t_results['stats']['total_amount_readable']} T")
-    
-    return {
-        "valid": True,
-        "arb_results": arb_results,
-        "t_results": t_results
-    }
+
+        print("\n" + "-"*50)
+        print(f"ARB file: {arb_file}")
+        print_file_results(arb_results)
+        print("\n" + "-"*50)
+        print(f"T file: {t_file}")
+        print_file_results(t_results)
+
+        print("\n" + "-"*50)
+        if results["valid"]:
+            print("\n✓ Paired validation passed!")
+        else:
+            print("\n✗ Paired validation failed")
+        print(f"  - Recipients in both files: {pair_stats['matched']}")
+        print(f"  - Recipients missing in ARB file: {pair_stats['missing_in_arb']}")
+        print(f"  - Recipients missing in T file: {pair_stats['missing_in_t']}")
+        print(f"  - Expected T per ARB: {ratio} ({ratio_source})")
+        print(f"  - T:ARB ratio mismatches: {pair_stats['ratio_mismatches']}")
+        print(f"  - Total ARB amount: {arb_results['stats']['total_amount_readable']} ARB")
+        print(f"  - Total T amount: {t_results['stats']['total_amount_readable']} T")
+        for message in pair_findings.messages()[:PRINTED_ERRORS]:
+            print(f"    - {message}")
+        if len(pair_findings) > PRINTED_ERRORS:
+            print(f"    - ... and {len(pair_findings) - PRINTED_ERRORS} more")
+
+        if report_file:
+            write_report(report_file, results)
+        return results
+
+    except Exception as e:
+        print(f"Error validating MERKL file pair: {str(e)}")
+        return {"valid": False, "errors": [str(e)]}
+    finally:
+        if details_file is not None:
+            details_file.close()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Validate MERKL format JSON files")
-    
+
     # Define mutually exclusive group to either validate a single file or a pair
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--file", help="Path to a single MERKL format JSON file")
-    group.add_argument("--pair", nargs=2, metavar=('ARB_FILE', 'T_FILE'), 
+    group.add_argument("--pair", nargs=2, metavar=('ARB_FILE', 'T_FILE'),
                       help="Paths to ARB and T MERKL format JSON files")
-    
+    parser.add_argument("--rewards", help="Rewards file the pair was converted from, for the T:ARB price ratio check")
+    parser.add_argument("--report", help="Write a JSON report here, and every finding to {report}.findings.jsonl")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB, help="Memory budget for sorting recipients")
+
     args = parser.parse_args()
-    
+
     if args.file:
-        validate_merkl_file(args.file)
+        results = validate_merkl_file(args.file, memory_mb=args.memory_mb, report_file=args.report)
     else:
-        validate_merkl_pair(args.pair[0], args.pair[1]) 
\ No newline at end of file
+        results = validate_merkl_pair(args.pair[0], args.pair[1], args.rewards, args.memory_mb, args.report)
+    sys.exit(0 if results["valid"] else 1)
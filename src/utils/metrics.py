@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from prometheus_client import (
+    Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+    generate_latest, CONTENT_TYPE_LATEST, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+from src.data.state_manager import load_state
+
+logger = logging.getLogger(__name__)
+
+# When PROMETHEUS_MULTIPROC_DIR is set (e.g. under gunicorn), every process writes its
+# samples to mmap'd files in that directory and /metrics aggregates them on scrape.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+STAGE_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+STAGE_DURATION = Histogram(
+    'tlp_stage_duration_seconds', 'Duration of main() pipeline stages', ['stage'], buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = Counter(
+    'tlp_stage_failures_total', 'Pipeline stages that raised', ['stage']
+)
+RPC_CALLS = Counter(
+    'tlp_rpc_calls_total', 'RPC calls made through call_with_retry', ['method', 'endpoint']
+)
+RPC_LATENCY = Histogram(
+    'tlp_rpc_latency_seconds', 'Latency of individual RPC attempts', ['method', 'endpoint']
+)
+RPC_RETRIES = Counter(
+    'tlp_rpc_retries_total', 'RPC attempts that were retried', ['method', 'endpoint']
+)
+RPC_RATE_LIMITED = Counter(
+    'tlp_rpc_rate_limited_total', 'RPC attempts answered with HTTP 429', ['method', 'endpoint']
+)
+EVENTS_FETCHED = Counter(
+    'tlp_events_fetched_total', 'Events durably stored by the event fetcher', ['pool']
+)
+BLOCKS_BEHIND_HEAD = Gauge(
+    'tlp_blocks_behind_head', 'Blocks between the chain tip and the lowest committed event cursor', multiprocess_mode='max'
+)
+LAST_RUN_TIMESTAMP = Gauge(
+    'tlp_last_successful_run_timestamp_seconds', 'Unix time of the last completed main() iteration', multiprocess_mode='max'
+)
+API_LATENCY = Histogram(
+    'tlp_api_request_duration_seconds', 'Flask API request latency', ['endpoint', 'method', 'status']
+)
+
+def rpc_endpoint_label(url):
+    """Host of an RPC URL; the path is dropped because it usually embeds the API key."""
+    if not url:
+        return 'unconfigured'
+    return urlparse(url).hostname or 'unknown'
+
+def rpc_method_label(func):
+    """
+    Best-effort name of a callable passed to call_with_retry without an
+    explicit rpc_method. web3 5.x eth methods are all closures named
+    "caller", so RPC call sites pass the JSON-RPC method instead.
+    """
+    name = getattr(func, '__name__', None)
+    if name is None and hasattr(func, 'func'):
+        name = getattr(func.func, '__name__', None)
+    return name or type(func).__name__
+
+@contextmanager
+def time_stage(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage=stage).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - started)
+
+class SnapshotCollector:
+    """Reports size and age of the latest rewards snapshot, read from state at scrape time."""
+
+    def collect(self):
+        size = GaugeMetricFamily('tlp_snapshot_size_bytes', 'Size of the latest rewards snapshot file')
+        age = GaugeMetricFamily('tlp_snapshot_age_seconds', 'Seconds since the latest rewards snapshot was written')
+        latest_rewards_file = load_state().get('latest_rewards_file')
+        if latest_rewards_file and os.path.exists(latest_rewards_file):
+            stat = os.stat(latest_rewards_file)
+            size.add_metric([], stat.st_size)
+            age.add_metric([], time.time() - stat.st_mtime)
+        yield size
+        yield age
+
+if not MULTIPROCESS:
+    REGISTRY.register(SnapshotCollector())
+
+def render_metrics():
+    """
+    :return: Tuple (body, content_type) for the /metrics endpoint.
+    """
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    # Aggregate the per-process sample files on every scrape
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(SnapshotCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid):
+    """Clean up a dead worker's live gauges (call from gunicorn's child_exit hook)."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
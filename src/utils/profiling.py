@@ -0,0 +1,106 @@
+import os
+import io
+import pstats
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from src.config import PROFILE_ENABLED, PROFILE_EVERY, PROFILE_DIR, PROFILE_TOP_ALLOCATIONS
+
+logger = logging.getLogger(__name__)
+
+# Returned for every stage of an unprofiled run, so disabled profiling costs one attribute check
+_DISABLED = nullcontext()
+
+class RunProfiler:
+    """
+    Profiles the stages of sampled main() runs.
+
+    For each stage of a sampled run it writes to logs/profiles/<run>/:
+    - <stage>.pstats: cProfile stats (open with `python -m pstats` or snakeviz)
+    - <stage>.txt: top functions by cumulative time
+    - <stage>.alloc.txt: peak traced memory, the allocation sites that grew
+      most during the stage and the top sites still live at its end
+    """
+
+    def __init__(self, enabled=PROFILE_ENABLED, every=PROFILE_EVERY, base_dir=PROFILE_DIR):
+        self.base_dir = base_dir
+        self.run_count = 0
+        self.run_dir = None
+        self.configure(enabled, every)
+
+    def configure(self, enabled=None, every=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if every is not None:
+            self.every = max(int(every), 1)
+
+    def begin_run(self):
+        """Start a main() iteration; decides whether its stages are profiled."""
+        self.run_count += 1
+        self.run_dir = None
+        if not self.enabled or (self.run_count - 1) % self.every:
+            return False
+        run_name = f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_run{self.run_count}"
+        self.run_dir = os.path.join(self.base_dir, run_name)
+        os.makedirs(self.run_dir, exist_ok=True)
+        logger.info(f"Profiling run {self.run_count} into {self.run_dir}")
+        return True
+
+    def stage(self, name):
+        if self.run_dir is None:
+            return _DISABLED
+        return self._profile_stage(name)
+
+    @contextmanager
+    def _profile_stage(self, name):
+        run_dir = self.run_dir
+        # Leave tracemalloc alone if something else (e.g. a benchmark) is already tracing
+        owns_tracemalloc = not tracemalloc.is_tracing()
+        if owns_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            end = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if owns_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write_stage(run_dir, name, profiler, start, end, current, peak)
+            except OSError as e:
+                logger.error(f"Failed to write profile for stage {name}: {e}")
+
+    def _write_stage(self, run_dir, name, profiler, start, end, current, peak):
+        profiler.dump_stats(os.path.join(run_dir, f"{name}.pstats"))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+        with open(os.path.join(run_dir, f"{name}.txt"), 'w') as f:
+            f.write(summary.getvalue())
+
+        filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        )
+        start, end = start.filter_traces(filters), end.filter_traces(filters)
+        with open(os.path.join(run_dir, f"{name}.alloc.txt"), 'w') as f:
+            f.write(f"Stage: {name}\n")
+            f.write(f"Peak traced memory: {peak / 2**20:.2f} MiB\n")
+            f.write(f"Still allocated at stage end: {current / 2**20:.2f} MiB\n\n")
+            # Allocated and freed within the stage shows up in neither list, only in the peak
+            f.write(f"Top {PROFILE_TOP_ALLOCATIONS} allocation sites by growth during the stage:\n")
+            for stat in end.compare_to(start, 'lineno')[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {PROFILE_TOP_ALLOCATIONS} allocation sites still live at stage end:\n")
+            for stat in end.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        logger.info(f"Profiled stage {name}: peak {peak / 2**20:.2f} MiB")
+
+run_profiler = RunProfiler()
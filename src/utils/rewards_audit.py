@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import json
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Add the parent directory to sys.path to enable relative imports, and the
+# repository root for the program configuration and price data
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.rewards_validator import read_rewards
+
+AUDIT_FIELDS = (
+    "weighted_avg_liquidity",
+    "estimated_reward_in_arb_tokens",
+    "estimated_reward_in_arb_usd",
+    "estimated_reward_in_t_usd",
+    "estimated_reward_in_t_tokens",
+)
+# The snapshot is computed a few seconds before it is saved, which shifts every
+# provider's last balance interval slightly, so the relative tolerance is loose
+DEFAULT_RTOL = 1e-4
+# Snapshot values are truncated to 8 decimals
+DEFAULT_ATOL = 1e-6
+DEFAULT_TOP = 20
+
+_SNAPSHOT_NAME = re.compile(r'rewards_(\d{8}_\d{6})')
+# A provider member of daily_balances.json and the fields of its daily balances
+_PROVIDER_VALUE = re.compile(r'\{\s*"balances"\s*:')
+_BALANCE_DATE = re.compile(r'"balance_date"\s*:\s*"([^"]*)"')
+_TOTAL_USD_BALANCE = re.compile(r'"total_usd_balance"\s*:\s*(-?[0-9][0-9.eE+-]*)')
+
+
+def snapshot_time(rewards_file):
+    """
+    :return: When a rewards file was generated: the local timestamp in its
+        rewards_YYYYmmdd_HHMMSS name (see json_logger.save_json_data), or its
+        modification time.
+    """
+    match = _SNAPSHOT_NAME.search(os.path.basename(rewards_file))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").astimezone(timezone.utc)
+    return datetime.fromtimestamp(os.path.getmtime(rewards_file), timezone.utc)
+
+
+def _escaped(buf, pos):
+    """:return: True if the character at `pos` follows an odd number of backslashes."""
+    backslashes = 0
+    while pos > backslashes and buf[pos - backslashes - 1] == '\\':
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _provider_members(buf):
+    """:return: [(provider, key offset, value offset)] for the providers found in `buf`."""
+    members = []
+    # Searching for the keys themselves is much slower than for the literal
+    # after them, so each key is read backwards from its value
+    for value in _PROVIDER_VALUE.finditer(buf):
+        close = buf.rfind('"', 0, value.start())
+        if close < 0 or buf[close + 1:value.start()].strip() != ':':
+            continue
+        start = buf.rfind('"', 0, close)
+        while start > 0 and _escaped(buf, start):
+            start = buf.rfind('"', 0, start)
+        if start >= 0:
+            members.append((buf[start + 1:close], start, value.end()))
+    return members
+
+
+def _provider_values(f, chunk_size=1 << 24):
+    """
+    Yield (provider, value text) for each member of a daily balances file,
+    reading it in chunks. A provider's value is the text up to the next
+    provider key; only complete values are yielded.
+    """
+    buf = ''
+    while True:
+        chunk = f.read(chunk_size)
+        buf += chunk
+        members = _provider_members(buf)
+        # The last provider may continue in the next chunk
+        complete = len(members) if not chunk else len(members) - 1
+        for i in range(complete):
+            key, _, value_start = members[i]
+            end = members[i + 1][1] if i + 1 < len(members) else len(buf)
+            yield json.loads(f'"{key}"') if '\\' in key else key, buf[value_start:end]
+        if not chunk:
+            return
+        if members:
+            buf = buf[members[-1][1]:]
+
+
+def load_daily_balance_arrays(daily_balances_file):
+    """
+    Flatten daily_balances.json into arrays.
+
+    Fully decoding the file costs more than the whole audit, so only
+    balance_date and total_usd_balance are extracted from each provider's
+    balances, in order.
+
+    :return: (providers, counts, times, usd) where counts[i] is the number of
+        daily balances of providers[i], and times (epoch seconds) and usd
+        (total_usd_balance) hold every provider's balances back to back.
+    """
+    providers = []
+    counts = []
+    times = []
+    usd = []
+    date_seconds = {}
+    with open(daily_balances_file, 'r', encoding='utf-8') as f:
+        for provider, value in _provider_values(f):
+            dates = _BALANCE_DATE.findall(value)
+            balances = _TOTAL_USD_BALANCE.findall(value)
+            if len(dates) != len(balances):
+                raise ValueError(f"Daily balances of {provider} are missing balance_date or total_usd_balance fields")
+            for date in set(dates).difference(date_seconds):
+                # A few dozen distinct days are shared by every provider
+                date_seconds[date] = datetime.fromisoformat(date).timestamp()
+            providers.append(provider)
+            counts.append(len(dates))
+            times.extend(map(date_seconds.__getitem__, dates))
+            usd.extend(map(float, balances))
+    return (
+        providers,
+        np.array(counts, dtype=np.int64),
+        np.array(times, dtype=np.float64),
+        np.array(usd, dtype=np.float64),
+    )
+
+
+def load_store_balance_arrays(store):
+    """:return: load_daily_balance_arrays()'s arrays, read from a DailyBalanceStore."""
+    from src.data.balance_store import DAY_SECONDS
+
+    columns = store.read_columns()
+    ids, counts = np.unique(columns["provider"], return_counts=True)
+    providers = store.providers()
+    return (
+        [providers[i] for i in ids.tolist()],
+        counts.astype(np.int64),
+        columns["day"].astype(np.float64) * DAY_SECONDS,
+        columns["total_usd"],
+    )
+
+
+def recompute_rewards(counts, times, usd, start_date, end_date, as_of, total_rewards, arb_price, t_price, t_reward_ratio):
+    """
+    Recompute RewardsCalculator's per-provider results with array math.
+
+    Each daily balance is weighted by the time until the provider's next
+    balance, the last one until min(as_of, end_date); a provider's weighted
+    average liquidity is that sum over the program duration.
+
+    :return: {field: array} for AUDIT_FIELDS, in provider order.
+    """
+    provider_count = len(counts)
+    ends = np.cumsum(counts)
+    next_times = np.empty_like(times)
+    next_times[:-1] = times[1:]
+    next_times[ends[counts > 0] - 1] = min(as_of, end_date).timestamp()
+
+    provider_index = np.repeat(np.arange(provider_count), counts)
+    liquidity_time = np.bincount(provider_index, weights=usd * (next_times - times), minlength=provider_count)
+    weighted_avg_liquidity = liquidity_time / (end_date - start_date).total_seconds()
+
+    total_weighted_liquidity = weighted_avg_liquidity.sum()
+    if total_weighted_liquidity > 0:
+        arb_tokens = weighted_avg_liquidity / total_weighted_liquidity * total_rewards
+    else:
+        arb_tokens = np.zeros(provider_count)
+    arb_usd = arb_tokens * arb_price
+    t_usd = arb_usd * t_reward_ratio
+    t_tokens = t_usd / t_price if t_price else np.zeros(provider_count)
+
+    return dict(zip(AUDIT_FIELDS, (weighted_avg_liquidity, arb_tokens, arb_usd, t_usd, t_tokens)))
+
+
+def load_snapshot_arrays(rewards_file):
+    """:return: (providers, {field: array}, header) for the rewards of a snapshot."""
+    providers = []
+    rows = []
+
+    def collect(reward):
+        providers.append(reward.get("provider", ""))
+        rows.append([float(reward.get(field, 0)) for field in AUDIT_FIELDS])
+
+    header = read_rewards(rewards_file, collect)
+    values = np.array(rows, dtype=np.float64).reshape(-1, len(AUDIT_FIELDS))
+    return providers, {field: values[:, i] for i, field in enumerate(AUDIT_FIELDS)}, header
+
+
+def _examples(items, limit):
+    items = list(items)
+    return {"count": len(items), "examples": items[:limit]}
+
+
+def audit_rewards_file(input_file, daily_balances_file=None, as_of=None,
+                       arb_price=None, t_price=None, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL, top=DEFAULT_TOP):
+    """
+    Independently recompute every provider's weighted average liquidity and
+    rewards from the daily balances and price data, and diff them against
+    the published rewards snapshot.
+
+    :param daily_balances_file: daily_balances.json style file; defaults to the daily balance store.
+    :param as_of: Time the snapshot was calculated; defaults to snapshot_time(input_file).
+    :param arb_price: ARB price override; defaults to the daily TWAP of the reward date.
+    :param t_price: T price override, as `arb_price`.
+    :return: Audit report dictionary; "passed" is True when every provider
+        matches within `atol` + `rtol` * |recomputed value|.
+    """
+    from src.config import START_DATE, END_DATE, TOTAL_REWARDS, T_REWARD_RATIO, TOKENS
+    from src.data.price_table import get_daily_price
+    from src.data.balance_store import daily_balance_store
+
+    started = time.perf_counter()
+    as_of = as_of or snapshot_time(input_file)
+    reward_date = min(as_of, END_DATE)
+    if arb_price is None:
+        arb_price = get_daily_price(TOKENS["ARB"], reward_date)
+    if t_price is None:
+        t_price = get_daily_price(TOKENS["T"], reward_date)
+
+    if daily_balances_file is not None:
+        providers, counts, times, usd = load_daily_balance_arrays(daily_balances_file)
+    else:
+        providers, counts, times, usd = load_store_balance_arrays(daily_balance_store)
+    expected = recompute_rewards(
+        counts, times, usd, START_DATE, END_DATE, as_of, TOTAL_REWARDS, arb_price, t_price, T_REWARD_RATIO
+    )
+    snapshot_providers, snapshot, header = load_snapshot_arrays(input_file)
+    loaded = time.perf_counter()
+
+    # Match snapshot rows to recomputed providers (addresses compared case-insensitively)
+    provider_index = {provider.lower(): i for i, provider in enumerate(providers)}
+    matches = np.array([provider_index.get(provider.lower(), -1) for provider in snapshot_providers], dtype=np.int64)
+    matched = matches >= 0
+    snapshot_rows = np.flatnonzero(matched)
+    expected_rows = matches[matched]
+    in_snapshot = np.zeros(len(providers), dtype=bool)
+    in_snapshot[expected_rows] = True
+
+    fields = {}
+    worst = np.zeros(len(snapshot_rows))
+    failed = np.zeros(len(snapshot_rows), dtype=bool)
+    for field in AUDIT_FIELDS:
+        expected_values = expected[field][expected_rows]
+        snapshot_values = snapshot[field][snapshot_rows]
+        deviation = np.abs(snapshot_values - expected_values)
+        relative = np.divide(deviation, np.abs(expected_values), out=np.where(deviation > 0, np.inf, 0.0), where=expected_values != 0)
+        mismatch = deviation > atol + rtol * np.abs(expected_values)
+        failed |= mismatch
+        worst = np.maximum(worst, np.where(deviation > atol, relative, 0.0))
+        fields[field] = {
+            "mismatches": int(mismatch.sum()),
+            "max_abs_deviation": float(deviation.max()) if len(deviation) else 0.0,
+            "max_rel_deviation": float(relative.max()) if len(relative) else 0.0,
+        }
+
+    top_deviations = []
+    for row in np.argsort(-worst, kind='stable')[:top]:
+        if worst[row] <= 0:
+            break
+        snapshot_row, expected_row = snapshot_rows[row], expected_rows[row]
+        top_deviations.append({
+            "provider": snapshot_providers[snapshot_row],
+            "max_rel_deviation": float(worst[row]),
+            "within_tolerance": not bool(failed[row]),
+            "snapshot": {field: float(snapshot[field][snapshot_row]) for field in AUDIT_FIELDS},
+            "recomputed": {field: float(expected[field][expected_row]) for field in AUDIT_FIELDS},
+        })
+
+    missing_in_balances = [snapshot_providers[i] for i in np.flatnonzero(~matched)]
+    missing_in_snapshot = [providers[i] for i in np.flatnonzero(~in_snapshot & (expected["estimated_reward_in_arb_tokens"] > atol))]
+    recomputed_total = float(expected["weighted_avg_liquidity"].sum())
+    snapshot_total = float(header.get("total_weighted_liquidity", 0))
+    # Prices the snapshot implies, for comparison with the ones used here
+    snapshot_arb = snapshot["estimated_reward_in_arb_tokens"].sum()
+    snapshot_t = snapshot["estimated_reward_in_t_tokens"].sum()
+
+    return {
+        "passed": not failed.any() and not missing_in_balances and not missing_in_snapshot,
+        "snapshot": input_file,
+        "daily_balances": daily_balances_file or daily_balance_store.base_dir,
+        "as_of": as_of.isoformat(),
+        "reward_date": reward_date.isoformat(),
+        "tolerance": {"rtol": rtol, "atol": atol},
+        "prices": {
+            "arb_price_usd": arb_price,
+            "t_price_usd": t_price,
+            "snapshot_arb_price_usd": float(snapshot["estimated_reward_in_arb_usd"].sum() / snapshot_arb) if snapshot_arb else None,
+            "snapshot_t_price_usd": float(snapshot["estimated_reward_in_t_usd"].sum() / snapshot_t) if snapshot_t else None,
+        },
+        "total_weighted_liquidity": {
+            "snapshot": snapshot_total,
+            "recomputed": recomputed_total,
+            "difference": abs(snapshot_total - recomputed_total),
+        },
+        "providers": {
+            "recomputed": len(providers),
+            "snapshot": len(snapshot_providers),
+            "matched": int(matched.sum()),
+            "failed": int(failed.sum()),
+            "missing_in_daily_balances": _examples(missing_in_balances, top),
+            "missing_in_snapshot": _examples(missing_in_snapshot, top),
+        },
+        "fields": fields,
+        "top_deviations": top_deviations,
+        "timings": {
+            "load_seconds": round(loaded - started, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        },
+    }
+
+
+def write_audit_report(report_file, report):
+    os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nAudit report saved to: {report_file}")
+
+
+def print_audit(report):
+    """:return: True if the audit passed."""
+    print("\n=== AUDIT RESULTS ===")
+    print(f"  - Snapshot: {report['snapshot']} (as of {report['as_of']})")
+    print(f"  - ARB price: ${report['prices']['arb_price_usd']} (snapshot implies ${report['prices']['snapshot_arb_price_usd']})")
+    print(f"  - T price: ${report['prices']['t_price_usd']} (snapshot implies ${report['prices']['snapshot_t_price_usd']})")
+    providers = report["providers"]
+    print(f"  - Providers: {providers['matched']} matched, {providers['failed']} outside tolerance")
+    print(f"  - Missing in daily balances: {providers['missing_in_daily_balances']['count']}")
+    print(f"  - Missing in snapshot: {providers['missing_in_snapshot']['count']}")
+    total = report["total_weighted_liquidity"]
+    print(f"  - Total weighted liquidity: {total['snapshot']} (recomputed {total['recomputed']})")
+
+    for field, stats in report["fields"].items():
+        print(f"  - {field}: {stats['mismatches']} mismatches, max relative deviation {stats['max_rel_deviation']:.3g}")
+
+    if report["top_deviations"]:
+        print("\nTop deviations:")
+        for deviation in report["top_deviations"]:
+            marker = "✓" if deviation["within_tolerance"] else "✗"
+            print(f"  {marker} {deviation['provider']}: {deviation['max_rel_deviation']:.3g} "
+                  f"(ARB {deviation['snapshot']['estimated_reward_in_arb_tokens']} vs "
+                  f"{deviation['recomputed']['estimated_reward_in_arb_tokens']:.8f})")
+
+    print(f"\nAudit finished in {report['timings']['total_seconds']}s")
+    if report["passed"]:
+        print("✓ PASS: Snapshot matches the independent recomputation")
+    else:
+        print("✗ FAIL: Snapshot deviates from the independent recomputation")
+    return report["passed"]
@@ -1,56 +1,90 @@
-import json
+import os
+import sys
 import argparse
+from datetime import datetime, timezone
 from decimal import Decimal
 
+# Add the parent directory to sys.path to enable relative imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.json_stream import ObjectStream
 
-def validate_rewards_file(input_file):
+# Reward amounts are summed and converted as integers with 18 decimals
+WEI_DECIMALS = 18
+
+
+def to_wei(value, decimals=WEI_DECIMALS):
     """
-    Validate the rewards JSON file according to the specified requirements:
-    1. Check if sum of weighted_avg_liquidity equals total_weighted_liquidity
-    2. Sum all reward fields
-    3. Check if ARB token sum is 50,000
-    4. Check if T token USD value is 25% of ARB token USD value
-    5. Calculate relative token prices
+    Convert a decimal amount to an integer with `decimals` decimals, truncating
+    extra digits like int(Decimal(str(value)) * 10**decimals) but without the
+    Decimal round trip for the plain "123.45678" strings in rewards files.
     """
-    try:
-        print(f"Reading rewards file: {input_file}")
-        with open(input_file, 'r') as f:
-            rewards_data = json.load(f)
-        
-        if 'rewards' not in rewards_data:
-            raise ValueError("Invalid rewards file format: 'rewards' key not found")
-        
-        # Initialize counters
-        sum_weighted_avg_liquidity = Decimal('0')
-        sum_arb_tokens = Decimal('0')
-        sum_arb_usd = Decimal('0')
-        sum_t_tokens = Decimal('0')
-        sum_t_usd = Decimal('0')
-        
-        # Process each reward entry in the list
-        for reward_data in rewards_data["rewards"]:
-            # Add to weighted avg liquidity sum
-            weighted_avg_liquidity = Decimal(str(reward_data.get("weighted_avg_liquidity", 0)))
-            sum_weighted_avg_liquidity += weighted_avg_liquidity
-            
-            # Add to token and USD sums
-            sum_arb_tokens += Decimal(str(reward_data.get("estimated_reward_in_arb_tokens", 0)))
-            sum_arb_usd += Decimal(str(reward_data.get("estimated_reward_in_arb_usd", 0)))
-            sum_t_tokens += Decimal(str(reward_data.get("estimated_reward_in_t_tokens", 0)))
-            sum_t_usd += Decimal(str(reward_data.get("estimated_reward_in_t_usd", 0)))
-        
-        # Get total weighted liquidity from file
-        total_weighted_liquidity = Decimal(str(rewards_data.get("total_weighted_liquidity", 0)))
-        
+    if isinstance(value, int):
+        return value * 10 ** decimals
+    text = value if isinstance(value, str) else str(value)
+    whole, _, fraction = text.partition('.')
+    digits = whole[1:] if whole[:1] in ('+', '-') else whole
+    if not digits.isdecimal() or (fraction and not fraction.isdecimal()):
+        # Exponents, empty or malformed values
+        return int(Decimal(text).scaleb(decimals))
+    amount = int(digits) * 10 ** decimals
+    if fraction:
+        amount += int(fraction[:decimals].ljust(decimals, '0'))
+    return -amount if whole[:1] == '-' else amount
+
+
+def from_wei(amount, decimals=WEI_DECIMALS):
+    return Decimal(amount).scaleb(-decimals)
+
+
+class RewardTotals:
+    """Running sums over the reward entries of one rewards file, in wei."""
+
+    __slots__ = ('weighted_avg_liquidity', 'arb_tokens', 'arb_usd', 't_tokens', 't_usd', 'recipients')
+
+    def __init__(self):
+        self.weighted_avg_liquidity = 0
+        self.arb_tokens = 0
+        self.arb_usd = 0
+        self.t_tokens = 0
+        self.t_usd = 0
+        self.recipients = 0
+
+    def add(self, reward):
+        """
+        Add one reward entry.
+
+        :return: (ARB amount, T amount) in wei, None where the entry has no amount.
+        """
+        arb_amount = reward.get("estimated_reward_in_arb_tokens")
+        t_amount = reward.get("estimated_reward_in_t_tokens")
+        arb_wei = to_wei(arb_amount) if arb_amount is not None else None
+        t_wei = to_wei(t_amount) if t_amount is not None else None
+
+        self.weighted_avg_liquidity += to_wei(reward.get("weighted_avg_liquidity", 0))
+        self.arb_tokens += arb_wei or 0
+        self.arb_usd += to_wei(reward.get("estimated_reward_in_arb_usd", 0))
+        self.t_tokens += t_wei or 0
+        self.t_usd += to_wei(reward.get("estimated_reward_in_t_usd", 0))
+        self.recipients += 1
+        return arb_wei, t_wei
+
+    def validations(self, total_weighted_liquidity):
+        """:return: The validation results for these sums, see validate_rewards_file."""
+        sum_weighted_avg_liquidity = from_wei(self.weighted_avg_liquidity)
+        sum_arb_tokens = from_wei(self.arb_tokens)
+        sum_arb_usd = from_wei(self.arb_usd)
+        sum_t_tokens = from_wei(self.t_tokens)
+        sum_t_usd = from_wei(self.t_usd)
+        total_weighted_liquidity = from_wei(to_wei(total_weighted_liquidity))
+
         # Calculate token prices
         arb_price = sum_arb_usd / sum_arb_tokens if sum_arb_tokens > 0 else Decimal('0')
         t_price = sum_t_usd / sum_t_tokens if sum_t_tokens > 0 else Decimal('0')
-        
+
         # Calculate t_usd as percentage of arb_usd
         t_percentage = (sum_t_usd / sum_arb_usd * 100) if sum_arb_usd > 0 else Decimal('0')
-        
-        # Validation results
-        validations = {
+
+        return {
             "weighted_liquidity_match": {
                 "result": abs(sum_weighted_avg_liquidity - total_weighted_liquidity) < Decimal('0.001'),
                 "sum_weighted_avg_liquidity": float(sum_weighted_avg_liquidity),
@@ -80,59 +114,112 @@ def validate_rewards_file(input_file):
                 "t_price_usd": float(t_price)
             }
         }
+
+
+def read_rewards(input_file, on_reward, header_keys=("total_weighted_liquidity",)):
+    """
+    Stream the `rewards` array of a rewards file, calling `on_reward` for each
+    entry. Reading stops once the array and `header_keys` have been seen, so
+    the events and balances sections after them are never parsed.
+
+    :return: {key: value} for the header keys found in the file.
+    """
+    header = {}
+    found_rewards = False
+    with open(input_file, 'r', encoding='utf-8') as f:
+        stream = ObjectStream(f)
+        for key in stream.members():
+            if key == 'rewards':
+                for reward in stream.iter_array():
+                    on_reward(reward)
+                found_rewards = True
+            elif key in header_keys:
+                header[key] = stream.read_value()
+            if found_rewards and len(header) == len(header_keys):
+                break
+    if not found_rewards:
+        raise ValueError("Invalid rewards file format: 'rewards' key not found")
+    return header
+
+
+def critical_validations_passed(validations):
+    return all([
+        validations["weighted_liquidity_match"]["result"],
+        validations["arb_tokens_sum"]["result"],
+        validations["t_usd_percentage"]["result"]
+    ])
+
+
+def print_validations(validations):
+    """:return: True if every critical check passed."""
+    # Print validation results
+    print("\n=== VALIDATION RESULTS ===")
+    
+    print("\n1. Weighted Liquidity Check:")
+    if validations["weighted_liquidity_match"]["result"]:
+        print("✓ PASS: Sum of weighted_avg_liquidity matches total_weighted_liquidity")
+    else:
+        print("✗ FAIL: Sum of weighted_avg_liquidity does not match total_weighted_liquidity")
+    print(f"  - Sum of weighted_avg_liquidity: {validations['weighted_liquidity_match']['sum_weighted_avg_liquidity']}")
+    print(f"  - Total weighted liquidity: {validations['weighted_liquidity_match']['total_weighted_liquidity']}")
+    print(f"  - Difference: {validations['weighted_liquidity_match']['difference']}")
+    
+    print("\n2. ARB Token Sum Check:")
+    if validations["arb_tokens_sum"]["result"]:
+        print("✓ PASS: Sum of ARB tokens is approximately 50,000")
+    else:
+        print("✗ FAIL: Sum of ARB tokens is not 50,000")
+    print(f"  - Sum of ARB tokens: {validations['arb_tokens_sum']['sum_arb_tokens']}")
+    print(f"  - Expected: 50,000")
+    print(f"  - Difference: {validations['arb_tokens_sum']['difference']}")
+    
+    print("\n3. T Token USD Percentage Check:")
+    if validations["t_usd_percentage"]["result"]:
+        print("✓ PASS: T token USD value is approximately 25% of ARB token USD value")
+    else:
+        print("✗ FAIL: T token USD value is not 25% of ARB token USD value")
+    print(f"  - T token USD percentage: {validations['t_usd_percentage']['t_usd_percentage']}%")
+    print(f"  - Expected: 25%")
+    print(f"  - Difference: {validations['t_usd_percentage']['difference']}%")
+    
+    print("\n4. Token Sums:")
+    print(f"  - Sum of ARB tokens: {validations['token_sums']['sum_arb_tokens']}")
+    print(f"  - Sum of ARB USD value: ${validations['token_sums']['sum_arb_usd']}")
+    print(f"  - Sum of T tokens: {validations['token_sums']['sum_t_tokens']}")
+    print(f"  - Sum of T USD value: ${validations['token_sums']['sum_t_usd']}")
+    
+    print("\n5. Token Prices:")
+    print(f"  - ARB price: ${validations['token_prices']['arb_price_usd']} per token")
+    print(f"  - T price: ${validations['token_prices']['t_price_usd']} per token")
+    
+    # Overall validation result
+    all_passed = critical_validations_passed(validations)
+    
+    print("\n=== OVERALL RESULT ===")
+    if all_passed:
+        print("✓ PASS: All validations passed")
+    else:
+        print("✗ FAIL: Some validations failed")
+    
+    return all_passed
+
+
+def validate_rewards_file(input_file):
+    """
+    Validate the rewards JSON file according to the specified requirements:
+    1. Check if sum of weighted_avg_liquidity equals total_weighted_liquidity
+    2. Sum all reward fields
+    3. Check if ARB token sum is 50,000
+    4. Check if T token USD value is 25% of ARB token USD value
+    5. Calculate relative token prices
+    """
+    try:
+        print(f"Reading rewards file: {input_file}")
+        totals = RewardTotals()
+        header = read_rewards(input_file, totals.add)
         
-        # Print validation results
-        print("\n=== VALIDATION RESULTS ===")
-        
-        print("\n1. Weighted Liquidity Check:")
-        if validations["weighted_liquidity_match"]["result"]:
-            print("✓ PASS: Sum of weighted_avg_liquidity matches total_weighted_liquidity")
-        else:
-            print("✗ FAIL: Sum of weighted_avg_liquidity does not match total_weighted_liquidity")
-        print(f"  - Sum of weighted_avg_liquidity: {validations['weighted_liquidity_match']['sum_weighted_avg_liquidity']}")
-        print(f"  - Total weighted liquidity: {validations['weighted_liquidity_match']['total_weighted_liquidity']}")
-        print(f"  - Difference: {validations['weighted_liquidity_match']['difference']}")
-        
-        print("\n2. ARB Token Sum Check:")
-        if validations["arb_tokens_sum"]["result"]:
-            print("✓ PASS: Sum of ARB tokens is approximately 50,000")
-        else:
-            print("✗ FAIL: Sum of ARB tokens is not 50,000")
-        print(f"  - Sum of ARB tokens: {validations['arb_tokens_sum']['sum_arb_tokens']}")
-        print(f"  - Expected: 50,000")
-        print(f"  - Difference: {validations['arb_tokens_sum']['difference']}")
-        
-        print("\n3. T Token USD Percentage Check:")
-        if validations["t_usd_percentage"]["result"]:
-            print("✓ PASS: T token USD value is approximately 25% of ARB token USD value")
-        else:
-            print("✗ FAIL: T token USD value is not 25% of ARB token USD value")
-        print(f"  - T token USD percentage: {validations['t_usd_percentage']['t_usd_percentage']}%")
-        print(f"  - Expected: 25%")
-        print(f"  - Difference: {validations['t_usd_percentage']['difference']}%")
-        
-        print("\n4. Token Sums:")
-        print(f"  - Sum of ARB tokens: {validations['token_sums']['sum_arb_tokens']}")
-        print(f"  - Sum of ARB USD value: ${validations['token_sums']['sum_arb_usd']}")
-        print(f"  - Sum of T tokens: {validations['token_sums']['sum_t_tokens']}")
-        print(f"  - Sum of T USD value: ${validations['token_sums']['sum_t_usd']}")
-        
-        print("\n5. Token Prices:")
-        print(f"  - ARB price: ${validations['token_prices']['arb_price_usd']} per token")
-        print(f"  - T price: ${validations['token_prices']['t_price_usd']} per token")
-        
-        # Overall validation result
-        all_passed = all([
-            validations["weighted_liquidity_match"]["result"],
-            validations["arb_tokens_sum"]["result"],
-            validations["t_usd_percentage"]["result"]
-        ])
-        
-        print("\n=== OVERALL RESULT ===")
-        if all_passed:
-            print("✓ PASS: All validations passed")
-        else:
-            print("✗ FAIL: Some validations failed")
+        validations = totals.validations(header.get("total_weighted_liquidity", 0))
+        print_validations(validations)
         
         return validations
     
@@ -144,7 +231,32 @@ def validate_rewards_file(input_file):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Validate rewards JSON file")
     parser.add_argument("input_file", help="Path to the rewards JSON file")
+    parser.add_argument("--audit", action="store_true",
+                        help="Recompute every provider's rewards from the daily balances and price data and diff them against the file")
+    parser.add_argument("--daily-balances",
+                        help="Daily balances file used by --audit; defaults to the daily balance store")
+    parser.add_argument("--as-of", type=datetime.fromisoformat,
+                        help="Time the snapshot was calculated (ISO format); defaults to the time in the file name")
+    parser.add_argument("--arb-price", type=float, help="ARB price for --audit; defaults to the daily TWAP of the reward date")
+    parser.add_argument("--t-price", type=float, help="T price for --audit; defaults to the daily TWAP of the reward date")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="Relative tolerance for --audit")
+    parser.add_argument("--top", type=int, default=20, help="Number of largest deviations to report")
+    parser.add_argument("--report", help="Write the audit report to this JSON file")
     
     args = parser.parse_args()
     
-    validate_rewards_file(args.input_file) 
\ No newline at end of file
+    validations = validate_rewards_file(args.input_file)
+    passed = validations is not None and critical_validations_passed(validations)
+    if args.audit:
+        # numpy and the price data are only needed for the audit
+        from utils.rewards_audit import audit_rewards_file, print_audit, write_audit_report
+
+        as_of = args.as_of
+        if as_of is not None and as_of.tzinfo is None:
+            as_of = as_of.replace(tzinfo=timezone.utc)
+        report = audit_rewards_file(args.input_file, args.daily_balances, as_of=as_of, arb_price=args.arb_price, t_price=args.t_price,
+                                    rtol=args.rtol, top=args.top)
+        passed = print_audit(report) and passed
+        if args.report:
+            write_audit_report(args.report, report)
+        sys.exit(0 if passed else 1) 
\ No newline at end of file
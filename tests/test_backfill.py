@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import src.blockchain.event_fetcher as event_fetcher_module
+from src.blockchain.backfill import BackfillQueue, init_queue, run_worker, merge_segments
+from src.blockchain.event_fetcher import EventFetcher
+from src.config import POOLS, STATE_FILE
+from src.data.state_manager import load_state, get_event_cursor
+
+def test_ranges_are_leased_once_and_expired_leases_are_retried(tmp_path):
+    queue = BackfillQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    assert queue.add_ranges("0xpool", "Mint", 100, 349, 100) == 3
+    # Re-queueing the same ranges is a no-op
+    queue.add_ranges("0xpool", "Mint", 100, 349, 100)
+    assert queue.counts()["pending"] == 3
+
+    first = queue.lease("a")
+    second = queue.lease("b")
+    assert (first.from_block, first.to_block) == (100, 199)
+    assert (second.from_block, second.to_block) == (200, 299)
+    assert queue.complete(first.id, "a", "segment.json", 5)
+    # Only the lease owner can complete or renew a task
+    assert not queue.complete(second.id, "a", "segment.json", 5)
+
+    queue.conn.execute("UPDATE tasks SET lease_expires = ? WHERE id = ?", (time.time() - 1, second.id))
+    retried = queue.lease("c")
+    assert retried.id == second.id and retried.attempts == 2
+    assert not queue.renew(second.id, "b")
+
+    queue.fail(retried.id, "c", "boom")
+    assert queue.counts() == {"pending": 1, "leased": 0, "done": 1, "failed": 1}
+    assert queue.retry_failed() == 1
+
+def test_workers_take_pool_tokens_from_the_queue_and_never_write_state(tmp_path, monkeypatch):
+    (tmp_path / "abi").symlink_to(os.path.abspath("abi"))
+    monkeypatch.chdir(tmp_path)
+    pool = dict(POOLS[1], events=["Mint"])
+    tokens = [next(iter(token.values())) for token in pool["tokens"]]
+    fetcher = EventFetcher()
+    # Known already, so init makes no RPC calls
+    fetcher.pool_tokens[pool["address"]] = tuple(tokens)
+
+    def fetch_chunk(pool, decoder, from_block, to_block, token0, token1):
+        return [{"event": "Mint", "pool_address": pool["address"], "transactionHash": f"0x{from_block:064x}",
+                 "logIndex": 0, "blockNumber": from_block, "tokens": {"token0": token0, "token1": token1}}]
+    monkeypatch.setattr(fetcher, "fetch_chunk", fetch_chunk)
+    monkeypatch.setattr(event_fetcher_module, "event_fetcher", fetcher)
+    queue_path = str(tmp_path / "data" / "backfill" / "queue.sqlite")
+    queue = BackfillQueue(queue_path)
+    to_block = pool["deploy_block"] + 199
+
+    assert init_queue(queue, to_block, range_size=100, pools=[pool]) == 2
+    assert queue.get_meta("pool_tokens") == {pool["address"]: tokens}
+    assert run_worker(queue_path, owner="a") == 2
+    assert not os.path.exists(STATE_FILE)
+
+    assert merge_segments(queue) == 2
+    assert get_event_cursor(load_state(), pool["address"], "Mint") == to_block
+    stored = json.loads((tmp_path / "data" / "pools_events.json").read_text())
+    assert [event["tokens"]["token0"] for event in stored] == [tokens[0]] * 2
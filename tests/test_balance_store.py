@@ -0,0 +1,115 @@
+import json
+import math
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.calculator.rewards import RewardsCalculator
+from src.data.balance_store import DailyBalanceStore, to_day
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FIRST = to_day(START)
+PROVIDERS = [f"0x{index:040x}" for index in range(1, 5)]
+
+def price_lookup(token, date):
+    # tBTC rises by 1000 a day, so 2e-7 tBTC crosses the 0.01 USD dust threshold on day 5
+    day = to_day(date) - FIRST
+    return {"tBTC": 45000.0 + 1000.0 * day, "WBTC": 60000.0}[token]
+
+def make_store(tmp_path, shards=2, legacy_json_file=None):
+    return DailyBalanceStore(str(tmp_path / "daily"), shards=shards, legacy_json_file=legacy_json_file,
+                             price_lookup=price_lookup)
+
+def fill(store):
+    alice, bob, carol, dave = PROVIDERS
+    store.append_days(FIRST, FIRST + 2, {alice: {"tBTC": 1.0}, bob: {"tBTC": 2.0, "WBTC": 0.5}, carol: {"tBTC": 0.0}})
+    # Nothing changed: only the new days are committed
+    store.append_days(FIRST + 3, FIRST + 3, {alice: {"tBTC": 1.0}, bob: {"tBTC": 2.0, "WBTC": 0.5}, carol: {"tBTC": 0.0}})
+    store.append_days(FIRST + 4, FIRST + 5, {alice: {"tBTC": 1.5}, bob: {"tBTC": 0.0, "WBTC": 0.0}, dave: {"tBTC": 2e-7}})
+    store.append_days(FIRST + 6, FIRST + 9, {alice: {"tBTC": 1.5}, bob: {"tBTC": 1.0, "WBTC": 0.0}, dave: {"tBTC": 2e-7}})
+
+def test_unchanged_balances_extend_runs_and_exits_are_pruned(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    alice, bob, carol, dave = PROVIDERS
+
+    assert store.last_day() == FIRST + 9
+    # carol never held anything and bob exited on day 4 and came back on day 6
+    assert store.providers() == [alice, bob, dave]
+    assert store.run_count() == 6
+    runs = store.read_runs().to_dict()
+    assert [(run["start_date"][:10], run["end_date"][:10]) for run in runs[bob]["runs"]] == [
+        ("2024-01-01", "2024-01-04"), ("2024-01-05", "2024-01-05"), ("2024-01-07", "2024-01-10")
+    ]
+    assert runs[alice]["runs"][1]["token_balance"] == {"tBTC": 1.5}
+
+    # Days already stored are skipped
+    assert store.append_days(FIRST + 8, FIRST + 9, {alice: {"tBTC": 9.0}}) == 0
+    assert store.run_count() == 6
+
+def test_daily_usd_values_come_from_the_price_table(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    alice, bob, carol, dave = PROVIDERS
+
+    bob_balances = store.provider_balances(bob)["balances"]
+    assert [balance["balance_date"][:10] for balance in bob_balances] == [
+        "2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05",
+        "2024-01-07", "2024-01-08", "2024-01-09", "2024-01-10",
+    ]
+    assert bob_balances[1]["token_usd_balance"] == {"tBTC": 2 * 46000.0, "WBTC": 30000.0}
+    assert bob_balances[4]["total_usd_balance"] == 0.0
+    # Dust is valued at 0 until its price reaches the threshold
+    dave_balances = store.provider_balances(dave)["balances"]
+    assert [balance["total_usd_balance"] for balance in dave_balances[:3]] == [0.0, pytest.approx(0.01), pytest.approx(0.0102)]
+
+    columns = store.read_columns(alice, start_day=FIRST + 2, end_day=FIRST + 4)
+    assert columns["day"].tolist() == [FIRST + 2, FIRST + 3, FIRST + 4]
+    assert columns["total_usd"].tolist() == [47000.0, 48000.0, 1.5 * 49000.0]
+    assert store.provider_balances("0xunknown") is None
+
+def test_rewards_from_runs_match_daily_balances(tmp_path):
+    store = make_store(tmp_path)
+    fill(store)
+    end = START + timedelta(days=12)
+    calculator = RewardsCalculator(None, START, end, 1000.0, balance_store=store)
+
+    from_runs = calculator.calculate_weighted_avg_liquidity(store.read_runs())
+    from_rows = calculator.calculate_weighted_avg_liquidity(store.to_dict())
+
+    assert list(from_runs) == list(from_rows)
+    for provider, value in from_rows.items():
+        assert from_runs[provider] == pytest.approx(value, rel=1e-12)
+
+def test_new_token_is_absent_from_earlier_runs(tmp_path):
+    store = make_store(tmp_path, shards=1)
+    provider = PROVIDERS[0]
+    store.append_days(FIRST, FIRST, {provider: {"tBTC": 1.0}})
+    store.append_days(FIRST + 1, FIRST + 1, {provider: {"tBTC": 1.0, "WBTC": 1.0}})
+
+    assert store.tokens() == ["tBTC", "WBTC"]
+    assert math.isnan(store.read_runs().tokens["WBTC"][0])
+    assert [b["token_usd_balance"] for b in store.provider_balances(provider)["balances"]] == [
+        {"tBTC": 45000.0}, {"tBTC": 46000.0, "WBTC": 60000.0}
+    ]
+
+def test_migrates_legacy_json_into_runs_and_exports_it_back(tmp_path):
+    source = make_store(tmp_path / "source")
+    fill(source)
+    daily_balances = source.to_dict()
+    legacy_file = tmp_path / "daily_balances.json"
+    legacy_file.write_text(json.dumps(daily_balances))
+
+    store = make_store(tmp_path, legacy_json_file=str(legacy_file))
+    assert store.providers() == source.providers()
+    assert store.run_count() == source.run_count()
+
+    export_file = tmp_path / "export.json"
+    store.export_json(str(export_file))
+    exported = json.loads(export_file.read_text())
+    # dave's first day was all dust, which reads back as no balance
+    daily_balances[PROVIDERS[3]]["balances"].pop(0)
+    assert list(exported) == list(daily_balances)
+    for provider, data in daily_balances.items():
+        assert len(exported[provider]["balances"]) == len(data["balances"])
+        for balance, expected in zip(exported[provider]["balances"], data["balances"]):
+            assert balance["balance_date"] == expected["balance_date"]
+            assert balance["total_usd_balance"] == pytest.approx(expected["total_usd_balance"], rel=1e-12)
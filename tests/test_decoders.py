@@ -0,0 +1,36 @@
+from eth_abi import encode_abi
+from hexbytes import HexBytes
+from src.config import POOLS, CURVE_ABI
+from src.utils.helpers import decode_log, get_pool_abi
+from src.blockchain.decoders import DecoderRegistry
+
+def make_log(event_abi, topic0):
+    data_types = [input['type'] for input in event_abi['inputs'] if not input['indexed']]
+    values = [[1, 2] if t.endswith(']') else 3 if t.startswith(('uint', 'int')) else '0x' + '11' * 20 for t in data_types]
+    indexed_count = sum(input['indexed'] for input in event_abi['inputs'])
+    return {
+        'topics': [HexBytes(topic0)] + [HexBytes(b'\x00' * 12 + b'\x22' * 20)] * indexed_count,
+        'data': '0x' + encode_abi(data_types, values).hex(),
+        'transactionHash': HexBytes(b'\x01' * 32),
+    }
+
+def test_decoders_match_decode_log_for_every_configured_event():
+    registry = DecoderRegistry()
+    registry.register_pools(POOLS)
+    for pool in POOLS:
+        for event_name in pool['events']:
+            decoder = registry.for_pool(pool, event_name)
+            event_abi = next(item for item in get_pool_abi(pool) if item.get('type') == 'event' and item['name'] == event_name)
+            log = make_log(event_abi, decoder.topic0)
+
+            assert decoder.decode_logs([log]) == [decode_log(event_abi, log)]
+            assert registry.decode_logs([log]) == [decode_log(event_abi, log)]
+
+def test_unknown_topics_and_bad_data_decode_to_none():
+    registry = DecoderRegistry()
+    decoder = registry.register_abi(CURVE_ABI)['AddLiquidity']
+    unknown = {'topics': [HexBytes(b'\x00' * 32)], 'data': '0x', 'transactionHash': HexBytes(b'\x01')}
+    truncated = {'topics': [HexBytes(decoder.topic0)], 'data': '0x00', 'transactionHash': HexBytes(b'\x01')}
+
+    assert registry.decode_logs([unknown]) == [None]
+    assert decoder.decode_logs([truncated]) == [None]
@@ -0,0 +1,90 @@
+import os
+import json
+import asyncio
+from eth_abi import encode_abi
+from web3 import Web3
+from web3.providers.base import BaseProvider
+import src.blockchain.event_fetcher as event_fetcher_module
+import src.blockchain.multicall as multicall
+from src.blockchain.event_fetcher import EventFetcher, PENDING_EVENTS_FILE
+from src.blockchain.multicall import encode_call
+from src.config import POOLS
+from src.data.state_manager import load_state, get_event_cursor
+
+PROVIDER = "0x54b5569deC8A6A8AE61A36Fd34e5c8945810db8b"
+
+class PoolProvider(BaseProvider):
+    """Answers eth_call for each pool's token0()/token1()/coins(i) from its configured tokens."""
+
+    def __init__(self, pools):
+        self.calls = []
+        self.results = {}
+        for pool in pools:
+            token0, token1 = (next(iter(token.values()))['address'] for token in pool['tokens'])
+            for calldata, address in ((encode_call('token0()'), token0), (encode_call('token1()'), token1),
+                                      (encode_call('coins(uint256)', ['uint256'], [0]), token0),
+                                      (encode_call('coins(uint256)', ['uint256'], [1]), token1)):
+                self.results[(pool['address'].lower(), '0x' + calldata.hex())] = address
+
+    def make_request(self, method, params):
+        self.calls.append(method)
+        if method == 'eth_chainId':
+            return {"jsonrpc": "2.0", "id": 1, "result": "0xa4b1"}
+        transaction = params[0]
+        address = self.results[(transaction['to'].lower(), transaction['data'])]
+        return {"jsonrpc": "2.0", "id": 1, "result": '0x' + encode_abi(['address'], [address]).hex()}
+
+def in_data_dir(tmp_path, monkeypatch):
+    (tmp_path / "abi").symlink_to(os.path.abspath("abi"))
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+def test_pool_tokens_are_read_one_by_one_when_multicall_fails(tmp_path, monkeypatch):
+    in_data_dir(tmp_path, monkeypatch)
+
+    def failing_aggregate3(w3, calls, allow_failure=True):
+        raise RuntimeError("Multicall3 aggregate3 failed")
+    monkeypatch.setattr(multicall, "aggregate3", failing_aggregate3)
+    fetcher = EventFetcher()
+    provider = PoolProvider(POOLS)
+    fetcher.w3 = Web3(provider)
+
+    fetcher.resolve_pool_tokens(POOLS)
+
+    for pool in POOLS:
+        token0, token1 = (next(iter(token.values())) for token in pool['tokens'])
+        assert fetcher.get_pool_tokens(pool) == (token0, token1)
+    assert provider.calls.count('eth_call') == 2 * len(POOLS)
+    # The addresses are cached, so the next run resolves without any call
+    cached = json.loads((tmp_path / "data" / "program_state.json").read_text())["pool_tokens"]
+    assert set(cached) == {pool['address'] for pool in POOLS}
+
+def test_fetched_chunks_are_merged_into_the_event_store_once_per_run(tmp_path, monkeypatch):
+    in_data_dir(tmp_path, monkeypatch)
+    monkeypatch.setattr(event_fetcher_module, "LOG_FETCH_CHUNK_SIZE", 10)
+    pool = dict(POOLS[1], events=["Mint"])
+    fetcher = EventFetcher()
+    fetcher.pool_tokens[pool["address"]] = tuple(next(iter(token.values())) for token in pool["tokens"])
+
+    def fetch_chunk(pool, decoder, from_block, to_block, token0, token1):
+        return [{"event": "Mint", "provider": PROVIDER, "timestamp": from_block, "transactionHash": f"0x{from_block:064x}",
+                 "logIndex": 0, "blockNumber": from_block, "pool_address": pool["address"],
+                 "tokens": {"token0": token0, "token1": token1}, "amounts": [1, 2], "action": "add"}]
+    monkeypatch.setattr(fetcher, "fetch_chunk", fetch_chunk)
+    rewrites = []
+    save_events = fetcher.save_events
+    monkeypatch.setattr(fetcher, "save_events", lambda events: rewrites.append(len(events)) or save_events(events))
+
+    # A crashed run left a stored chunk and half a line behind
+    with open(PENDING_EVENTS_FILE, "w") as f:
+        f.write(json.dumps(fetch_chunk(pool, None, 1, 10, *fetcher.pool_tokens[pool["address"]])[0]) + "\n" + '{"event": "Mi')
+
+    events = asyncio.run(fetcher.fetch_and_save_events([pool], 1, 100))
+
+    assert len(events) == 10
+    # One rewrite for the leftover chunk and one for the whole run, not one per chunk
+    assert rewrites == [1, 10]
+    stored = json.loads((tmp_path / "data" / "pools_events.json").read_text())
+    assert [event["blockNumber"] for event in stored] == list(range(1, 101, 10))
+    assert not os.path.exists(PENDING_EVENTS_FILE)
+    assert get_event_cursor(load_state(), pool["address"], "Mint") == 100
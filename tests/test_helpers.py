@@ -0,0 +1,24 @@
+from eth_utils import to_checksum_address
+from src.utils.helpers import normalize_address, address_key, address_from_key
+
+LOWER = "0x186cf879186986a20aadfb7ead50e3c20cb26cec"
+CHECKSUMMED = to_checksum_address(LOWER)
+
+def test_normalize_address_accepts_any_format_and_shares_one_object():
+    variants = [
+        LOWER,
+        "0x" + LOWER[2:].upper(),
+        LOWER[2:],
+        "0x" + "0" * 24 + LOWER[2:],
+        bytes.fromhex(LOWER[2:]),
+    ]
+    normalized = [normalize_address(variant) for variant in variants]
+    assert normalized == [CHECKSUMMED] * len(variants)
+    # Interned: identical providers are the same string object
+    assert all(address is normalized[0] for address in normalized)
+
+def test_address_key_round_trip():
+    key = address_key(LOWER)
+    assert len(key) == 20
+    assert key == address_key(CHECKSUMMED)
+    assert address_from_key(key) == CHECKSUMMED
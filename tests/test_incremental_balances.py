@@ -0,0 +1,105 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+import src.calculator.daily_balances as daily_balances
+from src.calculator.balances import BalanceCalculator
+from src.calculator.daily_balances import DailyBalanceCalculator
+from src.data.balance_store import DailyBalanceStore, to_day
+from src.data.state_manager import load_state, update_state
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PROVIDERS = [
+    "0x54b5569deC8A6A8AE61A36Fd34e5c8945810db8b",
+    "0x6c84a8f1c29108F47a79964b5Fe888D4f4D0dE40",
+    "0x2f2a2543B76A4166549F7aaB2e75Bef0aefC5B0f",
+    "0xe9e6b9aAAfaf6816C3364345F6eF745CcFC8660a",
+]
+TOKENS = {
+    "token0": {"symbol": "tBTC", "address": "0x6c84a8f1c29108F47a79964b5Fe888D4f4D0dE40", "decimals": 18},
+    "token1": {"symbol": "WBTC", "address": "0x2f2a2543B76A4166549F7aaB2e75Bef0aefC5B0f", "decimals": 8},
+}
+
+def make_events(count, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for index in range(count):
+        provider = rng.choice(PROVIDERS)
+        action = "add" if rng.random() < 0.7 else "remove"
+        amounts = [rng.randrange(1, 10) * 10**17, rng.randrange(1, 10) * 10**7]
+        events.append({
+            "event": "Mint" if action == "add" else "Burn",
+            "provider": provider,
+            # Several events share a second, so ties are ordered by action and then file order
+            "timestamp": int((START + timedelta(hours=rng.randrange(0, 10 * 24))).timestamp()) + rng.randrange(0, 2),
+            "transactionHash": f"0x{index:064x}",
+            "logIndex": index,
+            "blockNumber": 1000 + index,
+            "pool_address": "0xe9e6b9aAAfaf6816C3364345F6eF745CcFC8660a",
+            "tokens": TOKENS,
+            "amounts": amounts,
+            "action": action,
+        })
+    return events
+
+def run_pipeline(directory, monkeypatch, events, now):
+    """Append events to the events file and run both calculators as the main loop would at `now`."""
+    monkeypatch.chdir(directory)
+    monkeypatch.setattr(daily_balances, "START_DATE", START)
+    monkeypatch.setattr(daily_balances, "END_DATE", now)
+    (directory / "data" / "balances").mkdir(parents=True, exist_ok=True)
+    events_file = directory / "data" / "pools_events.json"
+    stored = json.loads(events_file.read_text()) if events_file.exists() else []
+    events_file.write_text(json.dumps(stored + events))
+
+    balance_calculator = BalanceCalculator()
+    balance_calculator.calculate_balances()
+    dirty = dict(load_state().get("dirty_providers") or {})
+    store = DailyBalanceStore(str(directory / "daily"), shards=2, price_lookup=lambda token, date: 1.0)
+    calculator = DailyBalanceCalculator("./data/balances/provider_balances.json", None, store=store)
+    calculator.calculate_daily_balances()
+    update_state(last_daily_balance_date=calculator.last_calculated_date.isoformat())
+    return dirty, store
+
+def results(directory, store):
+    ledgers = json.loads((directory / "data" / "balances" / "provider_balances.json").read_text())
+    return ledgers, store.read_runs().to_dict()
+
+def test_late_events_give_the_same_balances_as_a_rebuild(tmp_path, monkeypatch):
+    events = make_events(120)
+    on_time = sorted(events[:100], key=lambda event: event["timestamp"])
+    late = events[100:]
+    rebuild = tmp_path / "rebuild"
+    rebuild.mkdir()
+    incremental = tmp_path / "incremental"
+    incremental.mkdir()
+
+    # Events arrive day by day; the last chunk adds older ones, e.g. from a backfill
+    for day in range(1, 11):
+        now = START + timedelta(days=day)
+        chunk = [event for event in on_time if now - timedelta(days=1) <= datetime.fromtimestamp(event["timestamp"], timezone.utc) < now]
+        run_pipeline(incremental, monkeypatch, chunk, now)
+    late_provider = PROVIDERS[1]
+    backfilled = [event for event in late if event["provider"] == late_provider]
+    dirty, store = run_pipeline(incremental, monkeypatch, backfilled, START + timedelta(days=10))
+
+    assert list(dirty) == [late_provider]
+    assert dirty[late_provider] == min(event["timestamp"] for event in backfilled)
+    assert load_state()["dirty_providers"] == {}
+
+    expected = run_pipeline(rebuild, monkeypatch, on_time + backfilled, START + timedelta(days=10))[1]
+    assert results(incremental, store) == results(rebuild, expected)
+    assert store.version() > 1
+    assert store.last_day() == to_day(START) + 10
+
+def test_replay_is_skipped_for_events_already_applied(tmp_path, monkeypatch):
+    events = sorted(make_events(40, seed=3), key=lambda event: event["timestamp"])
+    now = START + timedelta(days=10)
+    run_pipeline(tmp_path, monkeypatch, events, now)
+    version = DailyBalanceStore(str(tmp_path / "daily"), shards=2).version()
+
+    dirty, store = run_pipeline(tmp_path, monkeypatch, [], now)
+
+    assert dirty == {}
+    # Nothing new: the store is not even committed, so caches of it stay valid
+    assert store.version() == version
+    assert load_state()["balance_event_offset"] == len(events)
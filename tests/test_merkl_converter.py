@@ -0,0 +1,61 @@
+import io
+import json
+from decimal import Decimal
+from src.utils.json_stream import ObjectStream
+from src.utils.rewards_validator import to_wei
+from src.utils.merkl_converter import convert_rewards_file, finalize_conversion, ARB_TOKEN_ADDRESS
+
+PROVIDERS = ["0x000006eee6e39015cB523AeBDD4d0B1855aBa682", "0x002e9EB604052194DC118b2209ACAc293492c4fA"]
+
+def make_rewards(arb_amounts):
+    return {
+        "total_weighted_liquidity": "30.5",
+        "rewards": [
+            {
+                "provider": provider,
+                "weighted_avg_liquidity": "15.25",
+                "estimated_reward_in_arb_tokens": arb,
+                "estimated_reward_in_arb_usd": "1.0",
+                "estimated_reward_in_t_usd": "0.25",
+                "estimated_reward_in_t_tokens": "2.5"
+            }
+            for provider, arb in zip(PROVIDERS, arb_amounts)
+        ],
+        "events": {PROVIDERS[0]: [{"event": "AddLiquidity", "note": "brackets ]} in a \"string\""}]},
+        "balances": {}
+    }
+
+def test_object_stream_reads_across_chunk_boundaries():
+    text = json.dumps({"a": 12.5, "rewards": [{"x": "]}"}, -1234567890123], "skip": {"k": ["}", {}]}, "b": None})
+    stream = ObjectStream(io.StringIO(text), chunk_size=3)
+    values = {}
+    for key in stream.members():
+        if key == "rewards":
+            values[key] = list(stream.iter_array())
+        elif key != "skip":
+            values[key] = stream.read_value()
+
+    assert values == {"a": Decimal("12.5"), "rewards": [{"x": "]}"}, -1234567890123], "b": None}
+
+def test_to_wei_truncates_like_decimal():
+    for value in ["77.78175300", "0.000000000000000000019", "-1.5", "3", "1E-7", 2.5, Decimal("0.1")]:
+        assert to_wei(value) == int(Decimal(str(value)) * Decimal(10 ** 18))
+
+def test_conversion_matches_full_json_dump(tmp_path):
+    input_file = tmp_path / "rewards_1.json"
+    input_file.write_text(json.dumps(make_rewards(["77.781753", "0.00000000"]), indent=2))
+
+    conversion = convert_rewards_file(str(input_file), str(tmp_path))
+    finalize_conversion(conversion)
+
+    assert conversion["validations"]["weighted_liquidity_match"]["result"]
+    assert conversion["validations"]["token_sums"]["sum_t_tokens"] == 5.0
+    arb_file, t_file = (output_file for _, output_file in conversion["outputs"])
+    expected_arb = {
+        "rewardToken": ARB_TOKEN_ADDRESS,
+        "rewards": {PROVIDERS[0]: {"TLP reward in ARB tokens": "77781753000000000000"}}
+    }
+    with open(arb_file) as f:
+        assert f.read() == json.dumps(expected_arb, indent=2)
+    with open(t_file) as f:
+        assert list(json.load(f)["rewards"]) == PROVIDERS
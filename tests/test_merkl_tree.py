@@ -0,0 +1,30 @@
+from src.utils.merkl_tree import MerkleTree, MerkleProofFile, address_bytes, leaf_hash, verify_proof
+
+TOKEN = "0x912ce59144191c1204e64559fe8253a0e49e6548"
+
+def make_claims(count):
+    return [(f"0x{index * 7919 + 1:040x}", 10 ** 18 + index) for index in range(count)]
+
+def test_every_proof_verifies_against_the_root():
+    for count in (1, 2, 5, 8, 13):
+        tree = MerkleTree(TOKEN, make_claims(count))
+        for account, amount, proof in tree.proofs():
+            assert verify_proof(leaf_hash(account, tree.token, amount), proof, tree.root)
+
+def test_proof_file_lookup_matches_tree(tmp_path):
+    claims = make_claims(37)
+    # Leaf order, and therefore the root, does not depend on input order
+    tree = MerkleTree(TOKEN, reversed(claims))
+    assert tree.root == MerkleTree(TOKEN, claims).root
+
+    path = str(tmp_path / "arb.tree")
+    tree.write(path)
+    with MerkleProofFile(path) as proof_file:
+        assert len(proof_file) == len(claims)
+        assert proof_file.root == f"0x{tree.root.hex()}"
+        for address, amount in claims:
+            claim = proof_file.lookup(address.upper().replace("0X", "0x"))
+            assert claim["amount"] == str(amount)
+            proof = [bytes.fromhex(node[2:]) for node in claim["proof"]]
+            assert verify_proof(leaf_hash(address_bytes(address), tree.token, amount), proof, tree.root)
+        assert proof_file.lookup("0x" + "ff" * 20) is None
@@ -0,0 +1,61 @@
+import json
+import random
+from src.utils.merkl_converter import MerklWriter, ARB_TOKEN_ADDRESS, T_TOKEN_ADDRESS, ARB_REWARD_LABEL, T_REWARD_LABEL
+from src.utils.merkl_validator import ExternalSorter, validate_merkl_pair, validate_ethereum_address, findings_file_for
+
+def write_merkl(path, token, label, claims):
+    writer = MerklWriter(str(path), token, label)
+    for recipient, amount in claims:
+        writer.add(recipient, amount)
+    writer.close()
+
+def test_external_sorter_merges_spilled_runs(tmp_path):
+    rng = random.Random(7)
+    records = [rng.randbytes(52) for _ in range(50)]
+    sorter = ExternalSorter(52, 8, str(tmp_path))
+    for record in records:
+        sorter.add(record)
+
+    assert list(sorter) == sorted(records)
+    assert len(list(tmp_path.iterdir())) == 7
+
+def test_validate_ethereum_address():
+    assert validate_ethereum_address("0x" + "aB" * 20)
+    assert not validate_ethereum_address("0x" + "aB" * 19 + " a")
+    assert not validate_ethereum_address("0x" + "g1" * 20)
+    assert not validate_ethereum_address("0X" + "ab" * 20)
+
+def test_pair_report_lists_missing_recipients_and_ratio_mismatches(tmp_path):
+    recipients = [f"0x{index:040x}" for index in range(1, 6)]
+    arb_claims = [(recipient, 10 ** 18 * (index + 1)) for index, recipient in enumerate(recipients)]
+    # T = 2 x ARB, except a wrong amount for the second recipient; the last one only gets ARB
+    t_claims = [(recipient, 2 * amount) for recipient, amount in arb_claims[:4]]
+    t_claims[1] = (t_claims[1][0], t_claims[1][1] + 10 ** 17)
+    write_merkl(tmp_path / "arb.json", ARB_TOKEN_ADDRESS, ARB_REWARD_LABEL, reversed(arb_claims))
+    write_merkl(tmp_path / "t.json", T_TOKEN_ADDRESS, T_REWARD_LABEL, t_claims)
+    # Snapshot prices: ARB $1, T $0.125, so 25% of the ARB value is 2 T per ARB
+    rewards = [{
+        "provider": recipient,
+        "estimated_reward_in_arb_tokens": str(amount // 10 ** 18),
+        "estimated_reward_in_arb_usd": str(amount // 10 ** 18),
+        "estimated_reward_in_t_usd": str(amount / 4 / 10 ** 18),
+        "estimated_reward_in_t_tokens": str(2 * amount // 10 ** 18)
+    } for recipient, amount in arb_claims]
+    (tmp_path / "rewards.json").write_text(json.dumps({"total_weighted_liquidity": "0", "rewards": rewards}))
+    report_file = str(tmp_path / "reports" / "pair.json")
+
+    results = validate_merkl_pair(
+        str(tmp_path / "arb.json"), str(tmp_path / "t.json"), str(tmp_path / "rewards.json"), report_file=report_file
+    )
+
+    assert not results["valid"]
+    assert results["arb_results"]["valid"] and results["t_results"]["valid"]
+    pair = results["pair"]
+    assert pair["stats"]["matched"] == 4
+    assert pair["stats"]["expected_t_per_arb"] == "2"
+    assert pair["findings"]["counts"] == {"ratio_mismatch": 1, "missing_in_t": 1}
+    assert pair["findings"]["examples"]["ratio_mismatch"][0]["recipient"] == recipients[1]
+    with open(report_file) as f:
+        assert json.load(f)["pair"]["stats"]["missing_in_t"] == 1
+    with open(findings_file_for(report_file)) as f:
+        assert [json.loads(line)["check"] for line in f] == ["ratio_mismatch", "missing_in_t"]
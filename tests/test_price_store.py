@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+from src.data.price_store import PriceStore
+from src.data.price_table import DailyPriceTable, DAY_MS
+
+def test_append_is_incremental_and_tail_tracks_last_timestamp(tmp_path):
+    store = PriceStore(str(tmp_path / "prices"))
+
+    assert store.last_timestamp("tbtc") is None
+    assert store.append("tbtc", [[2000, 2.0], [1000, 1.0], [2000, 2.5]]) == 2
+    assert store.last_timestamp("tbtc") == 2000
+
+    # Points at or before the stored tail are ignored
+    assert store.append("tbtc", [[1500, 9.0], [2000, 9.0], [3000, 3.0]]) == 1
+    timestamps, prices = store.get_series("tbtc")
+    assert list(timestamps) == [1000, 2000, 3000]
+    assert list(prices) == [1.0, 2.0, 3.0]
+
+def test_closest_price_lookup(tmp_path):
+    store = PriceStore(str(tmp_path / "prices"))
+    store.append("ethereum", [[1000, 1.0], [2000, 2.0], [3000, 3.0]])
+
+    assert store.get_closest_price("ethereum", 0) == 1.0
+    assert store.get_closest_price("ethereum", 1400) == 1.0
+    assert store.get_closest_price("ethereum", 1600) == 2.0
+    assert store.get_closest_price("ethereum", 9000) == 3.0
+    assert store.get_closest_price("arbitrum", 1000) is None
+
+def test_migrates_legacy_json_and_exports_it_back(tmp_path):
+    legacy_file = tmp_path / "token_historical_prices.json"
+    legacy_file.write_text(json.dumps({"tbtc": [[1000, 1.0], [2000, 2.0]], "arbitrum": [[1000, 0.5]]}))
+
+    store = PriceStore(str(tmp_path / "prices"), legacy_json_file=str(legacy_file))
+    assert store.tokens() == ["arbitrum", "tbtc"]
+    assert store.last_timestamp("tbtc") == 2000
+
+    export_file = tmp_path / "export.json"
+    store.export_json(str(export_file))
+    assert json.loads(export_file.read_text()) == {"arbitrum": [[1000, 0.5]], "tbtc": [[1000, 1.0], [2000, 2.0]]}
+
+def test_daily_twap_table_updates_incrementally(tmp_path):
+    store = PriceStore(str(tmp_path / "prices"))
+    table = DailyPriceTable(str(tmp_path / "prices"), store)
+    day0 = 20000 * DAY_MS
+    store.append("tbtc", [[day0, 1.0], [day0 + DAY_MS // 2, 3.0], [day0 + DAY_MS, 2.0]])
+    assert table.update("tbtc") == 2
+
+    day0_date = datetime.fromtimestamp(day0 / 1000, tz=timezone.utc)
+    day1_date = datetime.fromtimestamp((day0 + DAY_MS) / 1000, tz=timezone.utc)
+    assert table.get_price("tbtc", day0_date) == 2.0
+    assert table.get_price("tbtc", day1_date) == 2.0
+
+    # Only the last day is recomputed when new points arrive
+    store.append("tbtc", [[day0 + DAY_MS + DAY_MS // 2, 4.0]])
+    assert table.update("tbtc") == 1
+    assert table.get_price("tbtc", day0_date) == 2.0
+    assert table.get_price("tbtc", day1_date) == 3.0
+    # Dates outside the table are clamped to its edges
+    assert table.get_price("tbtc", datetime(2000, 1, 1, tzinfo=timezone.utc)) == 2.0
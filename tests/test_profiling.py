@@ -0,0 +1,25 @@
+import os
+import src.utils.profiling as profiling
+from src.utils.profiling import RunProfiler
+
+def test_only_every_nth_run_is_profiled(tmp_path):
+    profiler = RunProfiler(enabled=True, every=2, base_dir=str(tmp_path / "profiles"))
+    kept = []
+    for _ in range(2):
+        profiler.begin_run()
+        with profiler.stage("calculate"):
+            kept.append([bytearray(1024) for _ in range(100)])
+
+    runs = os.listdir(tmp_path / "profiles")
+    assert len(runs) == 1 and runs[0].endswith("_run1")
+    run_dir = tmp_path / "profiles" / runs[0]
+    assert sorted(os.listdir(run_dir)) == ["calculate.alloc.txt", "calculate.pstats", "calculate.txt"]
+    report = (run_dir / "calculate.alloc.txt").read_text()
+    assert "by growth during the stage" in report and "still live at stage end" in report
+    assert "test_profiling.py" in report
+
+def test_disabled_profiling_returns_the_shared_nullcontext(tmp_path):
+    profiler = RunProfiler(enabled=False, base_dir=str(tmp_path / "profiles"))
+    assert profiler.begin_run() is False
+    assert profiler.stage("calculate") is profiling._DISABLED
+    assert not os.path.exists(tmp_path / "profiles")
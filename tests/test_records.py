@@ -0,0 +1,55 @@
+from src.calculator.records import MetadataRegistry, EventRecord, BalanceEntry, replace_pool_balance
+
+TBTC = {"symbol": "tBTC", "address": "0x6c84a8f1c29108F47a79964b5Fe888D4f4D0dE40", "decimals": 18}
+WBTC = {"symbol": "WBTC", "address": "0x2f2a2543B76A4166549F7aaB2e75Bef0aefC5B0f", "decimals": 8}
+
+def make_event():
+    return {
+        "event": "AddLiquidity",
+        "args": {"provider": "0xabc", "token_amounts": [10, 20]},
+        "provider": "0xabc",
+        "timestamp": 1700000000,
+        "transactionHash": "0x01",
+        "logIndex": 3,
+        "blockNumber": 100,
+        "_from": "0xabc",
+        "pool_address": "0xpool",
+        "tokens": {"token0": dict(TBTC), "token1": dict(WBTC)},
+        "amounts": [10, 20],
+        "action": "add",
+    }
+
+def test_event_record_round_trips_and_shares_token_metadata():
+    registry = MetadataRegistry()
+    first = EventRecord.from_dict(make_event(), registry)
+    second = EventRecord.from_dict(make_event(), registry)
+
+    assert first.to_dict(registry) == make_event()
+    assert first.token0_id == second.token0_id
+    assert first.to_dict(registry)["tokens"]["token0"] is second.to_dict(registry)["tokens"]["token0"]
+
+def test_balance_entry_round_trips_with_derived_totals():
+    registry = MetadataRegistry()
+    entry = {
+        "provider": "0xabc",
+        "timestamp": 1700000000,
+        "event": "AddLiquidity",
+        "action": "add",
+        "transactionHash": "0x01",
+        "txhash_counter": 1,
+        "tokens": {"token0": TBTC, "token1": WBTC},
+        "amounts": [10, 20],
+        "pool_address": "0xpool2",
+        "pool_balances": {
+            "0xpool1": {"token_balance": {"tBTC": 1.5, "WBTC": 0.5}},
+            "0xpool2": {"token_balance": {"tBTC": 2.0, "WBTC": 1.0}},
+        },
+        "total_token_balance": {"tBTC": 3.5, "WBTC": 1.5},
+    }
+    record = BalanceEntry.from_dict(entry, registry)
+    assert record.to_dict(registry) == entry
+
+    # Replacing a pool keeps its position and leaves the other pools shared
+    updated = replace_pool_balance(record.pool_balances, registry.pool_id("0xpool1"), (("tBTC", 0.0), ("WBTC", 0.0)))
+    assert [pool_id for pool_id, _ in updated] == [pool_id for pool_id, _ in record.pool_balances]
+    assert updated[1] is record.pool_balances[1]
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timedelta, timezone
+import src.config
+from src.calculator.rewards import RewardsCalculator
+from src.data.json_formatter import format_rewards
+from src.utils.rewards_audit import audit_rewards_file, snapshot_time
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(weeks=2)
+PROVIDERS = [f"0x{index:040x}" for index in range(1, 6)]
+
+def write_daily_balances(path):
+    daily_balances = {}
+    for index, provider in enumerate(PROVIDERS):
+        # Providers join on different days and change their balance halfway
+        days = range(index, 14)
+        daily_balances[provider] = {"balances": [{
+            "balance_date": (START + timedelta(days=day, hours=index)).isoformat(),
+            "token_usd_balance": {},
+            "total_usd_balance": 1000.0 * (index + 1) * (2 if day >= 7 else 1)
+        } for day in days]}
+    with open(path, 'w') as f:
+        json.dump(daily_balances, f)
+
+def test_audit_matches_calculator_and_reports_tampered_provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.config, "START_DATE", START)
+    monkeypatch.setattr(src.config, "END_DATE", END)
+    monkeypatch.setattr(src.config, "TOTAL_REWARDS", 50000.0)
+    prices = {"arbitrum": 0.8, "threshold-network-token": 0.02}
+    monkeypatch.setattr(RewardsCalculator, "get_token_price", lambda self, token, date: prices[token])
+    balances_file = str(tmp_path / "daily_balances.json")
+    write_daily_balances(balances_file)
+
+    # The program has ended, so the calculation does not depend on when it ran
+    rewards_data = RewardsCalculator(balances_file, START, END, 50000.0).run()
+    snapshot = {"total_weighted_liquidity": str(rewards_data["total_weighted_liquidity"]),
+                "rewards": format_rewards(rewards_data["rewards"])}
+    snapshot_file = tmp_path / "rewards_20240201_120000.json"
+    snapshot_file.write_text(json.dumps(snapshot))
+
+    report = audit_rewards_file(str(snapshot_file), balances_file, arb_price=0.8, t_price=0.02)
+    assert report["passed"], report
+    assert report["providers"]["matched"] == len(PROVIDERS)
+    assert abs(report["prices"]["snapshot_arb_price_usd"] - 0.8) < 1e-9
+
+    snapshot["rewards"][2]["estimated_reward_in_t_tokens"] = "1"
+    snapshot["rewards"].pop()
+    snapshot_file.write_text(json.dumps(snapshot))
+
+    report = audit_rewards_file(str(snapshot_file), balances_file, arb_price=0.8, t_price=0.02)
+    assert not report["passed"]
+    assert report["providers"]["failed"] == 1
+    assert report["fields"]["estimated_reward_in_t_tokens"]["mismatches"] == 1
+    assert report["top_deviations"][0]["provider"] == snapshot["rewards"][2]["provider"]
+    assert report["providers"]["missing_in_snapshot"]["examples"] == [PROVIDERS[-1]]
+
+def test_snapshot_time_from_file_name():
+    expected = datetime(2024, 2, 1, 12, 30, 5).astimezone(timezone.utc)
+    assert snapshot_time("data/rewards/rewards_20240201_123005.json") == expected
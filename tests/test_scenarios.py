@@ -0,0 +1,139 @@
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.calculator.rewards import RewardsCalculator
+from src.calculator.scenarios import (
+    BalanceMatrix, Scenario, evaluate_scenarios, parse_scenario, expand_sweep, load_balance_matrix
+)
+from src.data.balance_store import DailyBalanceStore
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(weeks=2)
+AS_OF = END + timedelta(days=3)
+PRICES = {"arbitrum": 0.8, "threshold-network-token": 0.02}
+BASELINE = Scenario("baseline", 50000.0, START, END, 0.25, 0.01)
+
+def price_lookup(coingecko_id, date):
+    return PRICES[coingecko_id]
+
+def make_daily_balances():
+    daily_balances = {}
+    for index in range(6):
+        provider = f"0x{index + 1:040x}"
+        # Providers join on different days; the last one leaves a WBTC dust balance
+        daily_balances[provider] = {"balances": []}
+        for day in range(index, 14):
+            tokens = {"tBTC": 1000.0 * (index + 1) * (2 if day >= 7 else 1), "WBTC": 0.5 if index == 5 else 200.0}
+            daily_balances[provider]["balances"].append({
+                "balance_date": (START + timedelta(days=day)).isoformat(),
+                "token_usd_balance": tokens,
+                "total_usd_balance": sum(tokens.values()),
+            })
+    return daily_balances
+
+def test_baseline_matches_rewards_calculator(tmp_path, monkeypatch):
+    daily_balances = make_daily_balances()
+    path = tmp_path / "daily_balances.json"
+    path.write_text(json.dumps(daily_balances))
+    monkeypatch.setattr(RewardsCalculator, "get_token_price", lambda self, token, date: PRICES[token])
+    # The program has ended, so the calculator's result does not depend on when it runs
+    expected = RewardsCalculator(str(path), START, END, 50000.0).run()["rewards"]
+
+    results = evaluate_scenarios(BalanceMatrix.load(str(path)), [BASELINE], AS_OF, price_lookup)
+
+    rewards = results.rewards(0)
+    assert [reward["provider"] for reward in rewards] == [reward["provider"] for reward in expected]
+    for reward, expected_reward in zip(rewards, expected):
+        for field, value in expected_reward.items():
+            if field != "provider":
+                assert reward[field] == pytest.approx(value, rel=1e-12)
+
+def test_scenarios_change_parameters_against_baseline():
+    matrix = BalanceMatrix.from_daily_balances(make_daily_balances())
+    scenarios = [
+        BASELINE,
+        parse_scenario({"total_rewards": 100000, "t_reward_ratio": 0.5}, BASELINE, "double"),
+        # The dust-only WBTC balance of the last provider no longer counts
+        parse_scenario({"dust_threshold_usd": 1}, BASELINE, "dust"),
+        # Only the second week: providers have double balances and the last ones join late
+        parse_scenario({"start_date": "2024-01-08T00:00:00", "program_duration_weeks": 1}, BASELINE, "week_2"),
+    ]
+
+    results = evaluate_scenarios(matrix, scenarios, AS_OF, price_lookup)
+
+    arb = results.values["estimated_reward_in_arb_tokens"]
+    t = results.values["estimated_reward_in_t_tokens"]
+    assert arb[:, 1] == pytest.approx(2 * arb[:, 0])
+    assert t[:, 1] == pytest.approx(4 * t[:, 0])
+    liquidity = results.values["weighted_avg_liquidity"]
+    dust_provider = matrix.providers.index(f"0x{6:040x}")
+    assert liquidity[dust_provider, 2] == pytest.approx(liquidity[dust_provider, 0] - 0.5 * 9 / 14)
+    assert liquidity[0, 3] == pytest.approx(2200.0)
+    assert arb[:, 3].sum() == pytest.approx(50000.0)
+
+    summary = results.summary(2, top=1)
+    assert summary["diff"]["arb_tokens"]["changed_providers"] == 6
+    assert summary["diff"]["arb_tokens"]["total"] == pytest.approx(0, abs=1e-6)
+    assert summary["top_changes"][0]["provider"].lower() == f"0x{6:040x}"
+
+def test_parse_scenario_and_sweep():
+    assert [spec["name"] for spec in expand_sweep({"total_rewards": [1, 2], "t_reward_ratio": [0.1, 0.2]})] == [
+        "total_rewards=1,t_reward_ratio=0.1", "total_rewards=1,t_reward_ratio=0.2",
+        "total_rewards=2,t_reward_ratio=0.1", "total_rewards=2,t_reward_ratio=0.2",
+    ]
+    with pytest.raises(ValueError):
+        parse_scenario({"total_reward": 1}, BASELINE)
+    with pytest.raises(ValueError):
+        parse_scenario({"end_date": "2023-12-01"}, BASELINE)
+
+def test_matrix_from_store_matches_json(tmp_path):
+    daily_balances = make_daily_balances()
+    # With unit prices the store's token amounts are the USD balances
+    store = DailyBalanceStore(str(tmp_path / "daily"), shards=4, price_lookup=lambda token, date: 1.0)
+    store.import_daily_balances(daily_balances)
+
+    from_store = load_balance_matrix(store=store)
+    from_json = BalanceMatrix.from_daily_balances(daily_balances)
+
+    assert from_store.providers == from_json.providers
+    assert (from_store.times == from_json.times).all()
+    assert (from_store.total_usd == from_json.total_usd).all()
+    assert sorted(from_store.token_usd) == sorted(from_json.token_usd)
+    for token, values in from_json.token_usd.items():
+        assert (from_store.token_usd[token] == values).all()
+
+def test_scenarios_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import src.app as app
+    import src.calculator.scenarios as scenarios
+    store = DailyBalanceStore(str(tmp_path / "daily"), price_lookup=lambda token, date: 1.0)
+    monkeypatch.setattr(app, "daily_balance_store", store)
+    monkeypatch.setattr(scenarios, "daily_balance_store", store)
+    monkeypatch.setattr(scenarios, "get_daily_price", price_lookup)
+    monkeypatch.setattr(scenarios, "baseline_scenario", lambda: BASELINE)
+    client = app.create_app().test_client()
+
+    assert client.post('/api/scenarios', json={}).status_code == 404
+
+    store.import_daily_balances(make_daily_balances())
+    response = client.post('/api/scenarios', json={"sweep": {"total_rewards": [40000, 60000]}, "as_of": AS_OF.isoformat()})
+    assert response.status_code == 200
+    names = [scenario["name"] for scenario in response.get_json()["scenarios"]]
+    assert names == ["baseline", "total_rewards=40000", "total_rewards=60000"]
+
+    malformed = [
+        {"scenarios": [{"t_reward_ratio": "x"}]},
+        {"scenarios": [5]},
+        {"scenarios": {"name": "a"}},
+        {"scenarios": [{"name": ["a"]}]},
+        {"sweep": [1]},
+        {"sweep": {"total_rewards": 5}},
+        {"as_of": 5},
+        {"as_of": "yesterday"},
+        {"top": None},
+        {"top": -1},
+    ]
+    for body in malformed:
+        response = client.post('/api/scenarios', json=body)
+        assert response.status_code == 400, body
+        assert "error" in response.get_json()
@@ -0,0 +1,132 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from src.data.json_logger import remove_previous_rewards_file
+from src.data.snapshot_store import SnapshotStore, snapshot_name
+
+START = datetime(2024, 10, 1, 12, 0, 0)
+PROVIDERS = [f"0x{index:040x}" for index in range(1, 6)]
+
+def make_snapshot(step):
+    """Rewards snapshot after `step` daily runs: events accumulate and open balance runs grow a day."""
+    events = {}
+    balances = {}
+    for index, provider in enumerate(PROVIDERS):
+        if index == 4 and step < 3:
+            continue  # joins on run 3
+        if index == 3 and step >= 5:
+            continue  # leaves the snapshot on run 5
+        count = 20 + step // (index + 1)
+        events[provider] = [{"transactionHash": f"0x{index}{n}", "timestamp": 1000 * n, "amount": str(n)} for n in range(count)]
+        balances[provider] = [
+            {"start_date": "2024-10-01", "end_date": "2024-10-02", "token_balance": {"tBTC": "1.0"}},
+            {"start_date": "2024-10-03", "end_date": f"2024-10-{3 + step:02d}", "token_balance": {"tBTC": str(index)}},
+        ]
+    return {
+        "total_weighted_liquidity": str(100.0 + step),
+        "rewards": [{"provider": provider, "estimated_reward_in_arb_tokens": str(step * (index + 1))}
+                    for index, provider in enumerate(events)],
+        "events": events,
+        "balances": balances,
+    }
+
+def fill(store, runs, interval=timedelta(hours=12)):
+    names = []
+    for step in range(runs):
+        name = snapshot_name(START + step * interval)
+        store.save(name, make_snapshot(step))
+        names.append(name)
+    return names
+
+def test_snapshots_are_reconstructed_from_base_and_deltas(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"), base_every=4, keep_all_days=10000)
+    names = fill(store, 10)
+
+    entries = store.entries()
+    assert [entry["name"] == entry["base"] for entry in entries] == [True, False, False, False] * 2 + [True, False]
+    # A fresh reader has no cached latest snapshot
+    reader = SnapshotStore(str(tmp_path / "snapshots"))
+    for step, name in enumerate(names):
+        assert reader.load(name) == make_snapshot(step)
+    assert reader.load("rewards_20000101_000000") is None
+
+    sizes = {entry["name"]: os.path.getsize(tmp_path / "snapshots" / entry["file"]) for entry in entries}
+    assert sizes[names[5]] < sizes[names[4]] / 2
+
+    # A second save within the same second replaces the latest snapshot
+    store.save(names[-1], make_snapshot(10))
+    assert store.names() == names
+    assert reader.load(names[-1]) == make_snapshot(10)
+    assert len(os.listdir(tmp_path / "snapshots")) == len(names) + 1
+
+def test_snapshot_named_before_the_latest_one_is_saved_last(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"), base_every=4, keep_all_days=10)
+    names = fill(store, 3)
+
+    # e.g. the clock was set back between two runs
+    earlier = snapshot_name(START + timedelta(hours=23, minutes=30))
+    store.save(earlier, make_snapshot(3))
+    later = snapshot_name(START + timedelta(hours=24, minutes=30))
+    store.save(later, make_snapshot(4))
+
+    assert store.names() == names + [earlier, later]
+    reader = SnapshotStore(str(tmp_path / "snapshots"))
+    assert reader.load(earlier) == make_snapshot(3)
+    assert reader.load(later) == make_snapshot(4)
+    assert store.compact() == 0
+
+    # Only the latest snapshot may be replaced
+    with pytest.raises(ValueError):
+        store.save(names[1], make_snapshot(5))
+    assert store.names() == names + [earlier, later]
+
+def test_compaction_keeps_recent_and_daily_snapshots(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"), base_every=4, keep_all_days=2)
+    names = fill(store, 12)
+
+    # The base written on run 8 already dropped run 1; runs 3 and 5 left the
+    # two-day window of the newest snapshot since
+    assert store.compact() == 2
+
+    # Before Oct 5 only the last run of each day stays
+    kept = [names[0], names[2], names[4], names[6]] + names[7:]
+    assert store.names() == kept
+    for name in kept:
+        assert store.load(name) == make_snapshot(names.index(name))
+
+    # Later on, weeks before the last three days keep their last snapshot only
+    store.keep_daily_days = 3
+    assert store.compact(START + timedelta(days=16)) == 7
+    assert store.names() == [names[10], names[11]]
+    # Run 10's base (run 8) is gone, so run 10 is the new base of its chain
+    assert [entry["base"] for entry in store.entries()] == [names[10], names[10]]
+    assert store.load(names[10]) == make_snapshot(10)
+    assert store.load(names[11]) == make_snapshot(11)
+    files = set(os.listdir(tmp_path / "snapshots")) - {"index.json"}
+    assert files == {entry["file"] for entry in store.entries()}
+
+def test_snapshot_endpoints(tmp_path, monkeypatch):
+    import src.app as app
+    store = SnapshotStore(str(tmp_path / "snapshots"), base_every=2, keep_all_days=10)
+    names = fill(store, 3)
+    monkeypatch.setattr(app, "snapshot_store", store)
+    client = app.create_app().test_client()
+
+    response = client.get('/api/snapshots')
+    assert [snapshot["kind"] for snapshot in response.get_json()["snapshots"]] == ["base", "delta", "base"]
+    assert client.get(f'/api/snapshots/{names[1]}').get_json() == make_snapshot(1)
+    assert client.get('/api/snapshots/rewards_20000101_000000').status_code == 404
+
+def test_previous_rewards_file_is_removed_only_once_in_the_history(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"), base_every=2, keep_all_days=10)
+    names = fill(store, 2)
+    files = [tmp_path / f"{name}.json" for name in names + ["rewards_20000101_000000"]]
+    for file in files:
+        file.write_text("{}")
+
+    remove_previous_rewards_file(str(files[0]), str(files[1]), store)
+    # Not in the snapshot history, e.g. written before it existed
+    remove_previous_rewards_file(str(files[2]), str(files[1]), store)
+    remove_previous_rewards_file(str(files[1]), str(files[1]), store)
+
+    assert [file.exists() for file in files] == [False, True, True]
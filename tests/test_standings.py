@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.calculator.standings as standings
+from src.calculator.rewards import RewardsCalculator
+from src.data.balance_store import DailyBalanceStore, to_day
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(weeks=2)
+FIRST = to_day(START)
+PROVIDERS = [f"0x{index:040x}" for index in range(1, 4)]
+PRICES = {"arbitrum": 0.8, "threshold-network-token": 0.02}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(standings, "START_DATE", START)
+    monkeypatch.setattr(standings, "END_DATE", END)
+    monkeypatch.setattr(standings, "TOTAL_REWARDS", 50000.0)
+    monkeypatch.setattr(RewardsCalculator, "get_token_price", lambda self, token, date: PRICES[token])
+    store = DailyBalanceStore(str(tmp_path / "daily"), price_lookup=lambda token, date: 1000.0 + to_day(date) - FIRST)
+    alice, bob, carol = PROVIDERS
+    store.append_days(FIRST, FIRST + 3, {alice: {"tBTC": 1.0}, bob: {"tBTC": 2.0}})
+    store.append_days(FIRST + 4, FIRST + 6, {alice: {"tBTC": 3.0}, bob: {"tBTC": 0.0}, carol: {"tBTC": 1.0}})
+    store.append_days(FIRST + 7, FIRST + 9, {alice: {"tBTC": 3.0}, bob: {"tBTC": 1.0}, carol: {"tBTC": 1.0}})
+    return store
+
+def expected_rewards(store, as_of):
+    # What the calculator would have produced at as_of, from the balances stored by then
+    runs = store.read_runs(end_day=to_day(as_of))
+    return RewardsCalculator(None, START, END, 50000.0, as_of=as_of).run(runs)
+
+@pytest.mark.parametrize("as_of", [
+    START + timedelta(days=2, hours=5),
+    START + timedelta(days=5, hours=23),
+    # After the last stored day, its balances keep counting
+    START + timedelta(days=11, hours=1),
+])
+def test_rewards_as_of_match_calculator_at_that_time(store, as_of):
+    result = standings.rewards_as_of(as_of, store)
+    expected = expected_rewards(store, as_of)
+
+    assert result["total_weighted_liquidity"] == pytest.approx(expected["total_weighted_liquidity"], rel=1e-12)
+    assert [reward["provider"] for reward in result["rewards"]] == [reward["provider"] for reward in expected["rewards"]]
+    for reward, expected_reward in zip(result["rewards"], expected["rewards"]):
+        assert reward["estimated_reward_in_t_tokens"] == pytest.approx(expected_reward["estimated_reward_in_t_tokens"], rel=1e-12)
+
+def test_provider_standing(store):
+    as_of = START + timedelta(days=5, hours=12)
+    rewards = {reward["provider"]: reward for reward in standings.rewards_as_of(as_of, store)["rewards"]}
+    alice, bob, carol = PROVIDERS
+
+    standing = standings.provider_standing(alice.upper().replace("0X", "0x"), as_of, store)
+    assert standing["balance"]["total_usd_balance"] == 3.0 * 1005.0
+    assert standing["reward"]["estimated_reward_in_arb_tokens"] == pytest.approx(
+        rewards[standing["reward"]["provider"]]["estimated_reward_in_arb_tokens"], rel=1e-12
+    )
+    # bob exited on day 4 and has no balance that day
+    assert standings.provider_standing(bob, as_of, store)["balance"] is None
+    assert standings.provider_standing("0x" + "f" * 40, as_of, store) is None
+    # carol joined on day 4
+    assert standings.provider_standing(carol, START + timedelta(days=1), store)["reward"]["weighted_avg_liquidity"] == 0
+
+def test_as_of_endpoints(store, monkeypatch):
+    import src.app as app
+    monkeypatch.setattr(app, "daily_balance_store", store)
+    monkeypatch.setattr(standings, "daily_balance_store", store)
+    client = app.create_app().test_client()
+
+    response = client.get('/api/rewards?as_of=2024-01-06T12:00:00')
+    assert response.status_code == 200
+    assert len(response.get_json()["rewards"]) == 3
+
+    response = client.get(f'/api/balances/{PROVIDERS[0]}?as_of=2024-01-03')
+    assert response.status_code == 200
+    assert response.get_json()["balance"]["total_usd_balance"] == "1002.0"
+
+    assert client.get('/api/rewards?as_of=yesterday').status_code == 400
+    assert client.get('/api/balances/0xunknown').status_code == 404
@@ -0,0 +1,95 @@
+from datetime import datetime
+from eth_abi import encode_abi
+from prometheus_client import REGISTRY
+from web3 import Web3
+from web3.providers.base import BaseProvider
+import src.blockchain.event_fetcher as event_fetcher_module
+import src.blockchain.web3_client as web3_client_module
+from src.blockchain.event_fetcher import EventFetcher
+from src.blockchain.multicall import aggregate3
+from src.blockchain.web3_client import Web3Client, RPC_ENDPOINT
+from src.config import POOLS
+
+PROVIDER = "0x54b5569deC8A6A8AE61A36Fd34e5c8945810db8b"
+
+class ChainProvider(BaseProvider):
+    """Minimal JSON-RPC node: blocks by tag or number, and canned answers for the other methods."""
+
+    def __init__(self, blocks, timestamp=0):
+        self.blocks = blocks
+        self.timestamp = timestamp
+        self.requests = []
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == "eth_getBlockByNumber":
+            tag = params[0]
+            number = self.blocks[tag] if tag in self.blocks else int(tag, 16)
+            result = {"number": hex(number), "hash": "0x" + "11" * 32, "timestamp": hex(self.timestamp)}
+        elif method == "eth_getTransactionByHash":
+            result = {"hash": params[0], "from": PROVIDER, "blockNumber": "0x1"}
+        elif method == "eth_getCode":
+            result = "0x6000"
+        elif method == "eth_getLogs":
+            result = []
+        elif method == "eth_call":
+            # An aggregate3 with no calls
+            result = "0x" + encode_abi(["(bool,bytes)[]"], [[]]).hex()
+        else:
+            result = "0xa4b1"
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+def make_client(blocks, timestamp=0):
+    client = Web3Client()
+    client.w3 = Web3(ChainProvider(blocks, timestamp))
+    return client
+
+def rpc_calls(method):
+    return REGISTRY.get_sample_value("tlp_rpc_calls_total", {"method": method, "endpoint": RPC_ENDPOINT}) or 0
+
+def test_confirmed_block_in_finalized_mode(monkeypatch):
+    monkeypatch.setattr(web3_client_module, "CONFIRMATION_MODE", "finalized")
+    client = make_client({"latest": 1000, "finalized": 900})
+
+    assert client.get_confirmed_block(latest_block=1000) == 900
+    assert client.w3.provider.requests == [("eth_getBlockByNumber", ["finalized", False])]
+
+def test_confirmed_block_in_depth_mode(monkeypatch):
+    monkeypatch.setattr(web3_client_module, "CONFIRMATION_MODE", "depth")
+    monkeypatch.setattr(web3_client_module, "CONFIRMATION_DEPTH", 240)
+    client = make_client({"latest": 1000})
+
+    assert client.get_confirmed_block() == 760
+    assert client.get_confirmed_block(latest_block=100) == 0
+
+def test_rpc_metrics_are_labelled_with_the_json_rpc_method(monkeypatch):
+    monkeypatch.setattr(web3_client_module, "CONFIRMATION_MODE", "finalized")
+    pool = next(pool for pool in POOLS if "Mint" in pool["events"])
+    client = make_client({"latest": 1000, "finalized": 900}, timestamp=int(pool["deploy_date"].timestamp()))
+    monkeypatch.setattr(web3_client_module, "web3_client", client)
+    monkeypatch.setattr(event_fetcher_module, "web3_client", client)
+    monkeypatch.setattr(event_fetcher_module, "END_TIMESTAMP", int(datetime(2100, 1, 1).timestamp()))
+    fetcher = EventFetcher()
+    fetcher.w3 = client.w3
+    token0, token1 = (next(iter(token.values())) for token in pool["tokens"])
+    mint = {"event": "Mint", "args": {"owner": PROVIDER, "amount0": 1, "amount1": 2}}
+    log = {"blockNumber": 5, "transactionHash": bytes(32), "logIndex": 0}
+
+    call_sites = [
+        (client.get_latest_block, ["eth_getBlockByNumber"]),
+        (client.get_confirmed_block, ["eth_getBlockByNumber"]),
+        (lambda: client.is_contract(PROVIDER), ["eth_getCode"]),
+        (lambda: aggregate3(client.w3, [(PROVIDER, b"")]), ["eth_call"]),
+        (lambda: fetcher.fetch_chunk(pool, fetcher.decoders.for_pool(pool, "Mint"), 1, 2, token0, token1), ["eth_getLogs"]),
+        (lambda: fetcher.process_log(pool, dict(mint), log, token0, token1), ["eth_getBlockByNumber", "eth_getTransactionByHash"]),
+    ]
+    methods = {method for _, expected in call_sites for method in expected}
+    for call_site, expected in call_sites:
+        client.w3.provider.requests.clear()
+        before = {method: rpc_calls(method) for method in methods}
+        call_site()
+        sent = [method for method, _ in client.w3.provider.requests if method != "eth_chainId"]
+        counted = [method for method in sorted(methods) for _ in range(int(rpc_calls(method) - before[method]))]
+        assert sent == expected
+        assert counted == sorted(expected)
+    assert rpc_calls("caller") == 0